@@ -0,0 +1,42 @@
+from typing import List, Literal
+import os
+import random
+
+from dotenv import load_dotenv
+
+from .redis_client import redis_client
+from .keys import access_frequency_cache_key
+from .breaker import fail_open
+
+load_dotenv()
+
+# Approximate access frequencies of cached entities, one sorted set per
+# kind. Only a sample of the reads is counted, so the sketch costs a
+# fraction of a command per read. Counts are decayed with the rankings
+# and the sets are trimmed to the most requested entities.
+
+AccessKind = Literal["post", "com"]
+ACCESS_KINDS = ("post", "com")
+
+ACCESS_SAMPLE_RATE = float(os.getenv("ACCESS_SAMPLE_RATE", 0.1))
+ACCESS_MAX_LEN = int(os.getenv("ACCESS_MAX_LEN", 10000))
+ACCESS_DECAY_FACTOR = float(os.getenv("ACCESS_DECAY_FACTOR", 0.5))
+
+
+@fail_open()
+def record(kind: AccessKind, entity_id: int):
+    if random.random() < ACCESS_SAMPLE_RATE:
+        redis_client.zincrby(access_frequency_cache_key(kind), 1, entity_id)
+
+
+def get_top(kind: AccessKind, count: int) -> List[int]:
+    return [int(member) for member in redis_client.zrevrange(access_frequency_cache_key(kind), 0, count - 1)]
+
+
+def decay():
+    pipe = redis_client.pipeline(transaction=False)
+    for kind in ACCESS_KINDS:
+        key = access_frequency_cache_key(kind)
+        pipe.zunionstore(key, {key: ACCESS_DECAY_FACTOR})
+        pipe.zremrangebyrank(key, 0, -(ACCESS_MAX_LEN + 1))
+    pipe.execute()
@@ -0,0 +1,169 @@
+from functools import wraps
+from threading import Lock
+import os
+import time
+
+from dotenv import load_dotenv
+from redis.exceptions import ConnectionError, RedisError, ResponseError
+
+from app.core import metrics
+from app.core.logging_config import logger
+
+load_dotenv()
+
+# After CACHE_BREAKER_FAILURES consecutive connection errors or timeouts
+# every Redis call fails at once with CacheUnavailable instead of
+# waiting for the socket timeout. After CACHE_BREAKER_RESET seconds one
+# call is let through as a probe, it closes the breaker if it succeeds.
+#
+# Callers degrade through fail_open(): cache reads become misses and are
+# served from the database, cache writes are skipped.
+
+CACHE_BREAKER_FAILURES = int(os.getenv("CACHE_BREAKER_FAILURES", 5))
+CACHE_BREAKER_RESET = float(os.getenv("CACHE_BREAKER_RESET", 10))
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+STATE_NAMES = {CLOSED: "closed", HALF_OPEN: "half_open", OPEN: "open"}
+
+
+class CacheUnavailable(ConnectionError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+
+    def _set_state(self, state: int):
+        if state != self._state:
+            logger.warning("cache_breaker_state_changed", state=STATE_NAMES[state])
+        self._state = state
+        metrics.set_gauge("cache_breaker_state", state)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+                # Only this call probes, the others keep failing fast until it returns
+                self._set_state(HALF_OPEN)
+                self._probe_started = now
+                return True
+            if self._state == HALF_OPEN and now - self._probe_started >= self.reset_timeout:
+                # The probe ended without reporting, e.g. with an unrelated exception
+                self._probe_started = now
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        """True while calls fail fast, without letting a probe through."""
+        with self._lock:
+            return self._state == OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    metrics.incr("cache_breaker_opened_total")
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def call(self, func, *args, **kwargs):
+        if not self.allow():
+            metrics.incr("cache_short_circuited_total")
+            raise CacheUnavailable("Cache circuit breaker is open")
+        try:
+            result = func(*args, **kwargs)
+        except ResponseError:
+            # The server answered, the command itself was wrong
+            self.record_success()
+            raise
+        except RedisError:
+            metrics.incr("cache_errors_total")
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+breaker = CircuitBreaker(CACHE_BREAKER_FAILURES, CACHE_BREAKER_RESET)
+
+
+class BreakerPipeline:
+    """Commands are only queued locally, execute() is the call which goes through the breaker."""
+
+    def __init__(self, pipe):
+        self.pipe = pipe
+
+    def execute(self, *args, **kwargs):
+        return breaker.call(self.pipe.execute, *args, **kwargs)
+
+    def __getattr__(self, name: str):
+        return getattr(self.pipe, name)
+
+
+class BreakerScript:
+    def __init__(self, script):
+        self._script = script
+
+    def __call__(self, keys: list = (), args: list = (), client=None):
+        if isinstance(client, BreakerPipeline):
+            return self._script(keys=keys, args=args, client=client.pipe)
+        return breaker.call(self._script, keys=keys, args=args)
+
+
+class BreakerClient:
+    def __init__(self, client):
+        self._client = client
+
+    @property
+    def wrapped(self):
+        return self._client
+
+    def pipeline(self, *args, **kwargs) -> BreakerPipeline:
+        return BreakerPipeline(self._client.pipeline(*args, **kwargs))
+
+    def register_script(self, source: str) -> BreakerScript:
+        return BreakerScript(self._client.register_script(source))
+
+    def __getattr__(self, name: str):
+        command = getattr(self._client, name)
+        if not callable(command):
+            return command
+
+        @wraps(command)
+        def guarded(*args, **kwargs):
+            return breaker.call(command, *args, **kwargs)
+        return guarded
+
+
+def fail_open(fallback=None):
+    """Returns fallback, or fallback(*args) if it is callable, when the cache can not be reached."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except RedisError as e:
+                if isinstance(e, ResponseError):
+                    raise
+                metrics.incr("cache_fallbacks_total")
+                if not isinstance(e, CacheUnavailable):
+                    logger.warning("cache_unavailable", operation=func.__name__, reason=str(e))
+                return fallback(*args, **kwargs) if callable(fallback) else fallback
+        return wrapper
+    return decorator
@@ -0,0 +1,62 @@
+from typing import List, Optional
+import os
+
+from dotenv import load_dotenv
+
+from .redis_client import redis_binary_client
+from .keys import (
+    dependents_cache_key,
+    user_cache_key,
+    community_cache_key
+)
+
+load_dotenv()
+
+# Every cached entity is added to the dependents set of the keys it
+# belongs to: a post to its community and its owner, a community to its
+# owner. Deleting a parent walks the sets, so cascaded rows disappear
+# from the cache together with the parent.
+#
+# A dependents set gets the entity TTL on every add, so it always
+# outlives its members. Members which expired meanwhile are harmless,
+# deleting them again does nothing.
+
+DEPENDENTS_BATCH_SIZE = int(os.getenv("DEPENDENTS_BATCH_SIZE", 1000))
+
+
+def post_parents(post) -> List[str]:
+    return [community_cache_key(post.community_id), user_cache_key(post.owner_id)]
+
+
+def community_parents(community) -> List[str]:
+    return [user_cache_key(community.owner_id)]
+
+
+def register(pipe, key: str, parents: List[str], ttl: int):
+    for parent in parents:
+        deps_key = dependents_cache_key(parent)
+        pipe.sadd(deps_key, key)
+        pipe.expire(deps_key, ttl)
+
+
+def scan_dependents(parent_key: str, batch_size: Optional[int] = None):
+    """Yields batches of dependent keys, the set is read with SSCAN so a huge one never blocks Redis."""
+    batch_size = batch_size or DEPENDENTS_BATCH_SIZE
+    cursor = 0
+    while True:
+        cursor, members = redis_binary_client.sscan(dependents_cache_key(parent_key), cursor, count=batch_size)
+        if members:
+            yield [member.decode() for member in members]
+        if cursor == 0:
+            return
+
+
+def having_dependents(keys: List[str]) -> List[str]:
+    pipe = redis_binary_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.exists(dependents_cache_key(key))
+    return [key for key, exists in zip(keys, pipe.execute()) if exists]
+
+
+def drop(parent_key: str):
+    redis_binary_client.unlink(dependents_cache_key(parent_key))
@@ -0,0 +1,272 @@
+from typing import Dict, List, Optional, Tuple, Type
+
+import orjson
+from pydantic import BaseModel
+from redis.exceptions import ResponseError
+
+from .redis_client import redis_binary_client
+from . import dependencies, hotkeys
+from .breaker import fail_open
+from .keys import generation_cache_key
+
+# Entities are stored as Redis hashes, one field per schema field, every
+# value being a JSON fragment. Responses are assembled from the fragments
+# without parsing them, and updates only write the fields that changed.
+#
+# Each entity key has a generation counter which every write bumps. A
+# reader remembers the generation before loading the row from the
+# database and its full write is dropped if a writer got in between,
+# so a slow reader can not overwrite a newer entry with an older row.
+#
+# Entities with a version field are also compared by version: a write
+# which carries an older version than the cached one is dropped, so two
+# edits whose cache writes arrive out of order leave the newer one.
+
+ENTITY_TTL = 120
+
+_SET_FULL = redis_binary_client.register_script("""
+local generation = redis.call("GET", KEYS[2]) or ""
+if generation ~= ARGV[1] then
+    return 0
+end
+if ARGV[3] ~= "" then
+    local cached = tonumber(redis.call("HGET", KEYS[1], "version"))
+    if cached and cached > tonumber(ARGV[3]) then
+        return 0
+    end
+end
+redis.call("DEL", KEYS[1])
+redis.call("HSET", KEYS[1], unpack(ARGV, 4))
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+return 1
+""")
+
+_SET_FIELDS = redis_binary_client.register_script("""
+redis.call("INCR", KEYS[2])
+redis.call("EXPIRE", KEYS[2], ARGV[1])
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return 0
+end
+if ARGV[2] ~= "" then
+    local cached = tonumber(redis.call("HGET", KEYS[1], "version"))
+    if cached and cached >= tonumber(ARGV[2]) then
+        return 0
+    end
+end
+redis.call("HSET", KEYS[1], unpack(ARGV, 3))
+return 1
+""")
+
+_INCR_FIELD = redis_binary_client.register_script("""
+redis.call("INCR", KEYS[2])
+redis.call("EXPIRE", KEYS[2], ARGV[3])
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return false
+end
+return redis.call("HINCRBY", KEYS[1], ARGV[1], ARGV[2])
+""")
+
+_INCR_COUNTER = redis_binary_client.register_script("""
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return false
+end
+return redis.call("HINCRBY", KEYS[1], ARGV[1], ARGV[2])
+""")
+
+_DELETE = redis_binary_client.register_script("""
+redis.call("INCR", KEYS[2])
+redis.call("EXPIRE", KEYS[2], ARGV[1])
+return redis.call("DEL", KEYS[1])
+""")
+
+_DELETE_OLDER = redis_binary_client.register_script("""
+local cached = tonumber(redis.call("HGET", KEYS[1], "version"))
+if cached and cached >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call("INCR", KEYS[2])
+redis.call("EXPIRE", KEYS[2], ARGV[1])
+return redis.call("DEL", KEYS[1])
+""")
+
+
+def to_fields(model: BaseModel) -> Dict[str, bytes]:
+    return {name: orjson.dumps(value) for name, value in model.model_dump(mode="json").items()}
+
+
+def to_changed_fields(model: BaseModel, names: set) -> Dict[str, bytes]:
+    return {name: value for name, value in to_fields(model).items() if name in names}
+
+
+def _flatten(fields: Dict[str, bytes]) -> list:
+    return [item for pair in fields.items() for item in pair]
+
+
+def _version(model: BaseModel):
+    version = getattr(model, "version", None)
+    return "" if version is None else version
+
+
+def _to_json(names: List[str], values: list) -> Optional[bytes]:
+    if any(value is None for value in values):
+        return None
+    return b"{" + b",".join(b'"%s":%s' % (name.encode(), value) for name, value in zip(names, values)) + b"}"
+
+
+def read(key: str, schema: Type[BaseModel], fields: List[str] = None) -> Tuple[Optional[bytes], bytes]:
+    """Returns (JSON or None on a miss, generation) of the entity, or of a subset of its fields."""
+    return read_many([key], schema, fields)[0]
+
+
+@fail_open(lambda keys, *args, **kwargs: [(None, b"")] * len(keys))
+def read_many(
+    keys: List[str],
+    schema: Type[BaseModel],
+    fields: List[str] = None
+) -> List[Tuple[Optional[bytes], bytes]]:
+    names = fields or list(schema.model_fields)
+    pipe = redis_binary_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.hmget(key, names)
+        pipe.get(generation_cache_key(key))
+    results = pipe.execute(raise_on_error=False)
+
+    entries = []
+    for i, key in enumerate(keys):
+        values, generation = results[2 * i], results[2 * i + 1]
+        if isinstance(values, ResponseError):
+            # Entries written before entities became hashes
+            redis_binary_client.delete(key)
+            values = [None]
+        entries.append((_to_json(names, values), generation or b""))
+    return entries
+
+
+@fail_open()
+def read_fields(key: str, names: List[str]) -> Optional[List[bytes]]:
+    """Returns the JSON fragments of the given fields, None if the entity or one of them is not cached."""
+    values = redis_binary_client.hmget(key, names)
+    if any(value is None for value in values):
+        return None
+    return values
+
+
+@fail_open(False)
+def set_entity(
+    key: str,
+    model: BaseModel,
+    generation: bytes,
+    parents: List[str] = (),
+    ttl: int = ENTITY_TTL
+) -> bool:
+    """Writes the whole entity unless it was changed since generation was read.
+
+    parents are the keys whose deletion also removes this entry.
+    """
+    pipe = redis_binary_client.pipeline(transaction=False)
+    args = [generation, ttl, _version(model)] + _flatten(to_fields(model))
+    _SET_FULL(keys=[key, generation_cache_key(key)], args=args, client=pipe)
+    dependencies.register(pipe, key, parents, ttl)
+    return bool(pipe.execute()[0])
+
+
+@fail_open()
+def set_many_entities(
+    models: Dict[str, BaseModel],
+    generations: List[bytes],
+    parents: Dict[str, List[str]] = None,
+    ttl: int = ENTITY_TTL
+):
+    pipe = redis_binary_client.pipeline(transaction=False)
+    for (key, model), generation in zip(models.items(), generations):
+        args = [generation, ttl, _version(model)] + _flatten(to_fields(model))
+        _SET_FULL(keys=[key, generation_cache_key(key)], args=args, client=pipe)
+        dependencies.register(pipe, key, (parents or {}).get(key, ()), ttl)
+    pipe.execute()
+
+
+@fail_open(False)
+def set_fields(
+    key: str,
+    fields: Dict[str, bytes],
+    version: Optional[int] = None,
+    ttl: int = ENTITY_TTL
+) -> bool:
+    """Updates only the given fields, entities which are not cached are left for the next read.
+
+    With a version the fields are only written if the cached entry is
+    older, the version is written along with them.
+    """
+    if not fields:
+        return False
+    if version is not None:
+        fields = {**fields, "version": orjson.dumps(version)}
+    hotkeys.invalidate(key)
+    args = [ttl, "" if version is None else version] + _flatten(fields)
+    return bool(_SET_FIELDS(keys=[key, generation_cache_key(key)], args=args))
+
+
+@fail_open()
+def incr_field(key: str, field: str, amount: int = 1, ttl: int = ENTITY_TTL) -> Optional[int]:
+    return _INCR_FIELD(keys=[key, generation_cache_key(key)], args=[field, amount, ttl])
+
+
+@fail_open()
+def incr_fields(amounts: Dict[str, int], field: str, ttl: int = ENTITY_TTL):
+    """incr_field for several entries, {key: amount}, in one pipeline."""
+    pipe = redis_binary_client.pipeline(transaction=False)
+    for key, amount in amounts.items():
+        _INCR_FIELD(keys=[key, generation_cache_key(key)], args=[field, amount, ttl], client=pipe)
+    pipe.execute()
+
+
+@fail_open()
+def incr_counter(key: str, field: str, amount: int = 1) -> Optional[int]:
+    """Like incr_field, but leaves the generation alone, so concurrent
+    cache fills still succeed. For counters whose database value is only
+    written later (views): a fill from the database can not be newer.
+    """
+    return _INCR_COUNTER(keys=[key], args=[field, amount])
+
+
+@fail_open()
+def delete_entity(key: str, ttl: int = ENTITY_TTL):
+    hotkeys.invalidate(key)
+    _DELETE(keys=[key, generation_cache_key(key)], args=[ttl])
+
+
+def delete_entities(keys: List[str], ttl: int = ENTITY_TTL):
+    pipe = redis_binary_client.pipeline(transaction=False)
+    for key in keys:
+        hotkeys.invalidate(key)
+        _DELETE(keys=[key, generation_cache_key(key)], args=[ttl], client=pipe)
+    pipe.execute()
+
+
+def delete_older_entities(versions: Dict[str, int], ttl: int = ENTITY_TTL) -> int:
+    """Deletes the entries, {key: version}, which are cached at an older
+    version than the given one. An entry the writer already updated to
+    that version is kept. Returns the number of kept entries.
+    """
+    pipe = redis_binary_client.pipeline(transaction=False)
+    for key, version in versions.items():
+        hotkeys.invalidate(key)
+        _DELETE_OLDER(keys=[key, generation_cache_key(key)], args=[ttl, version], client=pipe)
+    return sum(1 for deleted in pipe.execute() if deleted == 0)
+
+
+def delete_tree(root_key: str) -> int:
+    """Deletes the dependents of root_key, and their dependents, in pipelined batches.
+
+    Returns the number of deleted keys. root_key itself is left to the caller.
+    """
+    deleted = 0
+    parents = [root_key]
+    while parents:
+        parent = parents.pop()
+        for batch in dependencies.scan_dependents(parent):
+            delete_entities(batch)
+            deleted += len(batch)
+            parents.extend(dependencies.having_dependents(batch))
+        dependencies.drop(parent)
+    return deleted
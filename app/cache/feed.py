@@ -0,0 +1,169 @@
+from typing import Dict, List
+import heapq
+import os
+
+from dotenv import load_dotenv
+
+from .redis_client import redis_client
+from .breaker import fail_open
+from .keys import (
+    user_feed_cache_key,
+    community_posts_cache_key,
+    huge_communities_cache_key
+)
+
+load_dotenv()
+
+# Communities with more followers than this are not fanned out on write,
+# their posts are merged into the feed on read instead.
+FEED_FANOUT_LIMIT = int(os.getenv("FEED_FANOUT_LIMIT", 10000))
+FEED_MAX_LEN = int(os.getenv("FEED_MAX_LEN", 1000))
+FEED_TTL = int(os.getenv("FEED_TTL", 7 * 24 * 3600))
+
+
+@fail_open(False)
+def is_feed_exist(user_id: int) -> bool:
+    return bool(redis_client.exists(user_feed_cache_key(user_id)))
+
+
+@fail_open(False)
+def is_huge_community(community_id: int) -> bool:
+    return bool(redis_client.sismember(huge_communities_cache_key(), community_id))
+
+
+def get_huge_communities(community_ids: List[int]) -> List[int]:
+    if not community_ids:
+        return []
+    flags = redis_client.smismember(huge_communities_cache_key(), community_ids)
+    return [c_id for c_id, flag in zip(community_ids, flags) if flag]
+
+
+def _existing(keys: List[str]) -> List[str]:
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.exists(key)
+    return [key for key, exists in zip(keys, pipe.execute()) if exists]
+
+
+def _add_to_sets(posts: Dict[str, Dict[int, float]]):
+    pipe = redis_client.pipeline(transaction=False)
+    for key, scores in posts.items():
+        pipe.zadd(key, scores)
+        pipe.zremrangebyrank(key, 0, -(FEED_MAX_LEN + 1))
+    pipe.execute()
+
+
+def add_community_post(community_id: int, post_id: int, score: float):
+    add_community_posts({community_id: {post_id: score}})
+
+
+@fail_open()
+def add_community_posts(posts: Dict[int, Dict[int, float]]):
+    """Adds {community_id: {post_id: score}} to the recent posts of the communities.
+
+    Only lists which are already built get the posts, a missing one is
+    filled from the database by fill_community_posts when a feed needs it.
+    """
+    keys = {community_posts_cache_key(c_id): scores for c_id, scores in posts.items()}
+    _add_to_sets({key: keys[key] for key in _existing(list(keys))})
+
+
+@fail_open(list)
+def get_missing_community_posts(community_ids: List[int]) -> List[int]:
+    """Returns the ids of the communities whose recent posts are not cached."""
+    if not community_ids:
+        return []
+    keys = {community_posts_cache_key(c_id): c_id for c_id in community_ids}
+    existing = set(_existing(list(keys)))
+    return [c_id for key, c_id in keys.items() if key not in existing]
+
+
+@fail_open()
+def fill_community_posts(community_id: int, posts: Dict[int, float]):
+    key = community_posts_cache_key(community_id)
+    # Placeholder so a community without posts is not filled on every read
+    _add_to_sets({key: posts or {0: 0}})
+
+
+@fail_open()
+def remove_community_post(community_id: int, post_id: int):
+    redis_client.zrem(community_posts_cache_key(community_id), post_id)
+
+
+@fail_open()
+def set_huge_community(community_id: int, huge: bool):
+    if huge:
+        redis_client.sadd(huge_communities_cache_key(), community_id)
+    else:
+        redis_client.srem(huge_communities_cache_key(), community_id)
+
+
+def fan_out_post(
+    follower_ids: List[int],
+    post_id: int,
+    score: float
+) -> int:
+    """Pushes a new post to the feeds of followers. Returns the number of feeds updated."""
+    return fan_out_posts({f_id: {post_id: score} for f_id in follower_ids})
+
+
+@fail_open(0)
+def fan_out_posts(feeds: Dict[int, Dict[int, float]]) -> int:
+    """Pushes {follower_id: {post_id: score}} to the feeds in one pipeline. Returns the number of feeds updated."""
+    if not feeds:
+        return 0
+
+    # Only feeds which are already built get the posts, missing feeds are
+    # rebuilt from the database on the next read.
+    keys = {user_feed_cache_key(f_id): scores for f_id, scores in feeds.items()}
+    existing = _existing(list(keys))
+    _add_to_sets({key: keys[key] for key in existing})
+
+    return len(existing)
+
+
+@fail_open()
+def fill_feed(user_id: int, posts: Dict[int, float]):
+    key = user_feed_cache_key(user_id)
+    pipe = redis_client.pipeline(transaction=False)
+    if posts:
+        pipe.zadd(key, posts)
+        pipe.zremrangebyrank(key, 0, -(FEED_MAX_LEN + 1))
+    else:
+        # Placeholder so an empty feed is not rebuilt on every read
+        pipe.zadd(key, {0: 0})
+    pipe.expire(key, FEED_TTL)
+    pipe.execute()
+
+
+@fail_open()
+def remove_from_feed(user_id: int, post_ids: List[int]):
+    if post_ids:
+        redis_client.zrem(user_feed_cache_key(user_id), *post_ids)
+
+
+def get_feed_ids(
+    user_id: int,
+    huge_community_ids: List[int],
+    limit: int,
+    offset: int
+) -> List[int]:
+    stop = offset + limit - 1
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zrevrange(user_feed_cache_key(user_id), 0, stop, withscores=True)
+    for c_id in huge_community_ids:
+        pipe.zrevrange(community_posts_cache_key(c_id), 0, stop, withscores=True)
+    sources = pipe.execute()
+
+    merged = heapq.merge(*sources, key=lambda x: x[1], reverse=True)
+    ids, seen = [], set()
+    for member, _ in merged:
+        post_id = int(member)
+        if post_id and post_id not in seen:
+            seen.add(post_id)
+            ids.append(post_id)
+        if len(ids) > stop:
+            break
+
+    return ids[offset:offset + limit]
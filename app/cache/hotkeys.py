@@ -0,0 +1,167 @@
+from threading import Lock
+from typing import Dict, List, Literal, Optional, Tuple
+import os
+import random
+import hashlib
+import time
+
+from dotenv import load_dotenv
+
+from .redis_client import redis_binary_client
+from .keys import replica_cache_key
+from .breaker import fail_open
+
+load_dotenv()
+
+# Hot-key detection, per process. Every read of an entity key is counted
+# in a count-min sketch, keys whose estimate reaches HOTKEY_THRESHOLD
+# within one window enter a top-k table. Hot keys are then served from
+# an in-process cache (HOTKEY_MODE=local) or from HOTKEY_REPLICAS copies
+# under different key names, read at random, so one key no longer pins
+# one Redis shard and connection (HOTKEY_MODE=replicate).
+#
+# Both copies have a TTL of a second or two, this bounds their
+# staleness. Writes made by this process drop them right away.
+
+HotKeyMode = Literal["local", "replicate"]
+
+HOTKEY_MODE: HotKeyMode = os.getenv("HOTKEY_MODE", "local")
+HOTKEY_THRESHOLD = int(os.getenv("HOTKEY_THRESHOLD", 500))
+HOTKEY_WINDOW = float(os.getenv("HOTKEY_WINDOW", 10))
+HOTKEY_TOP_K = int(os.getenv("HOTKEY_TOP_K", 50))
+HOTKEY_TTL = float(os.getenv("HOTKEY_TTL", 1))
+HOTKEY_REPLICAS = int(os.getenv("HOTKEY_REPLICAS", 8))
+
+SKETCH_WIDTH = 2048
+SKETCH_DEPTH = 4
+
+
+class CountMinSketch:
+    def __init__(self, width: int, depth: int):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+
+    def _indexes(self, key: str):
+        # One 16 bit slice of a single digest per row
+        digest = hashlib.blake2b(key.encode(), digest_size=2 * self.depth).digest()
+        return [int.from_bytes(digest[2 * i:2 * i + 2], "little") % self.width for i in range(self.depth)]
+
+    def add(self, key: str, amount: int = 1) -> int:
+        """Adds amount to key and returns its new estimate."""
+        estimate = None
+        for row, index in zip(self.rows, self._indexes(key)):
+            row[index] += amount
+            estimate = row[index] if estimate is None else min(estimate, row[index])
+        return estimate
+
+    def halve(self):
+        for row in self.rows:
+            for i in range(self.width):
+                row[i] >>= 1
+
+
+class HotKeyTracker:
+    def __init__(self):
+        self._lock = Lock()
+        self._sketch = CountMinSketch(SKETCH_WIDTH, SKETCH_DEPTH)
+        self._top: Dict[str, int] = {}
+        self._window_started = time.monotonic()
+        self._local: Dict[str, Tuple[float, bytes]] = {}
+
+    def _rotate(self, now: float):
+        # Halving instead of clearing keeps keys which stay hot across windows
+        self._sketch.halve()
+        self._top = {key: count >> 1 for key, count in self._top.items() if count >> 1 >= HOTKEY_THRESHOLD}
+        self._local = {key: entry for key, entry in self._local.items() if key in self._top}
+        self._window_started = now
+
+    def record(self, key: str) -> bool:
+        """Counts one access of key and returns whether it is hot."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_started >= HOTKEY_WINDOW:
+                self._rotate(now)
+
+            estimate = self._sketch.add(key)
+            if estimate < HOTKEY_THRESHOLD:
+                return False
+
+            if key not in self._top and len(self._top) >= HOTKEY_TOP_K:
+                coldest = min(self._top, key=self._top.get)
+                if self._top[coldest] >= estimate:
+                    return False
+                del self._top[coldest]
+                self._local.pop(coldest, None)
+            self._top[key] = estimate
+            return True
+
+    def is_hot(self, key: str) -> bool:
+        return key in self._top
+
+    def get_local(self, key: str) -> Optional[bytes]:
+        entry = self._local.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set_local(self, key: str, value: bytes):
+        self._local[key] = (time.monotonic() + HOTKEY_TTL, value)
+
+    def drop_local(self, key: str):
+        self._local.pop(key, None)
+
+    def top(self) -> List[Tuple[str, int]]:
+        with self._lock:
+            return sorted(self._top.items(), key=lambda item: item[1], reverse=True)
+
+
+tracker = HotKeyTracker()
+
+
+def is_hot(key: str) -> bool:
+    return tracker.is_hot(key)
+
+
+@fail_open()
+def get(key: str) -> Optional[bytes]:
+    """Returns the promoted copy of a hot key, None if the key is not hot or the copy expired."""
+    if not tracker.is_hot(key):
+        return None
+
+    if HOTKEY_MODE == "local":
+        return tracker.get_local(key)
+    return redis_binary_client.get(replica_cache_key(key, random.randrange(HOTKEY_REPLICAS)))
+
+
+@fail_open()
+def record(key: str, value: Optional[bytes] = None):
+    """Counts a read of key. value is what a read from the entity cache
+    returned, it is promoted when the key is hot. Reads served by get()
+    only count.
+    """
+    if not tracker.record(key) or value is None:
+        return
+
+    if HOTKEY_MODE == "local":
+        tracker.set_local(key, value)
+        return
+
+    pipe = redis_binary_client.pipeline(transaction=False)
+    for replica in range(HOTKEY_REPLICAS):
+        pipe.set(replica_cache_key(key, replica), value, px=int(HOTKEY_TTL * 1000))
+    pipe.execute()
+
+
+@fail_open()
+def invalidate(key: str):
+    if not tracker.is_hot(key):
+        return
+
+    tracker.drop_local(key)
+    if HOTKEY_MODE == "replicate":
+        redis_binary_client.unlink(*[replica_cache_key(key, replica) for replica in range(HOTKEY_REPLICAS)])
+
+
+def get_hot_keys() -> List[Tuple[str, int]]:
+    return tracker.top()
@@ -1,3 +1,4 @@
+from .redis_client import hash_tag
 
 
 def user_cache_key(user_id: int) -> str:
@@ -7,4 +8,66 @@ def community_cache_key(community_id: int) -> str:
     return f"com:{community_id}"
 
 def post_cache_key(post_id: int) -> str:
-    return f"post:{post_id}"
\ No newline at end of file
+    return f"post:{post_id}"
+
+def user_feed_cache_key(user_id: int) -> str:
+    return f"feed:{user_id}"
+
+def community_posts_cache_key(community_id: int) -> str:
+    return f"com:{community_id}:posts"
+
+def huge_communities_cache_key() -> str:
+    return "feed:huge"
+
+def community_rank_cache_key(sort: str, community_id: int) -> str:
+    return f"rank:{sort}:com:{community_id}"
+
+def global_rank_cache_key(sort: str) -> str:
+    return f"rank:{sort}:all"
+
+def rank_registry_cache_key() -> str:
+    return "rank:keys"
+
+def job_lock_cache_key(job_name: str) -> str:
+    return f"lock:{job_name}"
+
+def search_index_cache_key(kind: str, token: str) -> str:
+    # All index keys of a kind share a node, search unions them
+    return f"idx:{hash_tag(kind)}:{token}"
+
+def search_document_cache_key(kind: str, document_id: int) -> str:
+    return f"idx:doc:{kind}:{document_id}"
+
+def search_count_cache_key(kind: str) -> str:
+    return f"idx:count:{kind}"
+
+def community_names_cache_key() -> str:
+    return "com:names"
+
+def community_names_by_id_cache_key() -> str:
+    return "com:names:by_id"
+
+def generation_cache_key(key: str) -> str:
+    # Same node as key, the entity scripts use both
+    return f"{hash_tag(key)}:gen"
+
+def write_behind_stream_cache_key() -> str:
+    return "wb:events"
+
+def idempotency_cache_key(idempotency_key: str) -> str:
+    return f"wb:idem:{idempotency_key}"
+
+def pending_followers_cache_key(community_id: int) -> str:
+    return f"wb:follow:{community_id}"
+
+def dependents_cache_key(parent_key: str) -> str:
+    return f"deps:{parent_key}"
+
+def access_frequency_cache_key(kind: str) -> str:
+    return f"freq:{kind}"
+
+def replica_cache_key(key: str, replica: int) -> str:
+    return f"{key}:r{replica}"
+
+def ranked_response_cache_key(sort: str, community_id, limit: int, offset: int, encoding) -> str:
+    return f"resp:rank:{sort}:{community_id or 'all'}:{limit}:{offset}:{encoding or 'identity'}"
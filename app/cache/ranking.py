@@ -0,0 +1,158 @@
+from typing import Dict, Iterable, List, Literal, Set, Tuple
+import os
+
+from dotenv import load_dotenv
+
+from .redis_client import redis_client
+from .breaker import fail_open
+from .keys import (
+    community_rank_cache_key,
+    global_rank_cache_key,
+    rank_registry_cache_key
+)
+
+load_dotenv()
+
+SortMode = Literal["hot", "top", "new"]
+SORT_MODES = ("hot", "top", "new")
+
+RANK_MAX_LEN = int(os.getenv("RANK_MAX_LEN", 5000))
+RANK_DECAY_FACTOR = float(os.getenv("RANK_DECAY_FACTOR", 0.9))
+
+# Hot score contribution of each kind of activity
+HOT_POST_WEIGHT = 1.0
+HOT_COMMENT_WEIGHT = 1.0
+HOT_EDIT_WEIGHT = 0.5
+
+
+def _key(sort: SortMode, community_id: int = None) -> str:
+    if community_id is None:
+        return global_rank_cache_key(sort)
+    return community_rank_cache_key(sort, community_id)
+
+
+def _keys(sort: SortMode, community_id: int) -> List[str]:
+    return [community_rank_cache_key(sort, community_id), global_rank_cache_key(sort)]
+
+
+def _existing_keys(community_ids: Iterable[int]) -> Set[str]:
+    # Rankings which are not built yet are left alone, they are
+    # rebuilt from the database on the next read.
+    keys = list({key for community_id in community_ids for sort in SORT_MODES for key in _keys(sort, community_id)})
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.exists(key)
+    return {key for key, exists in zip(keys, pipe.execute()) if exists}
+
+
+def is_ranking_exist(sort: SortMode, community_id: int = None) -> bool:
+    return bool(redis_client.exists(_key(sort, community_id)))
+
+
+def add_post(community_id: int, post_id: int, created: float):
+    add_posts([(community_id, post_id, created)])
+
+
+@fail_open()
+def add_posts(posts: List[Tuple[int, int, float]]):
+    """posts are (community_id, post_id, created) tuples, added in one pipeline."""
+    if not posts:
+        return
+    existing = _existing_keys({community_id for community_id, _, _ in posts})
+
+    scores: Dict[str, Dict[int, float]] = {}
+    for community_id, post_id, created in posts:
+        for sort, score in (("new", created), ("hot", HOT_POST_WEIGHT), ("top", 0)):
+            for key in _keys(sort, community_id):
+                if key in existing:
+                    scores.setdefault(key, {})[post_id] = score
+
+    pipe = redis_client.pipeline(transaction=False)
+    for key, members in scores.items():
+        pipe.zadd(key, members)
+    pipe.execute()
+
+
+@fail_open()
+def remove_post(community_id: int, post_id: int):
+    pipe = redis_client.pipeline(transaction=False)
+    for sort in SORT_MODES:
+        for key in _keys(sort, community_id):
+            pipe.zrem(key, post_id)
+    pipe.execute()
+
+
+@fail_open()
+def edit_post(community_id: int, post_id: int, edited: float):
+    existing = _existing_keys([community_id])
+    pipe = redis_client.pipeline(transaction=False)
+    for key in _keys("new", community_id):
+        if key in existing:
+            pipe.zadd(key, {post_id: edited})
+    for key in _keys("hot", community_id):
+        if key in existing:
+            pipe.zincrby(key, HOT_EDIT_WEIGHT, post_id)
+    pipe.execute()
+
+
+def add_comment(community_id: int, post_id: int, count: int = 1):
+    add_comments({(community_id, post_id): count})
+
+
+@fail_open()
+def add_comments(counts: Dict[Tuple[int, int], int]):
+    """counts maps (community_id, post_id) to the number of comments added, negative for removed ones."""
+    if not counts:
+        return
+    existing = _existing_keys({community_id for community_id, _ in counts})
+
+    pipe = redis_client.pipeline(transaction=False)
+    for (community_id, post_id), count in counts.items():
+        for key in _keys("top", community_id):
+            if key in existing:
+                pipe.zincrby(key, count, post_id)
+        if count > 0:
+            for key in _keys("hot", community_id):
+                if key in existing:
+                    pipe.zincrby(key, HOT_COMMENT_WEIGHT * count, post_id)
+    pipe.execute()
+
+
+@fail_open()
+def fill_ranking(sort: SortMode, community_id: int, scores: Dict[int, float]):
+    key = _key(sort, community_id)
+    pipe = redis_client.pipeline(transaction=False)
+    # Placeholder so an empty ranking is not rebuilt on every read
+    pipe.zadd(key, scores or {0: float("-inf")})
+    pipe.sadd(rank_registry_cache_key(), key)
+    pipe.execute()
+
+
+def get_ranked_ids(
+    sort: SortMode,
+    community_id: int,
+    limit: int,
+    offset: int
+) -> List[int]:
+    members = redis_client.zrevrange(_key(sort, community_id), offset, offset + limit - 1)
+    return [int(m) for m in members if int(m)]
+
+
+@fail_open()
+def remove_ranked_ids(sort: SortMode, community_id: int, post_ids: List[int]):
+    if post_ids:
+        redis_client.zrem(_key(sort, community_id), *post_ids)
+
+
+def decay_rankings() -> int:
+    """Decays hot scores and trims every ranking to RANK_MAX_LEN. Returns the number of keys processed."""
+    keys = redis_client.smembers(rank_registry_cache_key())
+
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        if key.startswith("rank:hot:"):
+            pipe.zunionstore(key, {key: RANK_DECAY_FACTOR})
+        pipe.zremrangebyrank(key, 0, -(RANK_MAX_LEN + 1))
+    pipe.execute()
+
+    return len(keys)
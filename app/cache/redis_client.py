@@ -1,8 +1,296 @@
+from bisect import bisect
+from typing import Callable, Dict, List
+import hashlib
+import os
+
 import redis
+from redis.cluster import RedisCluster
+from redis.commands.core import Script
+from redis.exceptions import ResponseError
+from dotenv import load_dotenv
+
+from .breaker import BreakerClient
+
+load_dotenv()
+
+# REDIS_MODE selects the backend:
+#   single   one node at REDIS_URL
+#   cluster  Redis Cluster, REDIS_URL is any of its nodes
+#   sharded  client-side consistent hashing over REDIS_SHARD_URLS
+#
+# In cluster and sharded mode keys are routed by their hash tag, the
+# part between the first "{" and the following "}", so keys which are
+# used together in a script or a multi-key command share a node. Key
+# functions in keys.py add the tags through hash_tag().
+
+REDIS_MODE = os.getenv("REDIS_MODE", "single")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_SHARD_URLS = [url for url in os.getenv("REDIS_SHARD_URLS", "").split(",") if url]
+REDIS_VIRTUAL_NODES = int(os.getenv("REDIS_VIRTUAL_NODES", 160))
+
+# A stalled node fails the call instead of hanging the request
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 0.25))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 0.25))
+# Blocking reads (XREADGROUP BLOCK) wait on the server, their timeout has
+# to be longer than the block time or every idle read fails
+REDIS_BLOCKING_SOCKET_TIMEOUT = float(os.getenv("REDIS_BLOCKING_SOCKET_TIMEOUT", 5))
+
+# Commands whose keys may live on several nodes
+MULTI_KEY_COMMANDS = {"delete", "unlink", "exists"}
+# Commands without a key run on every node, their results are combined
+ALL_NODES_COMMANDS = {
+    "ping": all,
+    "flushdb": all,
+    "flushall": all,
+    "dbsize": sum,
+    "script_load": lambda shas: shas[0],
+    "info": list
+}
+
+
+def hash_tag(value: str) -> str:
+    if REDIS_MODE == "single":
+        return value
+    return "{" + value + "}"
+
+
+def _routing_key(key) -> bytes:
+    key = key.encode() if isinstance(key, str) else key
+    start = key.find(b"{")
+    if start != -1:
+        end = key.find(b"}", start + 1)
+        if end > start + 1:
+            return key[start + 1:end]
+    return key
+
+
+def _hash(value: bytes) -> int:
+    return int.from_bytes(hashlib.md5(value).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hashing with virtual nodes, adding a node moves about 1/N of the keys."""
+
+    def __init__(self, nodes: Dict[str, redis.Redis], virtual_nodes: int):
+        points = sorted(
+            (_hash(f"{name}#{i}".encode()), name)
+            for name in nodes for i in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._names = [name for _, name in points]
+        self.nodes = nodes
+
+    def get_node(self, key) -> redis.Redis:
+        index = bisect(self._hashes, _hash(_routing_key(key))) % len(self._hashes)
+        return self.nodes[self._names[index]]
+
+
+def _first_key(command: str, args: tuple, kwargs: dict):
+    if command == "xreadgroup":
+        streams = kwargs.get("streams") or args[2]
+        return next(iter(streams))
+    if args:
+        return args[0]
+    if "name" in kwargs:
+        return kwargs["name"]
+    raise ValueError(f"{command} has no key, it can not be routed to a node")
+
+
+class RoutedPipeline:
+    """Pipeline over several nodes: commands are queued on one pipeline
+    per node, executed node by node and their results put back in the
+    order the commands were queued.
+    """
+
+    def __init__(self, client: "RoutedRedis"):
+        self._client = client
+        self._pipelines: Dict[int, redis.client.Pipeline] = {}
+        self._order: List[tuple] = []
+
+    def pipeline_for(self, node: redis.Redis):
+        pipe = self._pipelines.get(id(node))
+        if pipe is None:
+            pipe = self._pipelines[id(node)] = node.pipeline(transaction=False)
+        return pipe
+
+    def queued(self, pipe):
+        self._order.append((id(pipe), len(pipe.command_stack) - 1))
+
+    def __getattr__(self, command: str):
+        def queue(*args, **kwargs):
+            pipe = self.pipeline_for(self._client.node_for_key(_first_key(command, args, kwargs)))
+            getattr(pipe, command)(*args, **kwargs)
+            self.queued(pipe)
+            return self
+        return queue
+
+    def execute(self, raise_on_error: bool = True) -> list:
+        results = {}
+        for pipe in self._pipelines.values():
+            results[id(pipe)] = pipe.execute(raise_on_error=False)
+        self._pipelines = {}
+
+        ordered = [results[pipe_id][index] for pipe_id, index in self._order]
+        self._order = []
+
+        errors = [result for result in ordered if isinstance(result, ResponseError)]
+        if errors:
+            self._client.on_error(errors)
+            if raise_on_error:
+                raise errors[0]
+        return ordered
+
+
+class RoutedScript:
+    def __init__(self, client: "RoutedRedis", source: str):
+        self._client = client
+        self._source = source
+        self._scripts: Dict[int, Script] = {}
+
+    def _script_for(self, node: redis.Redis) -> Script:
+        script = self._scripts.get(id(node))
+        if script is None:
+            script = self._scripts[id(node)] = Script(node, self._source)
+        return script
+
+    def __call__(self, keys: list = (), args: list = (), client=None):
+        # Every key of a script has to share the node of the first one
+        node = self._client.node_for_key(keys[0])
+        if isinstance(client, RoutedPipeline):
+            pipe = client.pipeline_for(node)
+            self._script_for(node)(keys=keys, args=args, client=pipe)
+            client.queued(pipe)
+            return client
+        return self._script_for(node)(keys=keys, args=args)
+
+
+class RoutedRedis:
+    """Cluster or sharded client with the interface of redis.Redis used by the cache modules.
+
+    Single commands go to the node of their first key, keyless commands
+    in ALL_NODES_COMMANDS to every node. In cluster mode they are sent
+    through RedisCluster, which follows redirects.
+    Pipelines and scripts always go to node connections, since cluster
+    pipelines can not run scripts.
+    """
+
+    def __init__(
+        self,
+        node_for_key: Callable,
+        nodes: Callable,
+        cluster: RedisCluster = None,
+        on_error: Callable = None
+    ):
+        self.node_for_key = node_for_key
+        self.nodes = nodes
+        self._cluster = cluster
+        self._on_error = on_error
+
+    def on_error(self, errors: List[ResponseError]):
+        if self._on_error:
+            self._on_error(errors)
+
+    def pipeline(self, transaction: bool = False) -> RoutedPipeline:
+        return RoutedPipeline(self)
+
+    def register_script(self, source: str) -> RoutedScript:
+        return RoutedScript(self, source)
+
+    def mget(self, keys: list) -> list:
+        pipe = self.pipeline()
+        for key in keys:
+            pipe.get(key)
+        return pipe.execute()
+
+    def __getattr__(self, command: str):
+        if self._cluster is not None:
+            return getattr(self._cluster, command)
+
+        if command in MULTI_KEY_COMMANDS:
+            def grouped(*keys):
+                by_node = {}
+                for key in keys:
+                    node = self.node_for_key(key)
+                    by_node.setdefault(id(node), (node, []))[1].append(key)
+                return sum(getattr(node, command)(*node_keys) for node, node_keys in by_node.values())
+            return grouped
+
+        if command in ALL_NODES_COMMANDS:
+            def fanned_out(*args, **kwargs):
+                results = [getattr(node, command)(*args, **kwargs) for node in self.nodes()]
+                return ALL_NODES_COMMANDS[command](results)
+            return fanned_out
+
+        def routed(*args, **kwargs):
+            return getattr(self.node_for_key(_first_key(command, args, kwargs)), command)(*args, **kwargs)
+        return routed
+
+
+def _options(decode_responses: bool, socket_timeout: float) -> dict:
+    return {
+        "decode_responses": decode_responses,
+        "socket_timeout": socket_timeout,
+        "socket_connect_timeout": REDIS_CONNECT_TIMEOUT
+    }
+
+
+def _sharded_client(decode_responses: bool, socket_timeout: float) -> RoutedRedis:
+    nodes = {url: redis.Redis.from_url(url, **_options(decode_responses, socket_timeout)) for url in REDIS_SHARD_URLS}
+    return RoutedRedis(HashRing(nodes, REDIS_VIRTUAL_NODES).get_node, lambda: list(nodes.values()))
+
+
+def _cluster_client(decode_responses: bool, socket_timeout: float) -> RoutedRedis:
+    cluster = RedisCluster.from_url(REDIS_URL, **_options(decode_responses, socket_timeout))
+
+    def node_for_key(key):
+        return cluster.get_redis_connection(cluster.get_node_from_key(key))
+
+    def nodes():
+        return [node.redis_connection for node in cluster.get_nodes() if node.redis_connection is not None]
+
+    def on_error(errors):
+        # Slots moved since the last topology refresh, the next call routes by the new one
+        if any(str(e).startswith(("MOVED", "ASK")) for e in errors):
+            cluster.nodes_manager.initialize()
+
+    return RoutedRedis(node_for_key, nodes, cluster, on_error)
+
+
+def create_client(decode_responses: bool, socket_timeout: float = REDIS_SOCKET_TIMEOUT) -> BreakerClient:
+    if REDIS_MODE == "cluster":
+        client = _cluster_client(decode_responses, socket_timeout)
+    elif REDIS_MODE == "sharded":
+        client = _sharded_client(decode_responses, socket_timeout)
+    else:
+        client = redis.Redis.from_url(REDIS_URL, **_options(decode_responses, socket_timeout))
+    return BreakerClient(client)
+
+
+redis_client = create_client(decode_responses=True)
+
+# Entity hashes are joined into responses from their raw JSON fragments,
+# they and the hot copies are read as bytes
+redis_binary_client = create_client(decode_responses=False)
+
+# Only for blocking reads, so their long timeout never holds up a request
+redis_blocking_client = create_client(decode_responses=True, socket_timeout=REDIS_BLOCKING_SOCKET_TIMEOUT)
+
+
+def _connection_pools():
+    for client in (redis_client, redis_binary_client, redis_blocking_client):
+        inner = client.wrapped
+        for node in (inner.nodes() if isinstance(inner, RoutedRedis) else [inner]):
+            yield node.connection_pool
+
+
+def reset_pools():
+    """Drops connections inherited from the parent process, a forked
+    worker opens its own on first use.
+    """
+    for pool in _connection_pools():
+        pool.reset()
+
 
-redis_client = redis.Redis(
-    host="localhost",
-    port=6379,
-    db=0,
-    decode_responses=True
-)
\ No newline at end of file
+def disconnect_pools():
+    for pool in _connection_pools():
+        pool.disconnect()
@@ -0,0 +1,163 @@
+from typing import Dict, List, Literal, Tuple
+from collections import Counter
+from uuid import uuid4
+import math
+import re
+
+from .redis_client import redis_client
+from .breaker import fail_open
+from .keys import (
+    search_index_cache_key,
+    search_document_cache_key,
+    search_count_cache_key
+)
+
+DocumentKind = Literal["post", "comment", "com"]
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+MIN_TOKEN_LEN = 2
+MIN_PREFIX_LEN = 2
+MAX_PREFIX_LEN = 20
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in",
+    "is", "it", "of", "on", "or", "that", "the", "this", "to", "was", "with"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        token for token in TOKEN_PATTERN.findall((text or "").lower())
+        if len(token) >= MIN_TOKEN_LEN and token not in STOP_WORDS
+    ]
+
+
+def prefixes(token: str) -> List[str]:
+    return [token[:i] for i in range(MIN_PREFIX_LEN, min(len(token), MAX_PREFIX_LEN) + 1)]
+
+
+def weigh_fields(fields: List[Tuple[str, float]], with_prefixes: bool = False) -> Dict[str, float]:
+    """Turns (text, weight) pairs into {token: score}, summing the weights of repeated tokens."""
+    scores = Counter()
+    for text, weight in fields:
+        for token in tokenize(text):
+            scores[token] += weight
+            if with_prefixes:
+                for prefix in prefixes(token):
+                    # Prefix matches rank below whole word matches
+                    if prefix != token:
+                        scores[prefix] += weight / 2
+    return dict(scores)
+
+
+def get_missing_indexes(kinds: List[DocumentKind]) -> List[DocumentKind]:
+    """Returns the kinds whose index is not built, their document count is the marker."""
+    pipe = redis_client.pipeline(transaction=False)
+    for kind in kinds:
+        pipe.exists(search_count_cache_key(kind))
+    return [kind for kind, exists in zip(kinds, pipe.execute()) if not exists]
+
+
+def start_index(kind: DocumentKind):
+    # Documents created from now on are indexed as they come, alongside the rebuild
+    redis_client.set(search_count_cache_key(kind), 0, nx=True)
+
+
+@fail_open()
+def drop_index_count(kind: DocumentKind):
+    # A rebuild which failed is started again by the next search
+    redis_client.delete(search_count_cache_key(kind))
+
+
+@fail_open()
+def remove_document(kind: DocumentKind, document_id: int):
+    doc_key = search_document_cache_key(kind, document_id)
+    tokens = redis_client.smembers(doc_key)
+    if not tokens:
+        return
+
+    pipe = redis_client.pipeline(transaction=False)
+    for token in tokens:
+        pipe.zrem(search_index_cache_key(kind, token), document_id)
+    pipe.delete(doc_key)
+    pipe.decr(search_count_cache_key(kind))
+    pipe.execute()
+
+
+@fail_open()
+def index_document(kind: DocumentKind, document_id: int, scores: Dict[str, float]):
+    remove_document(kind, document_id)
+    # Without the index, the document is picked up when it is rebuilt
+    if not scores or not redis_client.exists(search_count_cache_key(kind)):
+        return
+
+    doc_key = search_document_cache_key(kind, document_id)
+    pipe = redis_client.pipeline(transaction=False)
+    for token, score in scores.items():
+        pipe.zadd(search_index_cache_key(kind, token), {document_id: score})
+    pipe.sadd(doc_key, *scores.keys())
+    pipe.incr(search_count_cache_key(kind))
+    pipe.execute()
+
+
+@fail_open()
+def add_documents(kind: DocumentKind, documents: Dict[int, Dict[str, float]]):
+    """Indexes {document_id: scores} of documents which are not indexed yet, e.g. new ones.
+
+    Documents which are already indexed, e.g. by a create during a
+    rebuild, are skipped, so the document count stays right.
+    """
+    documents = {document_id: scores for document_id, scores in documents.items() if scores}
+    if not documents:
+        return
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.exists(search_count_cache_key(kind))
+    for document_id in documents:
+        pipe.exists(search_document_cache_key(kind, document_id))
+    index_exists, *indexed = pipe.execute()
+    if not index_exists:
+        return
+    documents = {
+        document_id: scores
+        for (document_id, scores), exists in zip(documents.items(), indexed) if not exists
+    }
+    if not documents:
+        return
+
+    pipe = redis_client.pipeline(transaction=False)
+    for document_id, scores in documents.items():
+        for token, score in scores.items():
+            pipe.zadd(search_index_cache_key(kind, token), {document_id: score})
+        pipe.sadd(search_document_cache_key(kind, document_id), *scores.keys())
+    pipe.incrby(search_count_cache_key(kind), len(documents))
+    pipe.execute()
+
+
+def search(kind: DocumentKind, tokens: List[str], limit: int) -> List[int]:
+    """Returns ids of documents matching any of the tokens, best tf-idf score first."""
+    if not tokens:
+        return []
+
+    keys = [search_index_cache_key(kind, token) for token in set(tokens)]
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.get(search_count_cache_key(kind))
+    for key in keys:
+        pipe.zcard(key)
+    total, *frequencies = pipe.execute()
+
+    total = max(int(total or 0), 1)
+    weights = {
+        key: math.log(1 + total / frequency)
+        for key, frequency in zip(keys, frequencies) if frequency
+    }
+    if not weights:
+        return []
+
+    result_key = search_index_cache_key(kind, f"tmp:{uuid4()}")
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zunionstore(result_key, weights)
+    pipe.zrevrange(result_key, 0, limit - 1)
+    pipe.delete(result_key)
+    _, ids, _ = pipe.execute()
+
+    return [int(i) for i in ids]
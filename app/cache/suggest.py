@@ -0,0 +1,84 @@
+from typing import Iterable, List, Tuple
+
+from .redis_client import redis_client
+from .breaker import fail_open
+from .keys import community_names_cache_key, community_names_by_id_cache_key
+
+# Members look like "<lowercase name>\0<name>\0<id>", so ZRANGEBYLEX on the
+# lowercase part gives case-insensitive prefix matches without extra lookups.
+SEPARATOR = "\x00"
+MAX_CHAR = "\U0010ffff"
+
+
+def _member(community_id: int, name: str) -> str:
+    return SEPARATOR.join((name.lower(), name, str(community_id)))
+
+
+def is_index_exist() -> bool:
+    return bool(redis_client.exists(community_names_cache_key()))
+
+
+@fail_open()
+def add_name(community_id: int, name: str):
+    old_member = redis_client.hget(community_names_by_id_cache_key(), community_id)
+    member = _member(community_id, name)
+
+    pipe = redis_client.pipeline(transaction=False)
+    if old_member:
+        pipe.zrem(community_names_cache_key(), old_member)
+    pipe.zadd(community_names_cache_key(), {member: 0})
+    pipe.hset(community_names_by_id_cache_key(), community_id, member)
+    pipe.execute()
+
+
+@fail_open()
+def add_names(names: Iterable[Tuple[int, str]]):
+    pipe = redis_client.pipeline(transaction=False)
+    for community_id, name in names:
+        member = _member(community_id, name)
+        pipe.zadd(community_names_cache_key(), {member: 0})
+        pipe.hset(community_names_by_id_cache_key(), community_id, member)
+    pipe.execute()
+
+
+@fail_open()
+def remove_name(community_id: int):
+    member = redis_client.hget(community_names_by_id_cache_key(), community_id)
+    if not member:
+        return
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zrem(community_names_cache_key(), member)
+    pipe.hdel(community_names_by_id_cache_key(), community_id)
+    pipe.execute()
+
+
+@fail_open()
+def remove_names(community_ids: List[int]):
+    if not community_ids:
+        return
+    members = redis_client.hmget(community_names_by_id_cache_key(), community_ids)
+    members = [member for member in members if member]
+
+    pipe = redis_client.pipeline(transaction=False)
+    if members:
+        pipe.zrem(community_names_cache_key(), *members)
+    pipe.hdel(community_names_by_id_cache_key(), *community_ids)
+    pipe.execute()
+
+
+def suggest(prefix: str, limit: int) -> List[Tuple[int, str]]:
+    prefix = prefix.lower()
+    members = redis_client.zrangebylex(
+        community_names_cache_key(),
+        f"[{prefix}",
+        f"[{prefix}{MAX_CHAR}",
+        start=0,
+        num=limit
+    )
+
+    suggestions = []
+    for member in members:
+        _, name, community_id = member.split(SEPARATOR)
+        suggestions.append((int(community_id), name))
+    return suggestions
@@ -1,43 +1,42 @@
-from .redis_client import redis_client
-from app.db.models import (Community as CommunityDB,
-                           Post as PostDB
-                           )
+from typing import Optional
+
+from .redis_client import redis_client, redis_binary_client
+from .breaker import fail_open
 from app.schemas.community import Community
 from app.schemas.post import Post
 
 
-def get_cache(key: str):
-    return redis_client.get(key)
+@fail_open()
+def get_cache(key: str) -> Optional[bytes]:
+    return redis_binary_client.get(key)
 
-def set_cache(key: str, value: str, ttl: int = 120):
-    redis_client.set(key, value, ttl)
+@fail_open()
+def set_cache(key: str, value: bytes, ttl: int = 120):
+    redis_binary_client.set(key, value, ttl)
 
+@fail_open()
 def delete_cache(key: str):
-    redis_client.delete(key)
-
+    redis_binary_client.delete(key)
 
+@fail_open(False)
+def acquire_lock(key: str, ttl: int) -> bool:
+    return bool(redis_client.set(key, "1", nx=True, ex=ttl))
 
-def serialize_community(community: CommunityDB) -> str:
-    return Community.from_orm(community).model_dump_json()
 
 
-def deserialize_community(data: str) -> Community:
+def deserialize_community(data: bytes) -> Community:
     if not data:
         return None
     try:
         return Community.model_validate_json(data)
-    except:
+    except Exception:
         return None
-    
-
-def serialize_post(post: PostDB) -> str:
-    return Post.from_orm(post).model_dump_json()
 
 
-def deserialize_post(data: str) -> Post:
+def deserialize_post(data: bytes) -> Post:
     if not data:
         return None
     try:
         return Post.model_validate_json(data)
-    except:
+    except Exception:
         return None
@@ -0,0 +1,111 @@
+from typing import Dict, List, Optional, Tuple
+import os
+import socket
+
+from dotenv import load_dotenv
+from redis.exceptions import ResponseError
+
+from .redis_client import redis_client, redis_blocking_client, REDIS_BLOCKING_SOCKET_TIMEOUT
+from .breaker import fail_open
+from .keys import (
+    write_behind_stream_cache_key,
+    idempotency_cache_key,
+    pending_followers_cache_key
+)
+
+load_dotenv()
+
+STREAM_MAX_LEN = int(os.getenv("WRITE_BEHIND_STREAM_MAX_LEN", 1000000))
+IDEMPOTENCY_TTL = int(os.getenv("WRITE_BEHIND_IDEMPOTENCY_TTL", 24 * 3600))
+# Events delivered to a consumer which died are taken over after this long
+CLAIM_IDLE_MS = int(os.getenv("WRITE_BEHIND_CLAIM_IDLE_MS", 60000))
+PENDING_TTL = 3600
+# A blocking read returns well before the socket timeout of its client
+MAX_BLOCK_MS = int(REDIS_BLOCKING_SOCKET_TIMEOUT * 1000 / 2)
+
+GROUP = "flushers"
+
+_CLEAR_PENDING = redis_client.register_script("""
+if redis.call("HGET", KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call("HDEL", KEYS[1], ARGV[1])
+end
+return 0
+""")
+
+
+def _consumer() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def ensure_group():
+    try:
+        redis_client.xgroup_create(write_behind_stream_cache_key(), GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def claim_idempotency_key(key: str) -> bool:
+    """Returns False if an event with this key was already recorded."""
+    return bool(redis_client.set(idempotency_cache_key(key), "1", nx=True, ex=IDEMPOTENCY_TTL))
+
+
+@fail_open(False)
+def is_idempotency_key_claimed(key: str) -> bool:
+    return bool(redis_client.exists(idempotency_cache_key(key)))
+
+
+def record_event(event: Dict[str, str]) -> str:
+    return redis_client.xadd(
+        write_behind_stream_cache_key(),
+        event,
+        maxlen=STREAM_MAX_LEN,
+        approximate=True
+    )
+
+
+def set_pending_follow(community_id: int, user_id: int, follow: bool):
+    key = pending_followers_cache_key(community_id)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hset(key, user_id, int(follow))
+    pipe.expire(key, PENDING_TTL)
+    pipe.execute()
+
+
+@fail_open()
+def get_pending_follow(community_id: int, user_id: int) -> Optional[bool]:
+    state = redis_client.hget(pending_followers_cache_key(community_id), user_id)
+    return None if state is None else state == "1"
+
+
+def clear_pending_follows(changes: Dict[Tuple[int, int], bool]):
+    # Only cleared if no newer toggle was recorded after the flushed one
+    pipe = redis_client.pipeline(transaction=False)
+    for (community_id, user_id), follow in changes.items():
+        _CLEAR_PENDING(
+            keys=[pending_followers_cache_key(community_id)],
+            args=[user_id, int(follow)],
+            client=pipe
+        )
+    pipe.execute()
+
+
+def read_events(count: int, block_ms: int) -> List[Tuple[str, Dict[str, str]]]:
+    stream = write_behind_stream_cache_key()
+
+    # Events left unacknowledged by a crashed consumer go first
+    _, claimed, *_ = redis_client.xautoclaim(stream, GROUP, _consumer(), CLAIM_IDLE_MS, start_id="0-0", count=count)
+    if claimed:
+        return claimed
+
+    response = redis_blocking_client.xreadgroup(
+        GROUP, _consumer(), {stream: ">"}, count=count, block=min(block_ms, MAX_BLOCK_MS)
+    )
+    if not response:
+        return []
+    return response[0][1]
+
+
+def ack_events(event_ids: List[str]):
+    if event_ids:
+        redis_client.xack(write_behind_stream_cache_key(), GROUP, *event_ids)
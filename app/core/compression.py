@@ -0,0 +1,125 @@
+from typing import Optional
+import os
+import time
+import zlib
+
+from dotenv import load_dotenv
+
+from app.core import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+load_dotenv()
+
+# HTTP response compression. The encoding is picked from Accept-Encoding
+# by the client's q-values, ties go to the first of COMPRESSION_ENCODINGS.
+# Bodies under COMPRESSION_MIN_SIZE are sent as they are, below about a
+# kilobyte the saved bytes do not pay for the CPU.
+#
+# Bytes in and out and the CPU time are counted per encoding under
+# /admin/metrics, e.g. compression_br_bytes_out_total.
+
+COMPRESSION_ENCODINGS = [e for e in os.getenv("COMPRESSION_ENCODINGS", "br,zstd,gzip").split(",") if e]
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", 3))
+
+COMPRESSIBLE_TYPES = {"application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html"}
+
+
+def _available(encoding: str) -> bool:
+    if encoding == "br":
+        return brotli is not None
+    if encoding == "zstd":
+        return zstandard is not None
+    return encoding == "gzip"
+
+
+ENCODINGS = [e for e in COMPRESSION_ENCODINGS if _available(e)]
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Returns the encoding to answer with, None for an uncompressed body."""
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.split(";")[0].strip().lower() in COMPRESSIBLE_TYPES
+
+
+def _count(encoding: str, size_in: int, size_out: int, started: float):
+    metrics.incr(f"compression_{encoding}_bytes_in_total", size_in)
+    metrics.incr(f"compression_{encoding}_bytes_out_total", size_out)
+    metrics.incr(f"compression_{encoding}_seconds_total", time.perf_counter() - started)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    started = time.perf_counter()
+    if encoding == "br":
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    elif encoding == "zstd":
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    else:
+        compressed = zlib.compress(body, GZIP_LEVEL, wbits=31)
+    _count(encoding, len(body), len(compressed), started)
+    return compressed
+
+
+class StreamCompressor:
+    """Compresses a body chunk by chunk. Every chunk is flushed, so a
+    client reading a long stream, e.g. an export, gets the data as it is
+    produced.
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def _process(self, chunk: bytes, last: bool) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + (self._compressor.finish() if last else self._compressor.flush())
+        if self.encoding == "zstd":
+            mode = zstandard.COMPRESSOBJ_FLUSH_FINISH if last else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            return self._compressor.compress(chunk) + self._compressor.flush(mode)
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+    def compress(self, chunk: bytes, last: bool = False) -> bytes:
+        started = time.perf_counter()
+        compressed = self._process(chunk, last)
+        _count(self.encoding, len(chunk), len(compressed), started)
+        return compressed
@@ -12,8 +12,12 @@ from app.crud.user import get_user_by_username
 
 
 
-def get_db():
-    db = Sessionmaker()
+READ_METHODS = {"GET", "HEAD"}
+
+
+def get_db(request: Request):
+    # Reads of GET requests go to a replica until the request writes something
+    db = Sessionmaker(info={"read_only": request.method in READ_METHODS})
     try:
         yield db
     finally:
@@ -0,0 +1,101 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+import os
+import re
+
+from dotenv import load_dotenv
+from fastapi import Response
+
+from app.core.responses import RawJSONResponse
+
+load_dotenv()
+
+# Entities carry a version which every edit bumps. GETs tag it as a
+# weak entity tag, e.g. W/"3", since counters (view_count,
+# comments_count) change the body without an edit. PUT responses tag it
+# as a strong one, "3", which the next PUT sends back in If-Match: the
+# edit is then only applied to that version. If-Match uses the strong
+# comparison (RFC 9110), so a weak tag never matches and the edit fails
+# with 412.
+#
+# GETs answer If-None-Match (and If-Modified-Since for entities with a
+# modification time) with 304, and send ENTITY_CACHE_CONTROL so a proxy
+# or CDN in front of the API may keep and revalidate the responses.
+
+ENTITY_CACHE_CONTROL = os.getenv("ENTITY_CACHE_CONTROL", "public, no-cache")
+
+_ENTITY_TAG = re.compile(r'^(W/)?"(\d+)"$')
+
+
+def make_etag(version: int, weak: bool = True) -> str:
+    return f'W/"{version}"' if weak else f'"{version}"'
+
+
+def _parse(tag: str, strong: bool = False) -> Optional[int]:
+    match = _ENTITY_TAG.match(tag.strip())
+    if not match or (strong and match.group(1)):
+        return None
+    return int(match.group(2))
+
+
+def parse_if_match(value: Optional[str]) -> Optional[int]:
+    """Returns the version an edit requires, None if it may apply to any version.
+
+    Weak tags and tags which are not ours can never match, they are
+    returned as version 0, which no row has, so the edit fails with 412.
+    """
+    if value is None or value.strip() == "*":
+        return None
+    version = _parse(value, strong=True)
+    return 0 if version is None else version
+
+
+def is_not_modified(
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+    version: int,
+    last_modified: Optional[datetime] = None
+) -> bool:
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is sent
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or version in {_parse(tag) for tag in tags}
+
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    return _utc(last_modified).replace(microsecond=0) <= since
+
+
+def _utc(value: datetime) -> datetime:
+    # Timestamps are stored as naive UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def validator_headers(version: int, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    headers = {"ETag": make_etag(version), "Cache-Control": ENTITY_CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_utc(last_modified), usegmt=True)
+    return headers
+
+
+def not_modified_response(version: int, last_modified: Optional[datetime] = None) -> Response:
+    return Response(status_code=304, headers=validator_headers(version, last_modified))
+
+
+def entity_response(
+    body: bytes,
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+    version: int,
+    last_modified: Optional[datetime] = None
+) -> Response:
+    if is_not_modified(if_none_match, if_modified_since, version, last_modified):
+        return not_modified_response(version, last_modified)
+    return RawJSONResponse(body, headers=validator_headers(version, last_modified))
@@ -16,6 +16,14 @@ file_handler.setFormatter(logging.Formatter("%(message)s"))
 base_logger = logging.getLogger("app")
 base_logger.addHandler(file_handler)
 
+
+def reopen_log_file():
+    """Gives a forked worker its own descriptor of the log file instead of the parent's."""
+    stream = open(file_handler.baseFilename, file_handler.mode, encoding=file_handler.encoding)
+    old_stream = file_handler.setStream(stream)
+    if old_stream is not None:
+        old_stream.close()
+
 logger = wrap_logger(
     base_logger,
     processors=[
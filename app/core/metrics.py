@@ -0,0 +1,26 @@
+from collections import defaultdict
+from threading import Lock
+from typing import Dict
+
+# Process-local counters and gauges. Every worker process keeps its own
+# values, they are exposed as they are under /admin/metrics.
+
+_lock = Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_gauges: Dict[str, float] = {}
+
+
+
+def incr(name: str, amount: float = 1):
+    with _lock:
+        _counters[name] += amount
+
+
+def set_gauge(name: str, value: float):
+    with _lock:
+        _gauges[name] = value
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    with _lock:
+        return {"counters": dict(_counters), "gauges": dict(_gauges)}
@@ -0,0 +1,22 @@
+from typing import Iterable, Optional
+from fastapi import Response
+
+
+class RawJSONResponse(Response):
+    """Response for bodies which are already serialized JSON, e.g. cache entries."""
+    media_type = "application/json"
+
+
+def json_list(fragments: Iterable[bytes]) -> bytes:
+    return b"[" + b",".join(fragments) + b"]"
+
+
+def json_list_response(fragments: Iterable[bytes]) -> RawJSONResponse:
+    return RawJSONResponse(json_list(fragments))
+
+
+def encoded_json_response(body: bytes, encoding: Optional[str]) -> RawJSONResponse:
+    """Response for a body which is already compressed with encoding, None if it is not."""
+    if encoding is None:
+        return RawJSONResponse(body)
+    return RawJSONResponse(body, headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
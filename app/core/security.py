@@ -1,7 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 from jose import jwt
 from datetime import datetime, timedelta
-from typing import Literal
+from typing import List, Literal
 
 from app.schemas.user import User
 
@@ -17,10 +18,17 @@ ACCESS_TOKEN_EXPIRE_MINUTER = 30
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt releases the GIL, bulk imports hash their passwords on several cores
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
+def hash_passwords(passwords: List[str]) -> List[str]:
+    return list(_hash_executor.map(hash_password, passwords))
+
 def verify_password(plain_password, hashed_password) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
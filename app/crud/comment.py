@@ -1,8 +1,12 @@
-from typing import List
+from typing import List, Optional
+from sqlalchemy import Integer, column, insert, select, update, values
 from sqlalchemy.orm import Session
 
-from app.db.models import Comment as CommentDB
+from app.db.models import Comment as CommentDB, Post as PostDB
 from app.schemas.comment import CommentCreate
+from app.crud.projections import COMMENT_COLUMNS
+from app.crud.pages import get_child_page
+from app.crud.edits import update_returning, get_edit_state
 
 
 
@@ -11,13 +15,17 @@ def get_all_comments_by_post(
     post_id: int,
     limit: int,
     offset: int
-) -> List[CommentDB]:
-    return (
-        db.query(CommentDB)
-        .filter(CommentDB.post_id == post_id)
+) -> Optional[list]:
+    """None if the post does not exist."""
+    return get_child_page(
+        db,
+        PostDB,
+        post_id,
+        select(*COMMENT_COLUMNS)
+        .where(CommentDB.post_id == post_id)
+        .order_by(CommentDB.id)
         .offset(offset)
         .limit(limit)
-        .all()
     )
 
 
@@ -28,6 +36,30 @@ def get_comment_by_id(
     return db.query(CommentDB).filter(CommentDB.id == comment_id).first()
 
 
+def get_comments_by_ids(
+    db: Session,
+    comment_ids: List[int]
+) -> list:
+    if not comment_ids:
+        return []
+    return db.query(*COMMENT_COLUMNS).filter(CommentDB.id.in_(comment_ids)).all()
+
+
+def get_comment_texts(db: Session, batch_size: int):
+    return (
+        db.query(CommentDB.id, CommentDB.text)
+        .yield_per(batch_size)
+    )
+
+
+def _change_comments_count(db: Session, post_id: int, amount: int):
+    (
+        db.query(PostDB)
+        .filter(PostDB.id == post_id)
+        .update({PostDB.comments_count: PostDB.comments_count + amount}, synchronize_session=False)
+    )
+
+
 def create_comment(
     db: Session,
     comment: CommentCreate
@@ -39,18 +71,60 @@ def create_comment(
     )
 
     db.add(new_comment)
+    _change_comments_count(db, comment.post_id, 1)
     db.commit()
     db.refresh(new_comment)
     return new_comment
 
 
-def update_comment(
+def create_comments(
     db: Session,
-    comment: CommentDB
-) -> CommentDB:
+    comments: List[CommentCreate]
+) -> list:
+    if not comments:
+        return []
+
+    new_comments = db.execute(
+        insert(CommentDB).returning(*CommentDB.__table__.columns, sort_by_parameter_order=True),
+        [comment.model_dump() for comment in comments]
+    ).all()
+
+    counts = {}
+    for comment in comments:
+        counts[comment.post_id] = counts.get(comment.post_id, 0) + 1
+    # One UPDATE ... FROM (VALUES ...) for all posts of the batch
+    amounts = values(column("post_id", Integer), column("amount", Integer), name="amounts").data(list(counts.items()))
+    db.execute(
+        update(PostDB)
+        .where(PostDB.id == amounts.c.post_id)
+        .values(comments_count=PostDB.comments_count + amounts.c.amount),
+        execution_options={"synchronize_session": False}
+    )
+
     db.commit()
-    db.refresh(comment)
-    return comment
+
+    return new_comments
+
+
+def update_comment(
+    db: Session,
+    comment_id: int,
+    values: dict,
+    owner_id: Optional[int],
+    version: Optional[int] = None
+):
+    """Returns the updated comment row, None if it does not exist, is not
+    owned by owner_id or is not at version. owner_id None edits any
+    comment, version None any version.
+    """
+    return update_returning(
+        db, CommentDB, comment_id, values, COMMENT_COLUMNS,
+        CommentDB.owner_id if owner_id is not None else None, owner_id, version
+    )
+
+
+def get_comment_edit_state(db: Session, comment_id: int):
+    return get_edit_state(db, CommentDB, comment_id, CommentDB.owner_id)
 
 
 def delete_comment(
@@ -58,5 +132,6 @@ def delete_comment(
     comment: CommentDB
 ) -> CommentDB:
     db.delete(comment)
+    _change_comments_count(db, comment.post_id, -1)
     db.commit()
     return comment
\ No newline at end of file
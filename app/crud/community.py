@@ -1,12 +1,19 @@
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import select, Select, delete, tuple_, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional, Tuple
 
 from app.db.models import (
+    community_followers,
     Community as CommunityDB,
     User as UserDB,
-    Post as PostDB
+    Post as PostDB,
+    Comment as CommentDB
 )
 from app.schemas.community import CommunityCreate, CommunityFilter, CommunityUpdate
+from app.crud.projections import USER_COLUMNS, COMMUNITY_COLUMNS, POST_COLUMNS
+from app.crud.pages import get_child_page
+from app.crud.edits import update_returning, get_edit_state
 
 
 
@@ -14,18 +21,66 @@ def get_all_communities(
         db: Session,
         limit: int,
         offset: int
-) -> List[CommunityDB]:
-    return db.query(CommunityDB).offset(offset).limit(limit).all()
+) -> list:
+    return db.query(*COMMUNITY_COLUMNS).offset(offset).limit(limit).all()
 
 
 def get_community_by_id(db: Session, community_id: int) -> CommunityDB:
     return db.query(CommunityDB).filter(CommunityDB.id == community_id).first()
 
+def get_community_for_delete(db: Session, community_id: int) -> CommunityDB:
+    """Loads everything the delete cascades to, one query per relationship level."""
+    return (
+        db.query(CommunityDB)
+        .options(
+            selectinload(CommunityDB.posts).selectinload(PostDB.comments),
+            selectinload(CommunityDB.followers)
+        )
+        .filter(CommunityDB.id == community_id)
+        .first()
+    )
+
+def get_communities_by_ids(db: Session, community_ids: List[int]) -> list:
+    if not community_ids:
+        return []
+    return db.query(*COMMUNITY_COLUMNS).filter(CommunityDB.id.in_(community_ids)).all()
+
+def get_existing_community_ids(db: Session, community_ids: List[int]) -> set:
+    if not community_ids:
+        return set()
+    rows = db.query(CommunityDB.id).filter(CommunityDB.id.in_(community_ids)).all()
+    return {row.id for row in rows}
+
 def get_community_by_name(db: Session, name: str) -> CommunityDB:
     return db.query(CommunityDB).filter(CommunityDB.community_name == name).first()
 
 
-def get_community_by_conditions(db: Session, filters: CommunityFilter) -> List[CommunityDB]:
+def get_community_names(db: Session, batch_size: int):
+    return (
+        db.query(CommunityDB.id, CommunityDB.community_name)
+        .yield_per(batch_size)
+    )
+
+
+def get_community_texts(db: Session, batch_size: int):
+    return (
+        db.query(CommunityDB.id, CommunityDB.community_name, CommunityDB.description)
+        .yield_per(batch_size)
+    )
+
+
+def get_community_names_by_prefix(db: Session, prefix: str, limit: int):
+    pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return (
+        db.query(CommunityDB.id, CommunityDB.community_name)
+        .filter(CommunityDB.community_name.ilike(pattern))
+        .order_by(CommunityDB.community_name)
+        .limit(limit)
+        .all()
+    )
+
+
+def get_community_by_conditions(db: Session, filters: CommunityFilter) -> list:
     conditions = []
 
     if filters.id is not None:
@@ -37,27 +92,48 @@ def get_community_by_conditions(db: Session, filters: CommunityFilter) -> List[C
     if filters.owner_id is not None:
         conditions.append(CommunityDB.owner_id == filters.owner_id)
 
-    return db.query(CommunityDB).filter(*conditions).all()
+    return db.query(*COMMUNITY_COLUMNS).filter(*conditions).all()
 
 
-def create_community(db: Session, community: CommunityCreate) -> CommunityDB:
-    new_community = CommunityDB(
-        community_name=community.community_name,
-        description=community.description,
-        photo_url=community.photo_url,
-        owner_id=community.owner_id
-    )
+def create_community(db: Session, community: CommunityCreate) -> Optional[CommunityDB]:
+    """Returns None if the name is taken, the unique constraint decides."""
+    new_community = db.scalars(
+        insert(CommunityDB)
+        .values(
+            community_name=community.community_name,
+            description=community.description,
+            photo_url=community.photo_url,
+            owner_id=community.owner_id
+        )
+        .on_conflict_do_nothing(index_elements=[CommunityDB.community_name])
+        .returning(CommunityDB)
+    ).first()
 
-    db.add(new_community)
     db.commit()
-    db.refresh(new_community)
     return new_community
 
 
-def update_community(db: Session, community: CommunityDB) -> CommunityDB:
-    db.commit()
-    db.refresh(community)
-    return community
+def update_community(
+    db: Session,
+    community_id: int,
+    values: dict,
+    owner_id: Optional[int],
+    version: Optional[int] = None
+):
+    """Returns the updated community row, None if it does not exist, is not
+    owned by owner_id or is not at version. owner_id None edits any
+    community, version None any version. Raises IntegrityError if the
+    new name is taken.
+    """
+    return update_returning(
+        db, CommunityDB, community_id, values, COMMUNITY_COLUMNS,
+        CommunityDB.owner_id if owner_id is not None else None, owner_id, version,
+        outbox_entity="com"
+    )
+
+
+def get_community_edit_state(db: Session, community_id: int):
+    return get_edit_state(db, CommunityDB, community_id, CommunityDB.owner_id)
 
 
 def delete_community(db: Session, community: CommunityDB) -> CommunityDB:
@@ -66,14 +142,24 @@ def delete_community(db: Session, community: CommunityDB) -> CommunityDB:
     return community
 
 
+def is_follower(db: Session, community_id: int, user_id: int) -> bool:
+    return db.query(
+        select(community_followers)
+        .where(
+            community_followers.c.community_id == community_id,
+            community_followers.c.user_id == user_id
+        )
+        .exists()
+    ).scalar()
+
+
 def add_follower(
     db: Session,
-    follower: UserDB,
-    community: CommunityDB
+    community_id: int,
+    user_id: int
 ):
-    community.followers.append(follower)
+    follow_many(db, [(community_id, user_id)])
     db.commit()
-    return community
 
 
 
@@ -82,24 +168,64 @@ def get_all_followers(
     limit: int,
     offset: int,
     community_id: int
-) -> List[UserDB]:
-    return (
-        db.query(UserDB)
-        .join(UserDB.subscribes)
-        .filter(CommunityDB.id == community_id)
+) -> Optional[list]:
+    """None if the community does not exist, a limit of None reads all followers."""
+    return get_child_page(
+        db,
+        CommunityDB,
+        community_id,
+        select(*USER_COLUMNS)
+        .join(community_followers, community_followers.c.user_id == UserDB.id)
+        .where(community_followers.c.community_id == community_id)
+        .order_by(UserDB.id)
         .offset(offset)
         .limit(limit)
+    )
+
+def count_followers(db: Session, community_id: int, limit: int) -> int:
+    """Counts the followers up to limit + 1, a huge community is not counted through."""
+    followers = (
+        select(community_followers.c.user_id)
+        .where(community_followers.c.community_id == community_id)
+        .limit(limit + 1)
+        .subquery()
+    )
+    return db.execute(select(func.count()).select_from(followers)).scalar()
+
+def get_follower_ids(db: Session, community_id: int) -> List[int]:
+    rows = (
+        db.query(community_followers.c.user_id)
+        .filter(community_followers.c.community_id == community_id)
         .all()
     )
+    return [row.user_id for row in rows]
+
+def follow_many(db: Session, pairs: List[Tuple[int, int]]):
+    """Adds (community_id, user_id) followers, existing ones are skipped. The caller commits."""
+    if not pairs:
+        return
+    db.execute(
+        insert(community_followers).on_conflict_do_nothing(),
+        [{"community_id": c_id, "user_id": u_id} for c_id, u_id in pairs]
+    )
+
+
+def unfollow_many(db: Session, pairs: List[Tuple[int, int]]):
+    """Removes (community_id, user_id) followers. The caller commits."""
+    if not pairs:
+        return
+    db.execute(
+        delete(community_followers)
+        .where(tuple_(community_followers.c.community_id, community_followers.c.user_id).in_(pairs))
+    )
 
 def delete_follower(
     db: Session,
-    follower: UserDB,
-    community: CommunityDB        
+    community_id: int,
+    user_id: int
 ):
-    community.followers.remove(follower)
+    unfollow_many(db, [(community_id, user_id)])
     db.commit()
-    return community
 
 
 def get_community_posts(
@@ -107,15 +233,41 @@ def get_community_posts(
     community_id: int,
     limit: int,
     offset: int
-) -> List[PostDB]:
-    return (
-        db.query(PostDB)
-        .filter(PostDB.community_id == community_id)
+) -> Optional[list]:
+    """None if the community does not exist."""
+    return get_child_page(
+        db,
+        CommunityDB,
+        community_id,
+        select(*POST_COLUMNS)
+        .where(PostDB.community_id == community_id)
+        .order_by(PostDB.id)
         .offset(offset)
         .limit(limit)
-        .all()
     )
 
 
-def is_community_exist_by_name(db: Session, name: str):
-    return get_community_by_name(db, name) is not None
\ No newline at end of file
+def export_posts_statement(community_id: int, after_id: int) -> Select:
+    return (
+        select(*PostDB.__table__.columns)
+        .where(PostDB.community_id == community_id, PostDB.id > after_id)
+        .order_by(PostDB.id)
+    )
+
+
+def export_comments_statement(community_id: int, after_id: int) -> Select:
+    return (
+        select(*CommentDB.__table__.columns)
+        .join(PostDB, PostDB.id == CommentDB.post_id)
+        .where(PostDB.community_id == community_id, CommentDB.id > after_id)
+        .order_by(CommentDB.id)
+    )
+
+
+def export_followers_statement(community_id: int, after_id: int) -> Select:
+    return (
+        select(*USER_COLUMNS)
+        .join(community_followers, community_followers.c.user_id == UserDB.id)
+        .where(community_followers.c.community_id == community_id, UserDB.id > after_id)
+        .order_by(UserDB.id)
+    )
@@ -0,0 +1,74 @@
+from sqlalchemy import update, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.crud import outbox as outbox_crud
+
+# Edits are one UPDATE ... RETURNING: the WHERE clause matches the row
+# only if it exists, the user may edit it and, when the client sent one,
+# it still has the expected version. RETURNING gives the new row, so
+# nothing is loaded before and nothing is refreshed after. When no row
+# matched, get_edit_state tells 404, 403 and 412 apart.
+
+
+def update_returning(
+    db: Session,
+    model,
+    row_id: int,
+    values: dict,
+    columns: tuple,
+    owner_column=None,
+    owner_id: Optional[int] = None,
+    version: Optional[int] = None,
+    outbox_entity: Optional[outbox_crud.OutboxEntity] = None
+):
+    """Returns the updated row, or None if no row matched.
+
+    The row also has to have owner_id in owner_column, unless owner_column
+    is None, and to be at version, unless version is None. Every edit
+    bumps the version. With outbox_entity an outbox event carrying the
+    new version is committed with the update, so the relay can leave a
+    cache entry alone which the caller already updated to that version.
+    Unique violations are rolled back and raised.
+
+    Empty values change nothing: the row is only read, its version stays
+    and no event is written. Pending objects of the session are committed
+    either way, like with an edit.
+    """
+    conditions = [model.id == row_id]
+    if owner_column is not None:
+        conditions.append(owner_column == owner_id)
+    if version is not None:
+        conditions.append(model.version == version)
+
+    if not values:
+        row = db.execute(select(*columns).where(*conditions)).first()
+        db.commit()
+        return row
+
+    statement = update(model).where(*conditions).values({**values, "version": model.version + 1})
+
+    try:
+        row = db.execute(
+            statement.returning(*columns),
+            execution_options={"synchronize_session": False}
+        ).first()
+    except IntegrityError:
+        db.rollback()
+        raise
+
+    if row is None:
+        db.rollback()
+        return None
+
+    if outbox_entity is not None:
+        outbox_crud.add_event(db, outbox_entity, row_id, version=row.version)
+    db.commit()
+    return row
+
+
+def get_edit_state(db: Session, model, row_id: int, owner_column=None):
+    """Returns (owner_id, version) of the row, None if it does not exist."""
+    owner = (owner_column if owner_column is not None else model.id).label("owner_id")
+    return db.execute(select(owner, model.version).where(model.id == row_id)).first()
@@ -0,0 +1,83 @@
+from sqlalchemy import update, delete, func, literal, or_, Interval
+from sqlalchemy.orm import Session
+from typing import List, Literal, Optional
+from datetime import datetime
+
+from app.db.models import OutboxEvent
+
+OutboxEntity = Literal["post", "com", "user"]
+
+# Every function here only adds statements to the current transaction,
+# the caller's crud call commits them together with the change itself.
+
+
+
+def add_event(
+    db: Session,
+    entity: OutboxEntity,
+    entity_id: int,
+    cascade: bool = False,
+    version: Optional[int] = None
+):
+    """cascade also invalidates the cached entities which depend on this one.
+
+    version is the version of the row after an edit, an entry which is
+    already cached at that version is kept. None always invalidates.
+    """
+    db.add(OutboxEvent(entity=entity, entity_id=entity_id, cascade=cascade, version=version))
+
+
+def get_pending_events(db: Session, max_attempts: int, limit: int) -> List[OutboxEvent]:
+    # Rows locked by another relay are skipped, so several processes can relay at once
+    return (
+        db.query(OutboxEvent)
+        .filter(OutboxEvent.attempts < max_attempts)
+        .filter(or_(OutboxEvent.next_attempt_at.is_(None), OutboxEvent.next_attempt_at <= datetime.utcnow()))
+        .order_by(OutboxEvent.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+
+def delete_events(db: Session, event_ids: List[int]):
+    if event_ids:
+        db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(event_ids)))
+
+
+def mark_failed(db: Session, event_ids: List[int], error: str, backoff_base: float, backoff_max: float):
+    """The next attempt waits backoff_base * 2^attempts seconds, at most backoff_max."""
+    if event_ids:
+        delay = func.least(backoff_base * func.power(2, OutboxEvent.attempts), backoff_max)
+        db.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.id.in_(event_ids))
+            .values(
+                attempts=OutboxEvent.attempts + 1,
+                last_error=error[:500],
+                next_attempt_at=literal(datetime.utcnow()) + func.make_interval(0, 0, 0, 0, 0, 0, delay, type_=Interval)
+            ),
+            execution_options={"synchronize_session": False}
+        )
+
+
+def requeue_dead_events(db: Session, max_attempts: int) -> int:
+    """Gives events which ran out of attempts a new set of them. Returns the number of events."""
+    result = db.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.attempts >= max_attempts)
+        .values(attempts=0, next_attempt_at=None)
+    )
+    return result.rowcount
+
+
+def get_oldest_pending_time(db: Session, max_attempts: int) -> Optional[datetime]:
+    return db.query(func.min(OutboxEvent.created_at)).filter(OutboxEvent.attempts < max_attempts).scalar()
+
+
+def count_events(db: Session, max_attempts: int) -> dict:
+    pending, dead = db.query(
+        func.count(OutboxEvent.id).filter(OutboxEvent.attempts < max_attempts),
+        func.count(OutboxEvent.id).filter(OutboxEvent.attempts >= max_attempts)
+    ).one()
+    return {"pending": pending, "dead": dead}
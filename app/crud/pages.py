@@ -0,0 +1,33 @@
+from sqlalchemy import Select, select, true
+from sqlalchemy.orm import Session
+from typing import Optional
+
+# Sub-resource listings check that their parent exists and read the page
+# in one round trip: the parent row is LEFT JOINed with the page, so a
+# missing parent gives no rows and an empty page gives one row of NULLs.
+
+
+def get_child_page(
+    db: Session,
+    parent,
+    parent_id: int,
+    page: Select
+) -> Optional[list]:
+    """Returns the rows of page, or None if the parent row does not exist.
+
+    page has to select an id column and order by it.
+    """
+    page = page.subquery()
+    rows = db.execute(
+        select(*page.c)
+        .select_from(parent)
+        .outerjoin(page, true())
+        .where(parent.id == parent_id)
+        .order_by(page.c.id)
+    ).all()
+
+    if not rows:
+        return None
+    if rows[0].id is None:
+        return []
+    return rows
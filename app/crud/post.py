@@ -1,16 +1,19 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import insert, update, bindparam
+from sqlalchemy.orm import Session, selectinload
+from typing import Dict, List, Optional
 
 from app.db.models import Post as PostDB
 from app.schemas.post import *
+from app.crud.projections import POST_COLUMNS
+from app.crud.edits import update_returning, get_edit_state
 
 
 def get_all_posts(
     db: Session, 
     limit: int,
     offset: int
-) -> List[PostDB]:
-    return db.query(PostDB).offset(offset).limit(limit).all()
+) -> list:
+    return db.query(*POST_COLUMNS).offset(offset).limit(limit).all()
 
 
 def get_posts_by_conditions(
@@ -19,7 +22,7 @@ def get_posts_by_conditions(
     offset: int,
     owner_id: Optional[int],
     community_id: Optional[int]
-) -> List[PostDB]:
+) -> list:
     conditions = []
 
     if owner_id is not None:
@@ -29,7 +32,7 @@ def get_posts_by_conditions(
         conditions.append(PostDB.community_id == community_id)
 
     return (
-        db.query(PostDB)
+        db.query(*POST_COLUMNS)
         .filter(*conditions)
         .offset(offset)
         .limit(limit)
@@ -44,6 +47,69 @@ def get_post_by_id(
     return db.query(PostDB).filter(PostDB.id == post_id).first()
 
 
+def get_post_for_delete(
+    db: Session,
+    post_id: int
+) -> PostDB:
+    return (
+        db.query(PostDB)
+        .options(selectinload(PostDB.comments))
+        .filter(PostDB.id == post_id)
+        .first()
+    )
+
+
+def get_posts_by_ids(
+    db: Session,
+    post_ids: List[int]
+) -> list:
+    if not post_ids:
+        return []
+    return db.query(*POST_COLUMNS).filter(PostDB.id.in_(post_ids)).all()
+
+
+def get_post_texts(db: Session, batch_size: int):
+    return (
+        db.query(PostDB.id, PostDB.title, PostDB.text)
+        .yield_per(batch_size)
+    )
+
+
+def get_recent_posts_by_communities(
+    db: Session,
+    community_ids: List[int],
+    limit: int
+) -> list:
+    if not community_ids:
+        return []
+    return (
+        db.query(*POST_COLUMNS)
+        .filter(PostDB.community_id.in_(community_ids))
+        .order_by(PostDB.time_edited.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def get_posts_comment_counts(
+    db: Session,
+    community_id: Optional[int],
+    order_by_comments: bool,
+    limit: int
+) -> list:
+    query = db.query(PostDB.id, PostDB.time_edited, PostDB.comments_count)
+
+    if community_id is not None:
+        query = query.filter(PostDB.community_id == community_id)
+
+    if order_by_comments:
+        query = query.order_by(PostDB.comments_count.desc())
+    else:
+        query = query.order_by(PostDB.time_edited.desc())
+
+    return query.limit(limit).all()
+
+
 def create_post(
     db: Session,
     post: PostCreate
@@ -62,14 +128,60 @@ def create_post(
     return new_post
 
 
-def update_post(
+def create_posts(
     db: Session,
-    post: PostDB
-) -> PostDB:
+    posts: List[PostCreate]
+) -> list:
+    """Inserts all posts with one executemany INSERT ... RETURNING, rows come back in input order."""
+    if not posts:
+        return []
+
+    new_posts = db.execute(
+        insert(PostDB).returning(*PostDB.__table__.columns, sort_by_parameter_order=True),
+        [post.model_dump() for post in posts]
+    ).all()
     db.commit()
-    db.refresh(post)
 
-    return post 
+    return new_posts
+
+
+def update_post(
+    db: Session,
+    post_id: int,
+    values: dict,
+    owner_id: Optional[int],
+    version: Optional[int] = None
+):
+    """Returns the updated post row, None if it does not exist, is not
+    owned by owner_id or is not at version. owner_id None edits any
+    post, version None any version.
+    """
+    return update_returning(
+        db, PostDB, post_id, values, POST_COLUMNS,
+        PostDB.owner_id if owner_id is not None else None, owner_id, version,
+        outbox_entity="post"
+    )
+
+
+def get_post_edit_state(db: Session, post_id: int):
+    return get_edit_state(db, PostDB, post_id, PostDB.owner_id)
+
+
+def add_views(
+    db: Session,
+    views: Dict[int, int]
+):
+    """Adds view counts with one executemany UPDATE, the caller commits."""
+    if not views:
+        return
+
+    table = PostDB.__table__
+    db.execute(
+        update(table)
+        .where(table.c.id == bindparam("post_id"))
+        .values(view_count=table.c.view_count + bindparam("amount")),
+        [{"post_id": post_id, "amount": amount} for post_id, amount in views.items()]
+    )
 
 
 def delete_post(
@@ -0,0 +1,24 @@
+from app.db.models import (
+    User as UserDB,
+    Community as CommunityDB,
+    Post as PostDB,
+    Comment as CommentDB
+)
+from app.schemas.user import User
+from app.schemas.community import Community
+from app.schemas.post import Post
+from app.schemas.comment import Comment
+
+# List queries select only the columns of the response schema and return
+# rows instead of ORM entities, which skips the identity map and never
+# loads hashed passwords or relationships.
+
+
+def _columns(model, schema) -> tuple:
+    return tuple(getattr(model, name) for name in schema.model_fields)
+
+
+USER_COLUMNS = _columns(UserDB, User)
+COMMUNITY_COLUMNS = _columns(CommunityDB, Community)
+POST_COLUMNS = _columns(PostDB, Post)
+COMMENT_COLUMNS = _columns(CommentDB, Comment)
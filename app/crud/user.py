@@ -1,20 +1,27 @@
+from sqlalchemy import select, delete, update, func, or_
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.dialects.postgresql import insert
+from typing import List, Optional
 
-from app.db.models import (User as UserDB,
+from app.db.models import (community_followers,
+                           User as UserDB,
                            Community as CommunityDB,
-                           Post as PostDB
+                           Post as PostDB,
+                           Comment as CommentDB
                            )
 
 from app.schemas.user import UserCreate, UserFilter
+from app.crud.projections import USER_COLUMNS, COMMUNITY_COLUMNS, POST_COLUMNS
+from app.crud.pages import get_child_page
+from app.crud.edits import update_returning, get_edit_state
 
 
 def get_all_users(
         db: Session,
         limit: int,
         offset: int
-) -> List[UserDB]:
-    return db.query(UserDB).offset(offset).limit(limit).all()
+) -> list:
+    return db.query(*USER_COLUMNS).offset(offset).limit(limit).all()
 
 
 def get_user_by_id(db: Session, user_id: int) -> UserDB:
@@ -23,7 +30,17 @@ def get_user_by_id(db: Session, user_id: int) -> UserDB:
 def get_user_by_username(db: Session, username: str) -> UserDB:
     return db.query(UserDB).filter(UserDB.username == username).first()
 
-def get_user_by_conditions(db: Session, filters: UserFilter) -> List[UserDB]:
+def is_user_exist(db: Session, username: str) -> bool:
+    return db.query(select(UserDB.id).where(UserDB.username == username).exists()).scalar()
+
+def get_user_for_delete(db: Session, user_id: int):
+    """Returns (id, username) of the user, None if it does not exist. Nothing the delete cascades to is loaded."""
+    return db.query(UserDB.id, UserDB.username).filter(UserDB.id == user_id).first()
+
+def get_created_community_ids(db: Session, user_id: int) -> List[int]:
+    return list(db.scalars(select(CommunityDB.id).where(CommunityDB.owner_id == user_id)))
+
+def get_user_by_conditions(db: Session, filters: UserFilter) -> list:
     conditions = []
 
     if filters.id is not None:
@@ -35,71 +52,155 @@ def get_user_by_conditions(db: Session, filters: UserFilter) -> List[UserDB]:
     if filters.role is not None:
         conditions.append(UserDB.role == filters.role)
 
-    return db.query(UserDB).filter(*conditions).all()
+    return db.query(*USER_COLUMNS).filter(*conditions).all()
 
 
 
 
-def create_user(db: Session, user: UserCreate) -> UserDB:
-    new_user = UserDB(
-        username=user.username,
-        hashed_password=user.password,
-        avatar_url=user.avatar_url,
-    )
+def create_user(db: Session, user: UserCreate) -> Optional[UserDB]:
+    """Returns None if the username is taken, the unique constraint decides."""
+    new_user = db.scalars(
+        insert(UserDB)
+        .values(
+            username=user.username,
+            hashed_password=user.password,
+            avatar_url=user.avatar_url,
+            role=user.role
+        )
+        .on_conflict_do_nothing(index_elements=[UserDB.username])
+        .returning(UserDB)
+    ).first()
 
-    db.add(new_user)
     db.commit()
-    db.refresh(new_user)
     return new_user
 
 
-def update_user(db: Session, user: UserDB) -> UserDB:
+def create_users(db: Session, users: List[UserCreate]) -> list:
+    """Inserts users in one statement, rows whose username is taken are skipped."""
+    if not users:
+        return []
+
+    new_users = db.execute(
+        insert(UserDB)
+        .on_conflict_do_nothing(index_elements=[UserDB.username])
+        .returning(*UserDB.__table__.columns),
+        [
+            {
+                "username": user.username,
+                "hashed_password": user.password,
+                "avatar_url": user.avatar_url,
+                "role": user.role
+            }
+            for user in users
+        ]
+    ).all()
     db.commit()
-    db.refresh(user)
-    return user
+
+    return new_users
+
+
+def update_user(db: Session, user_id: int, values: dict, version: Optional[int] = None):
+    """Returns the updated user row, None if it does not exist or is not
+    at version. Raises IntegrityError if the new username is taken.
+    """
+    return update_returning(db, UserDB, user_id, values, USER_COLUMNS, version=version)
+
+
+def get_user_edit_state(db: Session, user_id: int):
+    return get_edit_state(db, UserDB, user_id)
     
     
 
-def delete_user(db: Session, user: UserDB) -> UserDB:
-    db.delete(user)
+def delete_user(db: Session, user_id: int):
+    """Deletes the user with its communities, posts, comments and follows.
+
+    One DELETE per table, the rows are matched by subqueries instead of
+    being loaded: the user's communities, the posts in them or written by
+    the user, and the comments on those posts or written by the user.
+    Posts which stay lose the user's comments from their comments_count.
+    """
+    communities = select(CommunityDB.id).where(CommunityDB.owner_id == user_id)
+    posts = select(PostDB.id).where(or_(PostDB.owner_id == user_id, PostDB.community_id.in_(communities)))
+    options = {"synchronize_session": False}
+
+    own_comments = (
+        select(CommentDB.post_id, func.count().label("total"))
+        .where(CommentDB.owner_id == user_id)
+        .group_by(CommentDB.post_id)
+        .subquery()
+    )
+    db.execute(
+        update(PostDB)
+        .where(PostDB.id == own_comments.c.post_id, PostDB.id.not_in(posts))
+        .values(comments_count=PostDB.comments_count - own_comments.c.total),
+        execution_options=options
+    )
+
+    db.execute(
+        delete(CommentDB).where(or_(CommentDB.owner_id == user_id, CommentDB.post_id.in_(posts))),
+        execution_options=options
+    )
+    db.execute(
+        delete(community_followers).where(or_(
+            community_followers.c.user_id == user_id,
+            community_followers.c.community_id.in_(communities)
+        ))
+    )
+    db.execute(delete(PostDB).where(PostDB.id.in_(posts)), execution_options=options)
+    db.execute(delete(CommunityDB).where(CommunityDB.owner_id == user_id), execution_options=options)
+    db.execute(delete(UserDB).where(UserDB.id == user_id), execution_options=options)
     db.commit()
-    return user
     
  
-def is_user_exist(db: Session, username: str):
-    user = get_user_by_username(db, username)
-    if user:
-        return True
-    return False
-
 def get_user_subsribes(
     db: Session,
     limit: int,
     offset: int,
     user_id: int
-) -> List[CommunityDB]:
-    return (
-        db.query(CommunityDB)
-        .join(CommunityDB.followers)
-        .filter(UserDB.id == user_id)
+) -> Optional[list]:
+    """None if the user does not exist."""
+    return get_child_page(
+        db,
+        UserDB,
+        user_id,
+        select(*COMMUNITY_COLUMNS)
+        .join(community_followers, community_followers.c.community_id == CommunityDB.id)
+        .where(community_followers.c.user_id == user_id)
+        .order_by(CommunityDB.id)
         .offset(offset)
         .limit(limit)
-        .all()
     )
 
 
+def get_user_subscribe_ids(db: Session, user_id: int) -> Optional[List[int]]:
+    """None if the user does not exist."""
+    rows = get_child_page(
+        db,
+        UserDB,
+        user_id,
+        select(community_followers.c.community_id.label("id"))
+        .where(community_followers.c.user_id == user_id)
+        .order_by(community_followers.c.community_id)
+    )
+    return None if rows is None else [row.id for row in rows]
+
+
 def get_user_posts(
     db: Session,
     user_id: int,
     limit: int,
     offset: int
-) -> List[PostDB]:
-    return (
-        db.query(PostDB)
-        .filter(PostDB.owner_id == user_id)
+) -> Optional[list]:
+    """None if the user does not exist."""
+    return get_child_page(
+        db,
+        UserDB,
+        user_id,
+        select(*POST_COLUMNS)
+        .where(PostDB.owner_id == user_id)
+        .order_by(PostDB.id)
         .offset(offset)
         .limit(limit)
-        .all()
     )
 
 
@@ -108,11 +209,15 @@ def get_user_communities(
     user_id: int,
     limit: int,
     offset: int
-) -> List[CommunityDB]:
-    return (
-        db.query(CommunityDB)
-        .filter(CommunityDB.owner_id == user_id)
+) -> Optional[list]:
+    """None if the user does not exist."""
+    return get_child_page(
+        db,
+        UserDB,
+        user_id,
+        select(*COMMUNITY_COLUMNS)
+        .where(CommunityDB.owner_id == user_id)
+        .order_by(CommunityDB.id)
         .offset(offset)
         .limit(limit)
-        .all()
     )
@@ -1,4 +1,18 @@
+from sqlalchemy import select, func
+
 from .database import Base, engine
 from .models import *
 
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+# Any fixed number, it only has to be the same in every process
+SCHEMA_LOCK_ID = 715_220
+
+
+def create_tables():
+    """Creates missing tables. Every worker process runs this on startup,
+    the advisory lock makes them do it one after another. Other databases,
+    e.g. SQLite in a script, have no advisory locks and skip it.
+    """
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(select(func.pg_advisory_xact_lock(SCHEMA_LOCK_ID)))
+        Base.metadata.create_all(bind=connection)
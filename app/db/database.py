@@ -1,12 +1,120 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from contextlib import contextmanager
+from itertools import count
+from threading import Lock
+from typing import List, Optional
+import time
+
+from sqlalchemy import create_engine, event, Insert, Update, Delete, Select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
+REPLICA_DATABASE_URLS = [url for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url]
+
+# A replica which failed to connect is skipped for this many seconds
+REPLICA_RETRY_AFTER = float(os.getenv("REPLICA_RETRY_AFTER", 30))
 
 engine = create_engine(DATABASE_URL)
-Sessionmaker = sessionmaker(bind=engine)
+
+
+class ReplicaPool:
+    """Round-robin over the replica engines which are not marked as down."""
+
+    def __init__(self, engines: List[Engine], retry_after: float):
+        self.engines = engines
+        self.retry_after = retry_after
+        self._down_until = {id(e): 0.0 for e in engines}
+        self._counter = count()
+        self._lock = Lock()
+
+        for replica in engines:
+            event.listen(replica, "handle_error", self._on_error)
+
+    def _on_error(self, context):
+        if context.is_disconnect or context.connection is None:
+            self.mark_down(context.engine)
+
+    def mark_down(self, replica: Engine):
+        with self._lock:
+            self._down_until[id(replica)] = time.monotonic() + self.retry_after
+
+    def next(self) -> Optional[Engine]:
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            replica = self.engines[next(self._counter) % len(self.engines)]
+            if self._down_until[id(replica)] <= now:
+                return replica
+        return None
+
+
+replicas = ReplicaPool(
+    [create_engine(url, pool_pre_ping=True) for url in REPLICA_DATABASE_URLS],
+    REPLICA_RETRY_AFTER
+)
+
+
+def _is_write(clause) -> bool:
+    if isinstance(clause, (Insert, Update, Delete)):
+        return True
+    # Row locks only exist on the primary
+    return isinstance(clause, Select) and clause._for_update_arg is not None
+
+
+class RoutingSession(Session):
+    """Sessions opened with info={"read_only": True} read from a replica.
+
+    The first write (a flush, a DML statement or SELECT ... FOR UPDATE)
+    marks the session with info["wrote"] and moves it to the primary for
+    good, so what it wrote is read back from the primary. Every other
+    session only uses the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if _is_write(clause):
+            self.info["wrote"] = True
+        if self.info.get("read_only") and not self.info.get("wrote"):
+            replica = replicas.next()
+            if replica is not None:
+                return replica
+        return engine
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _mark_flush(session: Session, flush_context, instances):
+    session.info["wrote"] = True
+
+
+@contextmanager
+def on_primary(db: Session):
+    """Runs the reads inside on the primary, whatever the session routes to.
+
+    For reads which fill the cache: a replica may still return the row
+    from before an edit whose invalidation already dropped the entry, and
+    caching it would keep the old row until the entry expires. A session
+    which wrote inside stays on the primary afterwards.
+    """
+    read_only = db.info.get("read_only", False)
+    db.info["read_only"] = False
+    try:
+        yield db
+    finally:
+        if not db.info.get("wrote"):
+            db.info["read_only"] = read_only
+
+
+def dispose_engines(close: bool = True):
+    """Drops the pooled connections of the primary and replica engines.
+
+    A forked worker passes close=False: the pooled connections are the
+    parent's sockets, they are forgotten instead of closed.
+    """
+    for e in [engine, *replicas.engines]:
+        e.dispose(close=close)
+
+
+Sessionmaker = sessionmaker(bind=engine, class_=RoutingSession)
 Base = declarative_base()
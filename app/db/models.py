@@ -1,10 +1,17 @@
-from sqlalchemy import Table, Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Table, Column, Integer, String, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 from app.db.database import Base
 
 
+# Relationships never load lazily, a query which needs one declares it
+# with selectinload, an accidental lazy load raises instead of issuing
+# one query per row.
+#
+# version counts the edits of a row, an edit only applies to the version
+# it was based on. Counters (comments_count, view_count) do not bump it.
+
 community_followers = Table(
     "community_followers",
     Base.metadata,
@@ -21,10 +28,11 @@ class Community(Base):
     description = Column(String(500))
     photo_url = Column(String())
 
-    followers = relationship("User", secondary=community_followers, back_populates="subscribes")
-    posts = relationship("Post", cascade="all, delete-orphan")
+    followers = relationship("User", secondary=community_followers, back_populates="subscribes", lazy="raise")
+    posts = relationship("Post", cascade="all, delete-orphan", lazy="raise")
 
     owner_id = Column(Integer, ForeignKey("users.id"))
+    version = Column(Integer, nullable=False, default=1)
 
 
 
@@ -36,11 +44,12 @@ class User(Base):
     hashed_password = Column(String)
     role = Column(String(50), nullable=False, default="user")
     avatar_url = Column(String, nullable=True)
+    version = Column(Integer, nullable=False, default=1)
 
-    created_communities = relationship("Community", cascade="all, delete-orphan")
-    created_posts = relationship("Post", cascade="all, delete-orphan")
-    created_comments = relationship("Comment", cascade="all, delete-orphan")
-    subscribes = relationship("Community", secondary=community_followers, back_populates="followers")
+    created_communities = relationship("Community", cascade="all, delete-orphan", lazy="raise")
+    created_posts = relationship("Post", cascade="all, delete-orphan", lazy="raise")
+    created_comments = relationship("Comment", cascade="all, delete-orphan", lazy="raise")
+    subscribes = relationship("Community", secondary=community_followers, back_populates="followers", lazy="raise")
 
 
 class Post(Base):
@@ -53,10 +62,13 @@ class Post(Base):
     community_id = Column(Integer, ForeignKey("communities.id"))
     owner_id = Column(Integer, ForeignKey("users.id"))
 
-    comments = relationship("Comment", cascade="all, delete-orphan")
+    comments = relationship("Comment", cascade="all, delete-orphan", lazy="raise")
+    comments_count = Column(Integer, nullable=False, default=0)
+    view_count = Column(Integer, nullable=False, default=0)
 
     time_edited = Column(DateTime, nullable=False, default=datetime.utcnow)
     is_edited = Column(Boolean, default=False)
+    version = Column(Integer, nullable=False, default=1)
 
 
 
@@ -71,3 +83,24 @@ class Comment(Base):
 
     time_edited = Column(DateTime, nullable=False, default=datetime.utcnow)
     is_edited = Column(Boolean, default=False)
+    version = Column(Integer, nullable=False, default=1)
+
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String(20), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    cascade = Column(Boolean, nullable=False, default=False)
+    # Version of the row after the edit, None for deletes
+    version = Column(Integer)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String(500))
+    # A failed event is retried with exponential backoff, not before this
+    next_attempt_at = Column(DateTime)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_outbox_events_attempts_id", "attempts", "id"),)
@@ -1,21 +1,78 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+import anyio.to_thread
+from dotenv import load_dotenv
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from app.routers.user import router as user_router
 from app.routers.auth import router as auth_router
 from app.routers.community import router as community_router
 from app.routers.post import router as post_router
 from app.routers.comment import router as comment_router
+from app.routers.search import router as search_router
+from app.routers.admin import router as admin_router
 
+from app.db import create_tables
+from app.db.database import dispose_engines
+from app.cache.redis_client import disconnect_pools
+from app.core.logging_config import logger
 from app.middleware.logging_middleware import LoggingContextMiddleware
+from app.middleware.compression_middleware import CompressionMiddleware
+from app.workers.ranking import run_rank_decay
+from app.workers.write_behind import run_write_behind_flush
+from app.workers.outbox import run_outbox_relay
+from app.workers.warmup import run_cache_warmup
+from app.workers.search import run_search_index_build
+
+load_dotenv()
+
+# The handlers are plain functions which block on the database and Redis,
+# FastAPI runs each in a thread of this pool while the event loop keeps serving
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", 40))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in every worker process, after the fork
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    await asyncio.to_thread(create_tables)
+
+    # Every worker runs the loops, they coordinate through locks,
+    # consumer groups and SKIP LOCKED
+    tasks = [
+        asyncio.create_task(run_rank_decay()),
+        asyncio.create_task(run_write_behind_flush()),
+        asyncio.create_task(run_outbox_relay()),
+        asyncio.create_task(run_cache_warmup()),
+        asyncio.create_task(run_search_index_build())
+    ]
+    logger.info("app_started")
+    yield
+
+    # The server has stopped accepting requests and drained the open ones
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    dispose_engines()
+    disconnect_pools()
+    logger.info("app_stopped")
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 app.include_router(auth_router, prefix="/auth", tags=["Auth"])
 app.include_router(user_router, prefix="/users", tags=["User"])
 app.include_router(community_router, prefix="/communites", tags=["Community"])
 app.include_router(post_router, prefix="/posts", tags=["Post"])
 app.include_router(comment_router, prefix="/comments", tags=["Comment"])
+app.include_router(search_router, prefix="/search", tags=["Search"])
+app.include_router(admin_router, prefix="/admin", tags=["Admin"])
 
 app.add_middleware(LoggingContextMiddleware)
+# Added last, so it is the outermost and sees the final body
+app.add_middleware(CompressionMiddleware)
 
 
 @app.get("/")
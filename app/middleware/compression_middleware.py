@@ -0,0 +1,106 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.compression import COMPRESSION_MIN_SIZE, StreamCompressor, compress, is_compressible, negotiate
+
+
+class CompressionMiddleware:
+    """Compresses responses with the encoding negotiated from Accept-Encoding.
+
+    Pure ASGI, so streamed responses stay streamed: a body sent in one
+    message is compressed whole if it reaches the size threshold, a body
+    sent in several is compressed chunk by chunk. Responses which already
+    have a Content-Encoding, e.g. precompressed cache entries, pass as
+    they are.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message: Message = None
+        self.compressor: StreamCompressor = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _is_eligible(self, headers: MutableHeaders) -> bool:
+        status = self.start_message["status"]
+        return (
+            200 <= status < 300 and status != 204
+            and "content-encoding" not in headers
+            and is_compressible(headers.get("content-type"))
+        )
+
+    def _set_encoding(self, headers: MutableHeaders):
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+
+    async def send_compressed(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Headers depend on the first body message
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if self.compressor is not None:
+            await self.send({
+                "type": "http.response.body",
+                "body": self.compressor.compress(body, last=not more_body),
+                "more_body": more_body
+            })
+            return
+
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        if not self._is_eligible(headers) or (not more_body and len(body) < self.minimum_size):
+            self.passthrough = True
+            await self.send(self.start_message)
+            await self.send(message)
+            return
+
+        self._set_encoding(headers)
+        if not more_body:
+            body = compress(body, self.encoding)
+            headers["Content-Length"] = str(len(body))
+            await self.send(self.start_message)
+            await self.send({"type": "http.response.body", "body": body, "more_body": False})
+            return
+
+        del headers["Content-Length"]
+        self.compressor = StreamCompressor(self.encoding)
+        await self.send(self.start_message)
+        await self.send({
+            "type": "http.response.body",
+            "body": self.compressor.compress(body),
+            "more_body": True
+        })
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends
+from typing import List
+
+from app.core.dependencies import get_current_user
+from app.schemas.user import User
+from app.schemas.admin import HotKey
+from app.services import admin_service
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_model=dict)
+def get_metrics(
+    current_user: User = Depends(get_current_user)
+) -> dict:
+    return admin_service.get_metrics(current_user)
+
+
+@router.post("/outbox/requeue", response_model=dict)
+def requeue_outbox(
+    current_user: User = Depends(get_current_user)
+) -> dict:
+    return admin_service.requeue_outbox(current_user)
+
+
+@router.get("/hot-keys", response_model=List[HotKey])
+def get_hot_keys(
+    current_user: User = Depends(get_current_user)
+) -> List[HotKey]:
+    return admin_service.get_hot_keys(current_user)
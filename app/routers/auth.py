@@ -10,14 +10,14 @@ router = APIRouter()
 
 
 @router.post("/register", response_model=User)
-async def register_user(
+def register_user(
     user: UserCreate,
     db: Session = Depends(get_db)
 ) -> User:
     return auth_service.register_user(user, db)
 
 @router.post("/login", response_model=dict)
-async def login_user(
+def login_user(
     user: UserLogin,
     response: Response,
     db: Session = Depends(get_db)
@@ -26,7 +26,7 @@ async def login_user(
 
 
 @router.get("/me", response_model=User)
-async def get_user_by_jwt(current_user: User = Depends(get_current_user)):
+def get_user_by_jwt(current_user: User = Depends(get_current_user)):
     return current_user
     
 
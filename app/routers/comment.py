@@ -1,10 +1,11 @@
-from typing import List
-from fastapi import APIRouter, Depends, Query, Path
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query, Path, Body, Header, Response
 from sqlalchemy.orm import Session
 
 from app.services import comment_service
 from app.core.dependencies import get_db, get_current_user
-from app.schemas.comment import Comment, CommentCreateInput, CommentUpdate
+from app.core.etag import make_etag, parse_if_match
+from app.schemas.comment import Comment, CommentCreateInput, CommentUpdate, CommentBulkResult
 from app.schemas.user import User
 
 
@@ -13,7 +14,7 @@ router = APIRouter()
 
 
 @router.get("/{post_id}" ,response_model=List[Comment])
-async def get_all_comments_by_post(
+def get_all_comments_by_post(
     post_id: int = Path(..., gt=0),
     limit: int = Query(5, gt=0, le=100),
     offset: int = Query(0, ge=0),
@@ -23,7 +24,7 @@ async def get_all_comments_by_post(
 
 
 @router.post("/", response_model=Comment)
-async def create_comment(
+def create_comment(
     comment: CommentCreateInput,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -31,19 +32,32 @@ async def create_comment(
     return comment_service.create_comment(db, comment, current_user)
 
 
+@router.post("/bulk", response_model=CommentBulkResult)
+def create_comments(
+    comments: List[dict] = Body(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> CommentBulkResult:
+    return comment_service.create_comments(db, comments, current_user)
+
+
 @router.put("/{comment_id}", response_model=Comment)
-async def update_comment(
+def update_comment(
     updates: CommentUpdate,
+    response: Response,
     comment_id: int = Path(..., gt=0),
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ) -> Comment:
-    return comment_service.update_comment(db, comment_id, updates, current_user)
+    comment = comment_service.update_comment(db, comment_id, updates, current_user, parse_if_match(if_match))
+    response.headers["ETag"] = make_etag(comment.version, weak=False)
+    return comment
 
 
 
 @router.delete("/{comment_id}", response_model=dict)
-async def delele_comment(
+def delele_comment(
     comment_id: int = Path(..., gt=0),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
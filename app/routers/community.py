@@ -1,19 +1,22 @@
-from fastapi import APIRouter, Depends, Path, Query
+from fastapi import APIRouter, Depends, Path, Query, Header, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
 
 from app.core.dependencies import get_db, get_current_user
 from app.schemas.community import *
 from app.schemas.user import User
 from app.schemas.post import Post
-from app.services import community_service
+from app.services import community_service, export_service
+from app.cache.ranking import SortMode
+from app.core.etag import make_etag, parse_if_match
+from app.core.responses import RawJSONResponse
 
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[Community])
-async def get_all_communities_handler(
+def get_all_communities_handler(
     db: Session = Depends(get_db),
     limit: int = Query(5, ge=0, le=100),
     offset: int = Query(0, ge=0)
@@ -21,18 +24,28 @@ async def get_all_communities_handler(
     return community_service.get_all_communities(db, limit, offset)
 
 
+@router.get("/suggest", response_model=List[CommunitySuggestion])
+def suggest_communities_handler(
+    prefix: str = Query(..., min_length=1, max_length=50),
+    limit: int = Query(5, gt=0, le=20),
+    db: Session = Depends(get_db)
+) -> List[CommunitySuggestion]:
+    return community_service.suggest_communities(db, prefix, limit)
+
+
 @router.get("/{community_id}", response_model=Community)
-async def get_community_by_name_handler(
+def get_community_by_name_handler(
     community_id: int = Path(..., ge=0),
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
-) -> Community:
-    return community_service.get_community_by_id(db, community_id)
+) -> Response:
+    return community_service.get_community_response(db, community_id, if_none_match)
 
 
 
 
 @router.get("/{community_id}/followers", response_model=List[User])
-async def get_community_followers(
+def get_community_followers(
     community_id: int = Path(..., ge=0),
     limit: int = Query(5, ge=0, le=100),
     offset: int = Query(0, ge=0),
@@ -42,37 +55,56 @@ async def get_community_followers(
 
 
 @router.post("/{community_id}/followers", response_model=List[User])
-async def add_community_follower(
+def add_community_follower(
     community_id: int = Path(..., ge=0),
+    idempotency_key: Optional[str] = Header(None, max_length=100),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ) -> List[User]:
-    return community_service.add_follower(db, community_id, current_user)
+    return community_service.add_follower(db, community_id, current_user, idempotency_key)
 
 
 @router.delete("/{community_id}/followers", response_model=dict)
-async def delete_community_follower(
+def delete_community_follower(
     community_id: int = Path(..., ge=0),
+    idempotency_key: Optional[str] = Header(None, max_length=100),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)   
 ) -> dict:
-    return community_service.delete_follower(db, community_id, current_user)
+    return community_service.delete_follower(db, community_id, current_user, idempotency_key)
 
 
 
-@router.get("/{community_id}/posts")
+@router.get("/{community_id}/posts", response_model=List[Post])
 def get_community_posts(
     community_id: int = Path(..., gl=0),
     limit: int = Query(5, gl=0, le=100),
     offset: int = Query(0, ge=0),
+    sort: Optional[SortMode] = Query(None),
+    accept_encoding: Optional[str] = Header(None),
     db: Session = Depends(get_db)
-) -> List[Post]:
+) -> Union[List[Post], RawJSONResponse]:
+    if sort is not None:
+        return community_service.get_ranked_posts(db, community_id, sort, limit, offset, accept_encoding)
     return community_service.get_posts(db, community_id, limit, offset)
 
 
 
+@router.get("/{community_id}/export/{entity}")
+def export_community(
+    entity: export_service.ExportEntity,
+    community_id: int = Path(..., ge=0),
+    format: export_service.ExportFormat = Query("ndjson"),
+    cursor: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return export_service.export_community(db, community_id, entity, format, cursor, current_user)
+
+
+
 @router.post("/", response_model=Community)
-async def create_community(
+def create_community(
     community: CommunityCreateInput,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -82,17 +114,21 @@ async def create_community(
 
 
 @router.put("/{community_id}", response_model=Community)
-async def update_community(
+def update_community(
     updates: CommunityUpdate,
+    response: Response,
     community_id: int = Path(..., ge=0),
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ) -> Community:
-    return community_service.update_community(db, community_id, updates, current_user)
+    community = community_service.update_community(db, community_id, updates, current_user, parse_if_match(if_match))
+    response.headers["ETag"] = make_etag(community.version, weak=False)
+    return community
 
 
 @router.delete("/{community_id}", response_model=dict)
-async def delete_community(
+def delete_community(
     community_id: int = Path(..., ge=0),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1,39 +1,48 @@
-from fastapi import APIRouter, Path, Query, Depends
+from fastapi import APIRouter, Path, Query, Depends, Body, Header, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 
-from app.services import post_service, comment_service
+from app.services import post_service, comment_service, ranking_service
 from app.core.dependencies import get_db, get_current_user
 from app.schemas.user import User
 from app.schemas.comment import Comment
 from app.schemas.post import *
+from app.cache.ranking import SortMode
+from app.core.etag import make_etag, parse_if_match
+from app.core.responses import RawJSONResponse
 
 
 
 router = APIRouter()
 
 
-@router.get("/")
-async def get_all_posts(
+@router.get("/", response_model=List[Post])
+def get_all_posts(
     community_id: Optional[int] = Query(None, gt=0),
     limit: int = Query(5, gt=0, le=100),
     offset: int = Query(0, ge=0),
     owner_id: Optional[int] = Query(None, gt=0),
+    sort: Optional[SortMode] = Query(None),
+    accept_encoding: Optional[str] = Header(None),
     db: Session = Depends(get_db)
-) -> List[Post]:
+) -> Union[List[Post], RawJSONResponse]:
+    if sort is not None and owner_id is None:
+        return ranking_service.get_ranked_posts(db, sort, community_id, limit, offset, accept_encoding)
     return post_service.get_all_post(db, limit, offset, owner_id, community_id)
 
 
-@router.get("/{post_id}")
-async def get_post_by_id(
+@router.get("/{post_id}", response_model=Post)
+def get_post_by_id(
     post_id: int = Path(..., gt=0),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
     db: Session = Depends(get_db)
-) -> Post:
-    return post_service.get_post_by_id(db, post_id)
+) -> Response:
+    return post_service.get_post_response(db, post_id, if_none_match, if_modified_since)
 
 
 @router.get("/{post_id}/comments", response_model=List[Comment])
-async def get_comments(
+def get_comments(
     post_id: int = Path(..., gt=0),
     limit: int = Query(5, gt=0, le=100),
     offset: int = Query(0, ge=0),
@@ -42,8 +51,8 @@ async def get_comments(
     return comment_service.get_comments_by_post(db, post_id, limit, offset)
 
 
-@router.post("/")
-async def create_post(
+@router.post("/", response_model=Post)
+def create_post(
     post: PostCreateInput,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -51,18 +60,31 @@ async def create_post(
     return post_service.create_post(db, post, current_user)
 
 
-@router.put("/{post_id}")
-async def update_post(
+@router.post("/bulk", response_model=PostBulkResult)
+def create_posts(
+    posts: List[dict] = Body(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> PostBulkResult:
+    return post_service.create_posts(db, posts, current_user)
+
+
+@router.put("/{post_id}", response_model=Post)
+def update_post(
     updates: PostUpdate,
+    response: Response,
     post_id: int = Path(..., gl=0),
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ) -> Post:
-    return post_service.update_post(db, post_id, updates, current_user)
+    post = post_service.update_post(db, post_id, updates, current_user, parse_if_match(if_match))
+    response.headers["ETag"] = make_etag(post.version, weak=False)
+    return post
 
 
-@router.delete("/{post_id}")
-async def delete_post(
+@router.delete("/{post_id}", response_model=dict)
+def delete_post(
     post_id: int = Path(..., gl=0),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
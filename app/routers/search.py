@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.core.dependencies import get_db
+from app.schemas.search import SearchResult
+from app.services import search_service
+
+
+router = APIRouter()
+
+
+@router.get("/", response_model=SearchResult)
+def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(5, gt=0, le=100),
+    db: Session = Depends(get_db)
+) -> SearchResult:
+    return search_service.search(db, q, limit)
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, Path, Query
+from fastapi import APIRouter, Depends, Path, Query, Body, Header, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from app.services import user_service
+from app.services import user_service, feed_service
 from app.core.dependencies import get_db, get_current_user
+from app.core.etag import make_etag, parse_if_match
+from app.core.responses import RawJSONResponse
 from app.schemas.user import *
 from app.schemas.community import Community
 from app.schemas.post import Post
@@ -13,7 +15,7 @@ router = APIRouter()
 
 
 @router.get("/", response_model=List[User])
-async def get_all_users_handler(
+def get_all_users_handler(
     limit: int = Query(5, ge=1, le=100),
     offset: int = Query(0, ge=0),
     db: Session = Depends(get_db)
@@ -25,7 +27,7 @@ async def get_all_users_handler(
 
 
 @router.get("/{user_id}", response_model=User)
-async def get_user_by_id_handler(
+def get_user_by_id_handler(
     user_id: str = Path(..., max_length=50),
     db: Session = Depends(get_db)
 ) -> User:
@@ -36,7 +38,7 @@ async def get_user_by_id_handler(
 
 
 @router.get("/{user_id}/subscribes", response_model=List[Community])
-async def get_user_subscribes(
+def get_user_subscribes(
     limit: int = Query(5, ge=1, le=100),
     offset: int = Query(0, ge=0),
     user_id: int = Path(..., ge=0),
@@ -46,7 +48,7 @@ async def get_user_subscribes(
 
 
 @router.get("/{user_id}/communities", response_model=List[Community])
-async def get_user_communities(
+def get_user_communities(
     limit: int = Query(5, ge=1, le=100),
     offset: int = Query(0, ge=0),
     user_id: int = Path(..., ge=0),
@@ -55,8 +57,8 @@ async def get_user_communities(
     return user_service.get_user_communities(db, user_id, limit, offset)
 
 
-@router.get("/{user_id}/posts")
-async def get_user_posts(
+@router.get("/{user_id}/posts", response_model=List[Post])
+def get_user_posts(
     user_id: int = Path(..., gt=0),
     limit: int = Query(5, gt=0, le=100),
     offset: int = Query(0, ge=0),
@@ -65,9 +67,19 @@ async def get_user_posts(
     return user_service.get_user_pots(db, user_id, limit, offset)
 
 
+@router.get("/{user_id}/feed", response_model=List[Post])
+def get_user_feed(
+    user_id: int = Path(..., gt=0),
+    limit: int = Query(5, gt=0, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+) -> RawJSONResponse:
+    return feed_service.get_user_feed(db, user_id, limit, offset)
+
+
 
 @router.post("/", response_model=User)
-async def create_user_handler(
+def create_user_handler(
     user: UserCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -75,18 +87,31 @@ async def create_user_handler(
     return user_service.create_user(db, user, current_user)
 
 
+@router.post("/bulk", response_model=UserBulkResult)
+def create_users_handler(
+    users: List[dict] = Body(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> UserBulkResult:
+    return user_service.create_users(db, users, current_user)
+
+
 @router.put("/{user_id}", response_model=User)
-async def update_user_handler(
+def update_user_handler(
     updates: UserUpdate,
+    response: Response,
     user_id: int = Path(..., ge=0),
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ) -> User:
-    return user_service.update_user(db, user_id, updates, current_user)
+    user = user_service.update_user(db, user_id, updates, current_user, parse_if_match(if_match))
+    response.headers["ETag"] = make_etag(user.version, weak=False)
+    return user
 
 
 @router.delete("/{user_id}", response_model=dict)
-async def delete_user_handler(
+def delete_user_handler(
     user_id: int = Path(..., ge=0),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
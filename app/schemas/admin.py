@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+
+
+class HotKey(BaseModel):
+    key: str
+    estimate: int
@@ -0,0 +1,19 @@
+from pydantic import BaseModel, ValidationError
+
+
+BULK_MAX_SIZE = 10000
+# Every user costs a bcrypt hash, a few hundred milliseconds of CPU
+USER_BULK_MAX_SIZE = 200
+
+
+class BulkError(BaseModel):
+    index: int
+    detail: str
+
+    @classmethod
+    def from_validation_error(cls, index: int, error: ValidationError) -> "BulkError":
+        detail = "; ".join(
+            f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}"
+            for err in error.errors()
+        )
+        return cls(index=index, detail=detail)
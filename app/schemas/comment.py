@@ -1,7 +1,9 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
+from app.schemas.bulk import BulkError
+
 
 class CommentBase(BaseModel):
     text: str = Field(max_length=500)
@@ -24,6 +26,12 @@ class Comment(CommentBase):
     owner_id: int = Field(gt=0)
     time_edited: datetime
     is_edited: bool
+    version: int = 1
+
+
+class CommentBulkResult(BaseModel):
+    created: List[Comment] = []
+    errors: List[BulkError] = []
 
 
 class CommentUpdate(BaseModel):
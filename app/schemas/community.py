@@ -21,6 +21,12 @@ class CommunityCreate(CommunityBase):
 
 class Community(CommunityCreate):
     id: int
+    version: int = 1
+
+
+class CommunitySuggestion(BaseModel):
+    id: int
+    community_name: str
 
 
 class CommunityFilter(BaseModel):
@@ -1,7 +1,9 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
+from app.schemas.bulk import BulkError
+
 
 class PostBase(BaseModel):
     title: str = Field(max_length=50)
@@ -23,6 +25,14 @@ class Post(PostBase):
     owner_id: int = Field(gl=0)
     time_edited: datetime
     is_edited: bool
+    comments_count: int = 0
+    view_count: int = 0
+    version: int = 1
+
+
+class PostBulkResult(BaseModel):
+    created: List[Post] = []
+    errors: List[BulkError] = []
 
 
 class PostUpdate(BaseModel):
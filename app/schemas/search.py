@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from typing import List
+
+from app.schemas.post import Post
+from app.schemas.comment import Comment
+from app.schemas.community import Community
+
+
+class SearchResult(BaseModel):
+    posts: List[Post] = []
+    comments: List[Comment] = []
+    communities: List[Community] = []
@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, Literal
+from typing import Optional, Literal, List
+
+from app.schemas.bulk import BulkError
 
 
 class UserBase(BaseModel):
@@ -21,6 +23,12 @@ class UserLogin(BaseModel):
 
 class User(UserBase):
     id: int = Field(ge=0)
+    version: int = 1
+
+
+class UserBulkResult(BaseModel):
+    created: List[User] = []
+    errors: List[BulkError] = []
 
 
 class UserFilter(BaseModel):
@@ -0,0 +1,43 @@
+from fastapi import HTTPException
+from typing import List
+
+from app.schemas.user import User
+from app.schemas.admin import HotKey
+from app.services import outbox_service
+from app.cache import hotkeys
+from app.core import metrics
+from app.core.logging_config import logger
+from app.core.log_context import set_user_context
+
+
+
+def _check_admin(current_user: User, event: str):
+    set_user_context(current_user)
+
+    if current_user.role != "admin":
+        logger.warning(event, reason="permission_denied")
+        raise HTTPException(
+            status_code=403,
+            detail="Only admins can see cache internals"
+        )
+
+
+def get_metrics(current_user: User) -> dict:
+    _check_admin(current_user, "metrics_fetch_failed")
+
+    outbox_service.collect_metrics()
+    return metrics.snapshot()
+
+
+def requeue_outbox(current_user: User) -> dict:
+    _check_admin(current_user, "outbox_requeue_failed")
+
+    return {"requeued": outbox_service.requeue_dead_events()}
+
+
+def get_hot_keys(current_user: User) -> List[HotKey]:
+    """Hot keys detected by this process, hottest first."""
+    _check_admin(current_user, "hot_keys_fetch_failed")
+
+    return [HotKey(key=key, estimate=estimate) for key, estimate in hotkeys.get_hot_keys()]
+
@@ -11,17 +11,6 @@ def register_user(
     user:  UserCreate,
     db: Session
 ) -> User:
-    if user_crud.is_user_exist(db, user.username):
-        logger.warning(
-            "user_register_failed",
-            username=user.username,
-            reason="already_exist"
-        )
-        raise HTTPException(
-            status_code=409,
-            detail="This username already exist"
-        )
-
     if user.role == "admin":
         logger.warning(
             "user_register_failed",
@@ -33,14 +22,29 @@ def register_user(
             detail="User create_user handler if you want to create admin user"
         )
 
-    user_data = UserCreate(
-        username=user.username,
-        password=hash_password(user.password),
-        avatar_url=user.avatar_url,
-        role="user"
-    )
+    # A taken name is found before the password is hashed, the unique
+    # constraint still decides between concurrent registrations
+    created_user = None
+    if not user_crud.is_user_exist(db, user.username):
+        user_data = UserCreate(
+            username=user.username,
+            password=hash_password(user.password),
+            avatar_url=user.avatar_url,
+            role="user"
+        )
+        created_user = user_crud.create_user(db, user_data)
+
+    if created_user is None:
+        logger.warning(
+            "user_register_failed",
+            username=user.username,
+            reason="already_exist"
+        )
+        raise HTTPException(
+            status_code=409,
+            detail="This username already exist"
+        )
 
-    created_user = user_crud.create_user(db, user_data)
     logger.info("user_registered", target_user_id=created_user.id)
 
     return User.from_orm(created_user)
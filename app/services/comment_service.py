@@ -1,12 +1,17 @@
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
+from pydantic import ValidationError
 
 from app.crud import comment as comment_crud
-from app.crud.post import get_post_by_id
+from app.crud.post import get_post_by_id, get_posts_by_ids
+from app.services import ranking_service, search_service
+from app.cache import entity as entity_cache
+from app.cache.keys import post_cache_key
 from app.schemas.user import User
-from app.schemas.comment import CommentCreate, CommentCreateInput, Comment, CommentUpdate
+from app.schemas.comment import CommentCreate, CommentCreateInput, Comment, CommentUpdate, CommentBulkResult
+from app.schemas.bulk import BulkError, BULK_MAX_SIZE
 from app.core.log_context import set_user_context
 from app.core.logging_config import logger
 
@@ -17,8 +22,9 @@ def get_comments_by_post(
     limit: int,
     offset: int,
 ) -> List[Comment]:
-    
-    if not get_post_by_id(db, post_id):
+    # One query checks the post and reads the page
+    comments = comment_crud.get_all_comments_by_post(db, post_id, limit, offset)
+    if comments is None:
         logger.warning(
             "comments_fetch_failed",
             post_id=post_id,
@@ -29,7 +35,6 @@ def get_comments_by_post(
             detail="Post not found"
         )
 
-    comments = comment_crud.get_all_comments_by_post(db, post_id, limit, offset)
     logger.info("comments_fetched_from_db", post_id=post_id, total_count=len(comments))
 
     return [Comment.from_orm(c) for c in comments]
@@ -42,7 +47,8 @@ def create_comment(
 ) -> Comment:
     set_user_context(current_user)
 
-    if not get_post_by_id(db, comment.post_id):
+    post = get_post_by_id(db, comment.post_id)
+    if not post:
         logger.warning(
             "comments_fetch_failed",
             post_id=comment.post_id,
@@ -62,48 +68,125 @@ def create_comment(
     comment_data = comment_crud.create_comment(db, new_comment)
     logger.info("comment_created", comment_id=comment_data.id)
 
+    entity_cache.incr_field(post_cache_key(post.id), "comments_count")
+    ranking_service.on_comment_created(post)
+    search_service.index_comment(comment_data)
+
     return Comment.from_orm(comment_data)
 
 
-def update_comment(
+def create_comments(
     db: Session,
-    comment_id: int,
-    updates: CommentUpdate,
+    comments: List[dict],
     current_user: User
-) -> Comment:
+) -> CommentBulkResult:
     set_user_context(current_user)
 
-    comment = comment_crud.get_comment_by_id(db, comment_id)
-    if not comment:
+    if len(comments) > BULK_MAX_SIZE:
         logger.warning(
-            "comment_updatefailed",
-            comment_id=comment_id,
-            reason="not_found"
+            "comments_bulk_create_failed",
+            total_count=len(comments),
+            reason="too_large"
         )
         raise HTTPException(
-            status_code=404,
-            detail="Comment not found"
+            status_code=413,
+            detail=f"Batch can contain at most {BULK_MAX_SIZE} comments"
         )
-    
-    if comment.owner_id != current_user.id and current_user.role != "admin":
+
+    errors = []
+    validated = []
+    for index, item in enumerate(comments):
+        try:
+            comment = CommentCreateInput.model_validate(item)
+        except ValidationError as e:
+            errors.append(BulkError.from_validation_error(index, e))
+            continue
+
+        validated.append((index, CommentCreate(
+            text=comment.text,
+            post_id=comment.post_id,
+            owner_id=current_user.id
+        )))
+
+    posts = {p.id: p for p in get_posts_by_ids(db, list({c.post_id for _, c in validated}))}
+    new_comments = []
+    for index, comment in validated:
+        if comment.post_id not in posts:
+            errors.append(BulkError(index=index, detail="Post not found"))
+            continue
+        new_comments.append(comment)
+
+    created = comment_crud.create_comments(db, new_comments)
+    logger.info("comments_bulk_created", total_count=len(created), errors_count=len(errors))
+
+    counts = {}
+    for comment in created:
+        counts[comment.post_id] = counts.get(comment.post_id, 0) + 1
+    search_service.index_new_comments(created)
+    entity_cache.incr_fields({post_cache_key(post_id): count for post_id, count in counts.items()}, "comments_count")
+    ranking_service.on_comments_created([posts[post_id] for post_id in counts], counts)
+
+    return CommentBulkResult(
+        created=[Comment.from_orm(c) for c in created],
+        errors=sorted(errors, key=lambda e: e.index)
+    )
+
+
+def update_comment(
+    db: Session,
+    comment_id: int,
+    updates: CommentUpdate,
+    current_user: User,
+    version: Optional[int] = None
+) -> Comment:
+    """version is the version the edit is based on, None applies it to any version."""
+    set_user_context(current_user)
+
+    values = updates.model_dump(exclude_none=True)
+    if values:
+        values.update(is_edited=True, time_edited=datetime.utcnow())
+    owner_id = None if current_user.role == "admin" else current_user.id
+
+    comment = comment_crud.update_comment(db, comment_id, values, owner_id, version)
+    if comment is None:
+        state = comment_crud.get_comment_edit_state(db, comment_id)
+        if state is None:
+            logger.warning(
+                "comment_updatefailed",
+                comment_id=comment_id,
+                reason="not_found"
+            )
+            raise HTTPException(
+                status_code=404,
+                detail="Comment not found"
+            )
+
+        if owner_id is not None and state.owner_id != owner_id:
+            logger.warning(
+                "comment_update_failed",
+                comment_id=comment_id,
+                reason="permission_denied"
+            )
+            raise HTTPException(
+                status_code=403,
+                detail="Permission denied"
+            )
+
         logger.warning(
             "comment_update_failed",
             comment_id=comment_id,
-            reason="permission_denied"
+            reason="version_mismatch"
         )
         raise HTTPException(
-            status_code=403,
-            detail="Permission denied"
+            status_code=412,
+            detail="Comment has been changed, reload it and try again"
         )
-    
-    if updates.text is not None:
-        comment.text = updates.text
-        comment.is_edited = True
-        comment.time_edited = datetime.utcnow()
 
-    comment_crud.update_comment(db, comment)
     logger.info("comment_updated", comment_id=comment_id)
 
+    if updates.text is not None:
+        search_service.index_comment(comment)
+
     return Comment.from_orm(comment)
     
 
@@ -142,4 +225,11 @@ def delete_comment(
     comment_crud.delete_comment(db, comment)
     logger.info("comment_deleted", comment_id=comment_id)
 
+    search_service.remove_comment(comment_id)
+
+    entity_cache.incr_field(post_cache_key(comment.post_id), "comments_count", -1)
+    post = get_post_by_id(db, comment.post_id)
+    if post:
+        ranking_service.on_comment_deleted(post)
+
     return {"message": f"Comment {comment_id} has been deleted"}
\ No newline at end of file
@@ -1,15 +1,29 @@
-from fastapi import HTTPException
+from fastapi import HTTPException, Response
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from redis.exceptions import RedisError
+from typing import List, Optional
+
+import orjson
 
 from app.crud import community as community_crud
-from app.crud import user as user_crud
+from app.crud import outbox as outbox_crud
+from app.services import feed_service, ranking_service, search_service, write_behind_service
 from app.db.models import Community as CommunityDB
+from app.db.database import on_primary
 from app.schemas.community import *
 from app.schemas.user import User
 from app.schemas.post import Post
 from app.cache.utils import *
 from app.cache.keys import community_cache_key
+from app.cache import entity as entity_cache
+from app.cache import dependencies
+from app.cache import access as access_cache
+from app.cache import hotkeys
+from app.cache import suggest as suggest_cache
+from app.cache.ranking import SortMode
+from app.core.responses import RawJSONResponse
+from app.core.etag import entity_response, is_not_modified, not_modified_response
 from app.core.logging_config import logger
 from app.core.log_context import set_user_context
 
@@ -29,17 +43,68 @@ def get_all_communities(
 
 
 
-def get_community_by_id(
+def _build_suggest_index(db: Session, batch_size: int = 10000):
+    batch = []
+    total = 0
+    for row in community_crud.get_community_names(db, batch_size):
+        batch.append((row.id, row.community_name))
+        if len(batch) >= batch_size:
+            suggest_cache.add_names(batch)
+            total += len(batch)
+            batch = []
+
+    if batch:
+        suggest_cache.add_names(batch)
+        total += len(batch)
+
+    logger.info("community_suggest_index_built", total_count=total)
+
+
+def suggest_communities(
+    db: Session,
+    prefix: str,
+    limit: int
+) -> List[CommunitySuggestion]:
+    try:
+        if not suggest_cache.is_index_exist():
+            _build_suggest_index(db)
+
+        suggestions = suggest_cache.suggest(prefix, limit)
+    except RedisError:
+        logger.warning("community_suggestions_fetched_from_db", reason="cache_unavailable")
+        return [
+            CommunitySuggestion(id=row.id, community_name=row.community_name)
+            for row in community_crud.get_community_names_by_prefix(db, prefix, limit)
+        ]
+    logger.info("community_suggestions_fetched_from_cache", total_count=len(suggestions))
+
+    return [
+        CommunitySuggestion(id=community_id, community_name=name)
+        for community_id, name in suggestions
+    ]
+
+
+def get_community_json(
     db: Session,
     community_id: int
-) -> Community:
+) -> bytes:
+    """Returns the community as JSON, cache hits are returned without parsing."""
     cache_key = community_cache_key(community_id)
-    cached_community = get_cache(cache_key)
+    hot_community = hotkeys.get(cache_key)
+    if hot_community:
+        hotkeys.record(cache_key)
+        access_cache.record("com", community_id)
+        return hot_community
+
+    cached_community, generation = entity_cache.read(cache_key, Community)
     if cached_community:
+        hotkeys.record(cache_key, cached_community)
+        access_cache.record("com", community_id)
         logger.info("fetched_community_from_cache", community_id=community_id)
-        return deserialize_community(cached_community)
+        return cached_community
 
-    community = community_crud.get_community_by_id(db, community_id)
+    with on_primary(db):
+        community = community_crud.get_community_by_id(db, community_id)
     if not community:
         logger.warning(
             "community_fetch_failed",
@@ -50,12 +115,43 @@ def get_community_by_id(
             status_code=404,
             detail="Community not found"
         )
+    # Only reads of existing communities count, a miss must not create access keys
+    access_cache.record("com", community_id)
     logger.info("community_fetched_from_db", community_id=community_id)
 
-    set_cache(cache_key, serialize_community(community), ttl=120)
+    community_model = Community.from_orm(community)
+    entity_cache.set_entity(cache_key, community_model, generation, dependencies.community_parents(community_model))
     logger.debug("community_cached", community_id=community_id)
 
-    return Community.from_orm(community)
+    return community_model.model_dump_json().encode()
+
+
+def get_community_response(
+    db: Session,
+    community_id: int,
+    if_none_match: Optional[str] = None
+) -> Response:
+    """Returns the community with its ETag, or 304.
+
+    If-None-Match is first checked against the version stored in the
+    cache entry, so a match is answered without reading the community.
+    """
+    if if_none_match is not None:
+        validators = entity_cache.read_fields(community_cache_key(community_id), ["version"])
+        if validators and is_not_modified(if_none_match, None, int(validators[0])):
+            access_cache.record("com", community_id)
+            logger.info("community_not_modified", community_id=community_id)
+            return not_modified_response(int(validators[0]))
+
+    body = get_community_json(db, community_id)
+    return entity_response(body, if_none_match, None, orjson.loads(body)["version"])
+
+
+def get_community_by_id(
+    db: Session,
+    community_id: int
+) -> Community:
+    return deserialize_community(get_community_json(db, community_id))
 
 
 def create_community(
@@ -65,7 +161,15 @@ def create_community(
 ) -> Community:
     set_user_context(current_user)
 
-    if community_crud.is_community_exist_by_name(db, community.community_name):
+    new_community = CommunityCreate(
+        community_name=community.community_name,
+        description=community.description,
+        photo_url=community.photo_url,
+        owner_id=current_user.id
+    )
+
+    community_data = community_crud.create_community(db, new_community)
+    if community_data is None:
         logger.warning(
             "community_create_failed",
             community_name=community.community_name,
@@ -75,20 +179,21 @@ def create_community(
             status_code=409,
             detail=f"Community {community.community_name} has already existed"
         )
-    
-    new_community = CommunityCreate(
-        community_name=community.community_name,
-        description=community.description,
-        photo_url=community.photo_url,
-        owner_id=current_user.id
-    )
 
-    community_data = community_crud.create_community(db, new_community)
     logger.info("community_created", community_id=community_data.id)
 
-    set_cache(community_cache_key(community_data.id), serialize_community(community_data), ttl=120)
+    # A new id has no generation yet
+    entity_cache.set_entity(
+        community_cache_key(community_data.id),
+        Community.from_orm(community_data),
+        b"",
+        dependencies.community_parents(community_data)
+    )
     logger.debug("community_cached", community_id=community_data.id)
 
+    search_service.index_community(community_data)
+    suggest_cache.add_name(community_data.id, community_data.community_name)
+
     return Community.from_orm(community_data)
 
 
@@ -96,34 +201,63 @@ def update_community(
     db: Session,
     community_id: int,
     updates: CommunityUpdate,
-    current_user: User
+    current_user: User,
+    version: Optional[int] = None
 ) -> Community:
+    """version is the version the edit is based on, None applies it to any version."""
     set_user_context(current_user)
 
-    community = community_crud.get_community_by_id(db, community_id)
-    if not community:
+    values = updates.model_dump(exclude_none=True)
+    owner_id = None if current_user.role == "admin" else current_user.id
+
+    try:
+        community = community_crud.update_community(db, community_id, values, owner_id, version)
+    except IntegrityError:
         logger.warning(
             "community_update_failed",
-            community_id=community_id,
-            reason="not_found"
+            community_name=updates.community_name,
+            reason="already_exists"
         )
         raise HTTPException(
-            status_code=404,
-            detail="Community not found"
+            status_code=409, detail=f"Community {updates.community_name} has already existed"
         )
-    
 
-    if community.owner_id != current_user.id and current_user.role != "admin":
+    if community is None:
+        state = community_crud.get_community_edit_state(db, community_id)
+        if state is None:
+            logger.warning(
+                "community_update_failed",
+                community_id=community_id,
+                reason="not_found"
+            )
+            raise HTTPException(
+                status_code=404,
+                detail="Community not found"
+            )
+
+        if owner_id is not None and state.owner_id != owner_id:
+            logger.warning(
+                "community_update_failed",
+                community_id=community_id,
+                reason="permission_denied"
+            )
+            raise HTTPException(
+                status_code=403,
+                detail="You do not have permission to edit other communities"
+            )
+
         logger.warning(
             "community_update_failed",
             community_id=community_id,
-            reason="permission_denied"
+            reason="version_mismatch"
         )
         raise HTTPException(
-            status_code=403,
-            detail="You do not have permission to edit other communities"
+            status_code=412,
+            detail="Community has been changed, reload it and try again"
         )
 
+    # Checked after the row was matched, a missing or foreign community is
+    # still a 404 or 403. Empty values only read the row.
     if not updates.model_dump(exclude_unset=True):
         logger.warning(
             "community_update_failed",
@@ -135,30 +269,19 @@ def update_community(
             detail="No update fields provided"
         )
 
-    if updates.community_name is not None:
-        if community_crud.is_community_exist_by_name(db, updates.community_name):
-            logger.warning(
-                "community_update_failed",
-                community_name=updates.community_name,
-                reason="already_exists"
-            )
-            raise HTTPException(
-                status_code=409, detail=f"Community {updates.community_name} has already existed"
-            )
-        community.community_name = updates.community_name
-    
-    if updates.description is not None:
-        community.description = updates.description
-    
-    if updates.photo_url is not None:
-        community.photo_url = updates.photo_url
+    logger.info("community_updated", community_id=community_id, version=community.version)
 
-    community_crud.update_community(db, community)
-    logger.info("community_updated", community_id=community_id)
-
-    set_cache(community_cache_key(community_id), serialize_community(community), ttl=120)
+    entity_cache.set_fields(
+        community_cache_key(community_id),
+        entity_cache.to_changed_fields(Community.from_orm(community), values.keys()),
+        community.version
+    )
     logger.debug("community_cached", community_id=community_id)
 
+    search_service.index_community(community)
+    if updates.community_name is not None:
+        suggest_cache.add_name(community_id, community.community_name)
+
     return Community.from_orm(community)
 
 
@@ -169,7 +292,7 @@ def delete_community(
 ) -> dict:
     set_user_context(current_user)
 
-    community = community_crud.get_community_by_id(db, community_id)
+    community = community_crud.get_community_for_delete(db, community_id)
     if not community:
         logger.warning(
             "community_delete_failed",
@@ -192,12 +315,16 @@ def delete_community(
             detail="You do not have permission to delete other communities"
         )
     
+    outbox_crud.add_event(db, "com", community_id, cascade=True)
     community_crud.delete_community(db, community)
     logger.info("community_deleted", community_id=community_id)
 
-    delete_cache(community_cache_key(community_id))
+    entity_cache.delete_entity(community_cache_key(community_id))
     logger.debug("community_cache_deleted", community_id=community_id)
 
+    search_service.remove_community(community_id)
+    suggest_cache.remove_name(community_id)
+
     return {"message": f"Community {community.community_name} has been deleted"} 
 
 
@@ -207,7 +334,8 @@ def get_followers(
     offset: int,
     community_id: int
 ) -> List[User]:
-    if not community_crud.get_community_by_id(db, community_id):
+    followers = community_crud.get_all_followers(db, limit, offset, community_id)
+    if followers is None:
         logger.warning(
             "community_fetch_followers_failed",
             community_id=community_id,
@@ -219,13 +347,44 @@ def get_followers(
         )
 
     logger.info("community_followerd_fetched_from_db", community_id=community_id)
-    return [User.from_orm(user) for user in community_crud.get_all_followers(db, limit, offset, community_id)]
+    return [User.from_orm(user) for user in followers]
+
+
+def _is_follower(db: Session, community_id: int, user_id: int) -> bool:
+    # Toggles which are recorded but not flushed yet win over the database
+    pending = write_behind_service.get_pending_follow(community_id, user_id)
+    if pending is not None:
+        return pending
+    return community_crud.is_follower(db, community_id, user_id)
+
+
+def _record_follow(community_id: int, user_id: int, follow: bool, idempotency_key: Optional[str]) -> bool:
+    """Returns False if the toggle has to be written to the database right away."""
+    if not write_behind_service.WRITE_BEHIND_FOLLOWERS:
+        return False
+    try:
+        write_behind_service.record_follow(community_id, user_id, follow, idempotency_key)
+    except RedisError:
+        logger.warning("follow_event_record_failed", community_id=community_id, reason="cache_unavailable")
+        return False
+    return True
+
+
+def _followers_with(db: Session, community_id: int, current_user: User) -> List[User]:
+    # The follow may still be pending in the write-behind stream
+    followers = [
+        User.from_orm(user) for user in community_crud.get_all_followers(db, None, 0, community_id)
+        if user.id != current_user.id
+    ]
+    followers.append(current_user)
+    return followers
 
 
 def add_follower(
     db: Session,
     community_id: int,
-    current_user: User
+    current_user: User,
+    idempotency_key: Optional[str] = None
 ) -> List[User]:
     set_user_context(current_user)
 
@@ -240,10 +399,13 @@ def add_follower(
             status_code=404,
             detail="Community not found"
         )
-    
-    
-    follower=user_crud.get_user_by_id(db, current_user.id)
-    if follower in community.followers:
+
+    # A retry gets the result of the first request instead of 409
+    if write_behind_service.is_follow_recorded(idempotency_key):
+        logger.info("community_add_follower_replayed", community_id=community_id)
+        return _followers_with(db, community_id, current_user)
+
+    if _is_follower(db, community_id, current_user.id):
         logger.warning(
             "community_add_follower_failed",
             community_id=community_id,
@@ -255,16 +417,22 @@ def add_follower(
             detail="Follower already exist"
         )
 
-    updated_community = community_crud.add_follower(db, follower, community)
-
+    if _record_follow(community_id, current_user.id, True, idempotency_key):
+        followers = _followers_with(db, community_id, current_user)
+    else:
+        community_crud.add_follower(db, community_id, current_user.id)
+        followers = [User.from_orm(user) for user in community_crud.get_all_followers(db, None, 0, community_id)]
     logger.info("community_added_follower", community_id=community_id)
-    return [User.from_orm(user) for user in updated_community.followers]
+
+    feed_service.backfill_feed(db, current_user.id, community_id)
+    return followers
 
 
 def delete_follower(
     db: Session,
     community_id: int,
-    current_user: User
+    current_user: User,
+    idempotency_key: Optional[str] = None
 ) -> dict:
     set_user_context(current_user)
 
@@ -280,8 +448,11 @@ def delete_follower(
             detail="Community not found"
         )
 
-    follower = user_crud.get_user_by_id(db, current_user.id)
-    if not follower in community.followers:
+    if write_behind_service.is_follow_recorded(idempotency_key):
+        logger.info("community_follower_delete_replayed", community_id=community_id)
+        return {"message": f"follower {current_user.username} has been deleted"}
+
+    if not _is_follower(db, community_id, current_user.id):
         logger.warning(
             "community_follower_delete_failed",
             community_id=community_id,
@@ -293,10 +464,13 @@ def delete_follower(
             detail="User does not sunscribed"
         )
     
-    updated_community = community_crud.delete_follower(db, follower, community)
+    if not _record_follow(community_id, current_user.id, False, idempotency_key):
+        community_crud.delete_follower(db, community_id, current_user.id)
     logger.info("community_follower_deleted", community_id=community_id)
 
-    return {"message": f"follower {follower.username} has been deleted"}
+    feed_service.trim_feed(db, current_user.id, community_id)
+
+    return {"message": f"follower {current_user.username} has been deleted"}
 
 
 def get_posts(
@@ -305,9 +479,8 @@ def get_posts(
     limit: int,
     offset: int
 ) -> List[Post]:
-    
-    community = community_crud.get_community_by_id(db, community_id)
-    if not community:
+    posts = community_crud.get_community_posts(db, community_id, limit, offset)
+    if posts is None:
         logger.warning(
             "community_add_follower_failed",
             community_id=community_id,
@@ -317,8 +490,21 @@ def get_posts(
             status_code=404,
             detail="Community not found"
         )
-    
-    posts = community_crud.get_community_posts(db, community_id, limit, offset)
+
     logger.info("community_posts_fetched_from_db", community_id=community_id, total_count=len(posts))
 
-    return [Post.from_orm(p) for p in posts]
\ No newline at end of file
+    return [Post.from_orm(p) for p in posts]
+
+
+def get_ranked_posts(
+    db: Session,
+    community_id: int,
+    sort: SortMode,
+    limit: int,
+    offset: int,
+    accept_encoding: Optional[str] = None
+) -> RawJSONResponse:
+    # Raises 404 for unknown communities, usually served from the cache
+    get_community_by_id(db, community_id)
+
+    return ranking_service.get_ranked_posts(db, sort, community_id, limit, offset, accept_encoding)
\ No newline at end of file
@@ -0,0 +1,130 @@
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from typing import Iterator, Literal, Type
+import csv
+import io
+import os
+
+from dotenv import load_dotenv
+
+from app.db.database import Sessionmaker
+from app.crud import community as community_crud
+from app.schemas.user import User
+from app.schemas.post import Post
+from app.schemas.comment import Comment
+from app.core.logging_config import logger
+from app.core.log_context import set_user_context
+
+load_dotenv()
+
+ExportFormat = Literal["ndjson", "csv"]
+ExportEntity = Literal["posts", "comments", "followers"]
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+EXPORTS = {
+    "posts": (community_crud.export_posts_statement, Post),
+    "comments": (community_crud.export_comments_statement, Comment),
+    "followers": (community_crud.export_followers_statement, User)
+}
+
+
+
+def _csv_chunk(rows: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _stream_rows(
+    statement: Select,
+    schema: Type[BaseModel],
+    export_format: ExportFormat
+) -> Iterator[str]:
+    # The request session is closed before the body is streamed,
+    # so the export owns a session for the lifetime of the generator.
+    db = Sessionmaker(info={"read_only": True})
+    total = 0
+    try:
+        result = db.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+        fields = list(schema.model_fields)
+        if export_format == "csv":
+            yield _csv_chunk([fields])
+
+        # One chunk per server-side cursor batch, the next batch is only
+        # fetched once the client has consumed the previous one.
+        for batch in result.partitions():
+            items = [schema.model_validate(row) for row in batch]
+            total += len(items)
+
+            if export_format == "ndjson":
+                yield "".join(item.model_dump_json() + "\n" for item in items)
+            else:
+                yield _csv_chunk([list(item.model_dump(mode="json").values()) for item in items])
+    finally:
+        db.close()
+        logger.info("export_finished", total_count=total)
+
+
+def export_community(
+    db: Session,
+    community_id: int,
+    entity: ExportEntity,
+    export_format: ExportFormat,
+    cursor: int,
+    current_user: User
+) -> StreamingResponse:
+    """Streams all entities of a community ordered by id.
+
+    cursor is the id of the last row already received, so an interrupted
+    export is resumed by passing the id of the last exported row.
+    """
+    set_user_context(current_user)
+
+    if current_user.role != "admin":
+        logger.warning(
+            "community_export_failed",
+            community_id=community_id,
+            reason="permission_denied"
+        )
+        raise HTTPException(
+            status_code=403,
+            detail="Only admins can export communities"
+        )
+
+    if not community_crud.get_community_by_id(db, community_id):
+        logger.warning(
+            "community_export_failed",
+            community_id=community_id,
+            reason="not_found"
+        )
+        raise HTTPException(
+            status_code=404,
+            detail="Community not found"
+        )
+
+    build_statement, schema = EXPORTS[entity]
+    logger.info(
+        "export_started",
+        community_id=community_id,
+        entity=entity,
+        export_format=export_format,
+        cursor=cursor
+    )
+
+    return StreamingResponse(
+        _stream_rows(build_statement(community_id, cursor), schema, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="community_{community_id}_{entity}.{export_format}"'
+        }
+    )
@@ -0,0 +1,161 @@
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from redis.exceptions import RedisError
+from typing import List, Optional
+
+from app.crud import user as user_crud
+from app.crud import post as post_crud
+from app.crud import community as community_crud
+from app.db.models import Post as PostDB
+from app.schemas.post import Post
+from app.core.responses import RawJSONResponse, json_list_response
+from app.services import post_service
+from app.cache import feed as feed_cache
+from app.core.logging_config import logger
+
+
+
+def _post_score(post: PostDB) -> float:
+    return post.time_edited.timestamp()
+
+
+def _get_fanout_follower_ids(db: Session, community_id: int) -> Optional[List[int]]:
+    """Returns None for a community too big to fan out to, its ids are never loaded."""
+    limit = feed_cache.FEED_FANOUT_LIMIT
+    huge = community_crud.count_followers(db, community_id, limit) > limit
+    feed_cache.set_huge_community(community_id, huge)
+    if huge:
+        return None
+    return community_crud.get_follower_ids(db, community_id)
+
+
+def fan_out_post(
+    db: Session,
+    post: PostDB
+):
+    feed_cache.add_community_post(post.community_id, post.id, _post_score(post))
+
+    follower_ids = _get_fanout_follower_ids(db, post.community_id)
+    if follower_ids is None:
+        logger.debug("post_fanout_skipped", post_id=post.id, community_id=post.community_id, reason="huge_community")
+        return
+
+    updated = feed_cache.fan_out_post(follower_ids, post.id, _post_score(post))
+    logger.debug(
+        "post_fanned_out",
+        post_id=post.id,
+        community_id=post.community_id,
+        followers_count=len(follower_ids),
+        feeds_updated=updated
+    )
+
+
+def fan_out_posts(
+    db: Session,
+    posts: List[PostDB]
+):
+    community_posts, feeds = {}, {}
+    for post in posts:
+        community_posts.setdefault(post.community_id, {})[post.id] = _post_score(post)
+
+    for community_id, scores in community_posts.items():
+        for follower_id in _get_fanout_follower_ids(db, community_id) or ():
+            feeds.setdefault(follower_id, {}).update(scores)
+
+    # One pipeline for all posts of the batch, not one per post
+    feed_cache.add_community_posts(community_posts)
+    updated = feed_cache.fan_out_posts(feeds)
+    logger.debug(
+        "posts_fanned_out",
+        total_count=len(posts),
+        communities_count=len(community_posts),
+        feeds_updated=updated
+    )
+
+
+def remove_post(post: PostDB):
+    feed_cache.remove_community_post(post.community_id, post.id)
+
+
+def backfill_feed(
+    db: Session,
+    user_id: int,
+    community_id: int
+):
+    if not feed_cache.is_feed_exist(user_id) or feed_cache.is_huge_community(community_id):
+        return
+
+    posts = post_crud.get_recent_posts_by_communities(db, [community_id], feed_cache.FEED_MAX_LEN)
+    feed_cache.fill_feed(user_id, {p.id: _post_score(p) for p in posts})
+    logger.debug("feed_backfilled", community_id=community_id, total_count=len(posts))
+
+
+def trim_feed(
+    db: Session,
+    user_id: int,
+    community_id: int
+):
+    if not feed_cache.is_feed_exist(user_id):
+        return
+
+    posts = post_crud.get_recent_posts_by_communities(db, [community_id], feed_cache.FEED_MAX_LEN)
+    feed_cache.remove_from_feed(user_id, [p.id for p in posts])
+    logger.debug("feed_trimmed", community_id=community_id, total_count=len(posts))
+
+
+def _build_feed(
+    db: Session,
+    user_id: int,
+    community_ids: List[int]
+):
+    posts = post_crud.get_recent_posts_by_communities(db, community_ids, feed_cache.FEED_MAX_LEN)
+    feed_cache.fill_feed(user_id, {p.id: _post_score(p) for p in posts})
+    logger.info("feed_built_from_db", target_user_id=user_id, total_count=len(posts))
+
+
+def _fill_community_posts(db: Session, community_ids: List[int]):
+    """Recent posts of huge communities are merged into feeds on read, a missing list is filled from the database."""
+    for community_id in community_ids:
+        posts = post_crud.get_recent_posts_by_communities(db, [community_id], feed_cache.FEED_MAX_LEN)
+        feed_cache.fill_community_posts(community_id, {p.id: _post_score(p) for p in posts})
+        logger.info("community_posts_built_from_db", community_id=community_id, total_count=len(posts))
+
+
+def get_user_feed(
+    db: Session,
+    user_id: int,
+    limit: int,
+    offset: int
+) -> RawJSONResponse:
+    community_ids = user_crud.get_user_subscribe_ids(db, user_id)
+    if community_ids is None:
+        logger.warning(
+            "user_feed_fetch_failed",
+            target_user_id=user_id,
+            reason="not_found"
+        )
+        raise HTTPException(
+            status_code=404,
+            detail="User not found"
+        )
+
+    try:
+        huge_ids = feed_cache.get_huge_communities(community_ids)
+        _fill_community_posts(db, feed_cache.get_missing_community_posts(huge_ids))
+
+        if not feed_cache.is_feed_exist(user_id):
+            _build_feed(db, user_id, [c_id for c_id in community_ids if c_id not in huge_ids])
+
+        post_ids = feed_cache.get_feed_ids(user_id, huge_ids, limit, offset)
+    except RedisError:
+        logger.warning("user_feed_fetched_from_db", target_user_id=user_id, reason="cache_unavailable")
+        posts = post_crud.get_recent_posts_by_communities(db, community_ids, offset + limit)[offset:]
+        return json_list_response(Post.from_orm(p).model_dump_json().encode() for p in posts)
+
+    posts = post_service.get_posts_json_by_ids(db, post_ids)
+
+    if len(posts) != len(post_ids):
+        feed_cache.remove_from_feed(user_id, [p_id for p_id in post_ids if p_id not in posts])
+
+    logger.info("user_feed_fetched", target_user_id=user_id, total_count=len(posts))
+    return json_list_response(posts.values())
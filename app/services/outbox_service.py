@@ -0,0 +1,129 @@
+from datetime import datetime
+import os
+
+from dotenv import load_dotenv
+from redis.exceptions import RedisError
+
+from app.db.database import Sessionmaker
+from app.crud import outbox as outbox_crud
+from app.cache import entity as entity_cache
+from app.cache.breaker import breaker, CacheUnavailable
+from app.cache.keys import post_cache_key, community_cache_key, user_cache_key
+from app.core import metrics
+from app.core.logging_config import logger
+
+load_dotenv()
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 500))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 10))
+# Failed events are retried after 1, 2, 4, ... seconds, at most OUTBOX_BACKOFF_MAX
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", 1))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", 300))
+
+CACHE_KEYS = {
+    "post": post_cache_key,
+    "com": community_cache_key,
+    "user": user_cache_key
+}
+
+
+
+def relay_batch() -> int:
+    """Invalidates the cache entries of one batch of outbox events. Returns the number of events."""
+    # While the breaker is open every delete would fail at once, the
+    # events wait for Redis without using up their attempts
+    if breaker.is_open():
+        metrics.incr("outbox_skipped_total")
+        return 0
+
+    db = Sessionmaker()
+    try:
+        events = outbox_crud.get_pending_events(db, OUTBOX_MAX_ATTEMPTS, OUTBOX_BATCH_SIZE)
+        if not events:
+            metrics.set_gauge("outbox_lag_seconds", 0)
+            db.commit()
+            return 0
+
+        event_ids = [event.id for event in events]
+        lag = (datetime.utcnow() - events[0].created_at).total_seconds()
+        # Edits carry the version they wrote, their entry is only deleted
+        # if the write-through did not already update it to that version
+        keys, versions = set(), {}
+        for event in events:
+            key = CACHE_KEYS[event.entity](event.entity_id)
+            if event.version is None:
+                keys.add(key)
+            else:
+                versions[key] = max(versions.get(key, 0), event.version)
+        versions = {key: version for key, version in versions.items() if key not in keys}
+
+        try:
+            entity_cache.delete_entities(list(keys))
+            kept = entity_cache.delete_older_entities(versions)
+            # Cascaded rows are found through the dependency sets, a user
+            # with 1e5 posts is still a single outbox row
+            cascaded = sum(
+                entity_cache.delete_tree(CACHE_KEYS[event.entity](event.entity_id))
+                for event in events if event.cascade
+            )
+        except CacheUnavailable:
+            db.rollback()
+            metrics.incr("outbox_skipped_total")
+            logger.warning("outbox_relay_skipped", events_count=len(events), reason="cache_unavailable")
+            return 0
+        except RedisError as e:
+            # Rows stay in the outbox and are picked up again after their backoff
+            outbox_crud.mark_failed(db, event_ids, str(e), OUTBOX_BACKOFF_BASE, OUTBOX_BACKOFF_MAX)
+            db.commit()
+            metrics.incr("outbox_failed_total", len(events))
+            logger.warning("outbox_relay_failed", events_count=len(events), reason=str(e))
+            for event in events:
+                if event.attempts + 1 >= OUTBOX_MAX_ATTEMPTS:
+                    logger.error("outbox_event_dead", entity=event.entity, entity_id=event.entity_id)
+            return 0
+
+        outbox_crud.delete_events(db, event_ids)
+        db.commit()
+    finally:
+        db.close()
+
+    metrics.incr("outbox_relayed_total", len(event_ids))
+    metrics.set_gauge("outbox_lag_seconds", lag)
+    metrics.incr("outbox_cascaded_total", cascaded)
+    metrics.incr("outbox_kept_total", kept)
+    logger.info(
+        "outbox_relayed",
+        events_count=len(event_ids),
+        keys_count=len(keys) + len(versions),
+        kept_count=kept,
+        cascaded_count=cascaded,
+        lag_seconds=lag
+    )
+    return len(event_ids)
+
+
+def requeue_dead_events() -> int:
+    """Retries the events which ran out of attempts, e.g. after a long Redis outage."""
+    db = Sessionmaker()
+    try:
+        requeued = outbox_crud.requeue_dead_events(db, OUTBOX_MAX_ATTEMPTS)
+        db.commit()
+    finally:
+        db.close()
+
+    metrics.incr("outbox_requeued_total", requeued)
+    logger.info("outbox_dead_events_requeued", events_count=requeued)
+    return requeued
+
+
+def collect_metrics():
+    db = Sessionmaker()
+    try:
+        counts = outbox_crud.count_events(db, OUTBOX_MAX_ATTEMPTS)
+        oldest = outbox_crud.get_oldest_pending_time(db, OUTBOX_MAX_ATTEMPTS)
+    finally:
+        db.close()
+
+    metrics.set_gauge("outbox_pending", counts["pending"])
+    metrics.set_gauge("outbox_dead", counts["dead"])
+    metrics.set_gauge("outbox_lag_seconds", (datetime.utcnow() - oldest).total_seconds() if oldest else 0)
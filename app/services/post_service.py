@@ -1,13 +1,26 @@
-from fastapi import HTTPException
+from fastapi import HTTPException, Response
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List, Optional
 from datetime import datetime
 
+import orjson
+
+from app.db.database import on_primary
 from app.schemas.post import *
 from app.schemas.user import User
+from app.schemas.bulk import BulkError, BULK_MAX_SIZE
 from app.crud import post as post_crud
+from app.crud import community as community_crud
+from app.crud import outbox as outbox_crud
+from app.services import feed_service, ranking_service, search_service, write_behind_service
 from app.cache.utils import *
 from app.cache.keys import post_cache_key
+from app.cache import entity as entity_cache
+from app.cache import dependencies
+from app.cache import access as access_cache
+from app.cache import hotkeys
+from app.core.etag import entity_response, is_not_modified, not_modified_response
 from app.core.logging_config import logger
 from app.core.log_context import set_user_context
 
@@ -26,17 +39,33 @@ def get_all_post(
     return [Post.from_orm(p) for p in posts]
 
 
-def get_post_by_id(
+def _record_read(post_id: int):
+    # Only reads of existing posts count, a miss must not create view events or keys
+    write_behind_service.record_view(post_id)
+    access_cache.record("post", post_id)
+
+
+def get_post_json(
     db: Session,
-    post_id: int      
-) -> Post:
+    post_id: int
+) -> bytes:
+    """Returns the post as JSON, cache hits are returned without parsing."""
     post_key = post_cache_key(post_id)
-    post = deserialize_post(get_cache(post_key))
-    if post:
+    hot_post = hotkeys.get(post_key)
+    if hot_post:
+        hotkeys.record(post_key)
+        _record_read(post_id)
+        return hot_post
+
+    cached_post, generation = entity_cache.read(post_key, Post)
+    if cached_post:
+        hotkeys.record(post_key, cached_post)
+        _record_read(post_id)
         logger.info("post_fetched_from_cache", post_id=post_id)
-        return post
+        return cached_post
 
-    post = post_crud.get_post_by_id(db, post_id)
+    with on_primary(db):
+        post = post_crud.get_post_by_id(db, post_id)
     if not post:
         logger.warning(
             "post_fetch_failed",
@@ -48,12 +77,96 @@ def get_post_by_id(
             detail="Post not found"
         )
 
-    set_cache(post_key, serialize_post(post), ttl=120)
+    post_model = Post.from_orm(post)
+    entity_cache.set_entity(post_key, post_model, generation, dependencies.post_parents(post_model))
     logger.debug("post_cached", post_id=post_id)
+    _record_read(post_id)
 
     logger.info("post_fetched_from_db", post_id=post_id)
-    return Post.from_orm(post)
+    return post_model.model_dump_json().encode()
+
+
+def _parse_validators(version: bytes, time_edited: bytes):
+    return int(version), datetime.fromisoformat(orjson.loads(time_edited))
+
 
+def get_post_response(
+    db: Session,
+    post_id: int,
+    if_none_match: Optional[str] = None,
+    if_modified_since: Optional[str] = None
+) -> Response:
+    """Returns the post with its ETag and Last-Modified, or 304.
+
+    A conditional request is first checked against the version and edit
+    time stored in the cache entry, so a match is answered without
+    reading the post.
+    """
+    if if_none_match is not None or if_modified_since is not None:
+        validators = entity_cache.read_fields(post_cache_key(post_id), ["version", "time_edited"])
+        if validators:
+            version, last_modified = _parse_validators(*validators)
+            if is_not_modified(if_none_match, if_modified_since, version, last_modified):
+                _record_read(post_id)
+                logger.info("post_not_modified", post_id=post_id)
+                return not_modified_response(version, last_modified)
+
+    body = get_post_json(db, post_id)
+    post = orjson.loads(body)
+    return entity_response(
+        body,
+        if_none_match,
+        if_modified_since,
+        post["version"],
+        datetime.fromisoformat(post["time_edited"])
+    )
+
+
+def get_post_by_id(
+    db: Session,
+    post_id: int
+) -> Post:
+    return deserialize_post(get_post_json(db, post_id))
+
+
+def get_posts_json_by_ids(
+    db: Session,
+    post_ids: List[int]
+) -> Dict[int, bytes]:
+    """Returns {post_id: JSON} in the order of post_ids, ids of deleted posts are skipped."""
+    keys = [post_cache_key(p_id) for p_id in post_ids]
+    posts, generations = {}, {}
+    for p_id, (cached, generation) in zip(post_ids, entity_cache.read_many(keys, Post)):
+        if cached:
+            posts[p_id] = cached
+        else:
+            generations[p_id] = generation
+
+    missed_ids = [p_id for p_id in post_ids if p_id not in posts]
+    if missed_ids:
+        with on_primary(db):
+            fetched = [Post.from_orm(p) for p in post_crud.get_posts_by_ids(db, missed_ids)]
+        entity_cache.set_many_entities(
+            {post_cache_key(p.id): p for p in fetched},
+            [generations[p.id] for p in fetched],
+            {post_cache_key(p.id): dependencies.post_parents(p) for p in fetched}
+        )
+        posts.update({p.id: p.model_dump_json().encode() for p in fetched})
+        logger.debug("posts_cached", total_count=len(fetched))
+
+    logger.info(
+        "posts_fetched_by_ids",
+        total_count=len(posts),
+        cache_hits=len(post_ids) - len(missed_ids)
+    )
+    return {p_id: posts[p_id] for p_id in post_ids if p_id in posts}
+
+
+def get_posts_by_ids(
+    db: Session,
+    post_ids: List[int]
+) -> List[Post]:
+    return [deserialize_post(p) for p in get_posts_json_by_ids(db, post_ids).values()]
 
 
 def create_post(
@@ -73,59 +186,142 @@ def create_post(
     post_data = post_crud.create_post(db, new_post)
     logger.info("post_created", post_id=post_data.id)
 
-    set_cache(post_cache_key(post_data.id), serialize_post(post_data), ttl=120)
+    # A new id has no generation yet
+    entity_cache.set_entity(post_cache_key(post_data.id), Post.from_orm(post_data), b"", dependencies.post_parents(post_data))
     logger.debug("post_cached", post_id=post_data.id)
 
+    feed_service.fan_out_post(db, post_data)
+    ranking_service.on_post_created(post_data)
+    search_service.index_post(post_data)
+
     return Post.from_orm(post_data)
 
 
-def update_post(
+def create_posts(
     db: Session,
-    post_id: int,
-    updates: PostUpdate,
+    posts: List[dict],
     current_user: User
-) -> Post:
+) -> PostBulkResult:
     set_user_context(current_user)
 
-    post = post_crud.get_post_by_id(db, post_id)
-    if not post:
-        logger.info(
-            "post_update_failed",
-            post_id=post_id,
-            reason="not_found"
+    if len(posts) > BULK_MAX_SIZE:
+        logger.warning(
+            "posts_bulk_create_failed",
+            total_count=len(posts),
+            reason="too_large"
         )
         raise HTTPException(
-            status_code=404, 
-            detail="Post not found"
+            status_code=413,
+            detail=f"Batch can contain at most {BULK_MAX_SIZE} posts"
         )
 
-    if current_user.id != post.owner_id and current_user.role != "admin":
+    errors = []
+    validated = []
+    for index, item in enumerate(posts):
+        try:
+            post = PostCreateInput.model_validate(item)
+        except ValidationError as e:
+            errors.append(BulkError.from_validation_error(index, e))
+            continue
+
+        validated.append((index, PostCreate(
+            title=post.title,
+            text=post.text,
+            community_id=post.community_id,
+            owner_id=current_user.id
+        )))
+
+    existing_ids = community_crud.get_existing_community_ids(db, list({p.community_id for _, p in validated}))
+    new_posts = []
+    for index, post in validated:
+        if post.community_id not in existing_ids:
+            errors.append(BulkError(index=index, detail="Community not found"))
+            continue
+        new_posts.append(post)
+
+    created = post_crud.create_posts(db, new_posts)
+    logger.info("posts_bulk_created", total_count=len(created), errors_count=len(errors))
+
+    entity_cache.set_many_entities(
+        {post_cache_key(p.id): Post.from_orm(p) for p in created},
+        [b""] * len(created),
+        {post_cache_key(p.id): dependencies.post_parents(p) for p in created}
+    )
+    logger.debug("posts_cached", total_count=len(created))
+
+    feed_service.fan_out_posts(db, created)
+    ranking_service.on_posts_created(created)
+    search_service.index_new_posts(created)
+
+    return PostBulkResult(
+        created=[Post.from_orm(p) for p in created],
+        errors=sorted(errors, key=lambda e: e.index)
+    )
+
+
+def update_post(
+    db: Session,
+    post_id: int,
+    updates: PostUpdate,
+    current_user: User,
+    version: Optional[int] = None
+) -> Post:
+    """version is the version the edit is based on, None applies it to any version."""
+    set_user_context(current_user)
+
+    values = updates.model_dump(exclude_none=True)
+    if values:
+        values.update(is_edited=True, time_edited=datetime.utcnow())
+    owner_id = None if current_user.role == "admin" else current_user.id
+
+    updated_post = post_crud.update_post(db, post_id, values, owner_id, version)
+    if updated_post is None:
+        state = post_crud.get_post_edit_state(db, post_id)
+        if state is None:
+            logger.info(
+                "post_update_failed",
+                post_id=post_id,
+                reason="not_found"
+            )
+            raise HTTPException(
+                status_code=404, 
+                detail="Post not found"
+            )
+
+        if owner_id is not None and state.owner_id != owner_id:
+            logger.warning(
+                "post_update_failed",
+                post_id=post_id,
+                reason="permission_denied"
+            )
+            raise HTTPException(
+                status_code=403,
+                detail="You do not have permission to edit other posts"
+            )
+
         logger.warning(
             "post_update_failed",
             post_id=post_id,
-            reason="permission_denied"
+            reason="version_mismatch"
         )
         raise HTTPException(
-            status_code=403,
-            detail="You do not have permission to edit other posts"
+            status_code=412,
+            detail="Post has been changed, reload it and try again"
         )
-    
-    if updates.title is not None:
-        post.title = updates.title
-        post.is_edited=True
-        post.time_edited=datetime.utcnow()
-
-    if updates.text is not None:
-        post.text = updates.text
-        post.is_edited=True
-        post.time_edited=datetime.utcnow()
-
-    updated_post = post_crud.update_post(db, post)
-    logger.info("post_updated", post_id=post_id)
+    logger.info("post_updated", post_id=post_id, version=updated_post.version)
 
-    set_cache(post_cache_key(post_id), serialize_post(updated_post), ttl=120)
+    # The returned row is the new state, it goes to the cache as it is
+    entity_cache.set_fields(
+        post_cache_key(post_id),
+        entity_cache.to_changed_fields(Post.from_orm(updated_post), values.keys()),
+        updated_post.version
+    )
     logger.info("post_cached", post_id=post_id)
 
+    if updates.title is not None or updates.text is not None:
+        ranking_service.on_post_edited(updated_post)
+        search_service.index_post(updated_post)
+
     return Post.from_orm(updated_post)
 
 
@@ -136,7 +332,7 @@ def delete_post(
 ) -> dict:
     set_user_context(current_user)
 
-    post = post_crud.get_post_by_id(db, post_id)
+    post = post_crud.get_post_for_delete(db, post_id)
     if not post:
         logger.info(
             "post_delete_failed",
@@ -159,12 +355,17 @@ def delete_post(
             detail="You do not have permission to delete other posts"
         )
 
+    outbox_crud.add_event(db, "post", post_id)
     post_crud.delete_post(db, post)
     logger.info("post_deleted", post_id=post_id)
 
-    delete_cache(post_cache_key(post_id))
+    entity_cache.delete_entity(post_cache_key(post_id))
     logger.info("post_cache_deleted", post_id=post_id)
 
+    feed_service.remove_post(post)
+    ranking_service.on_post_deleted(post)
+    search_service.remove_post(post_id)
+
     return {"message": f"Post with id {post_id} has been deleted"}
 
     
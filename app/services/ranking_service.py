@@ -0,0 +1,133 @@
+from sqlalchemy.orm import Session
+from redis.exceptions import RedisError
+from typing import Dict, List, Optional
+
+from app.crud import post as post_crud
+from app.db.models import Post as PostDB
+from app.core.responses import RawJSONResponse, json_list, encoded_json_response
+from app.core.compression import negotiate, compress
+from app.services import post_service
+from app.cache import ranking as ranking_cache
+from app.cache import hotkeys
+from app.cache.keys import ranked_response_cache_key
+from app.core.logging_config import logger
+
+
+
+def on_post_created(post: PostDB):
+    ranking_cache.add_post(post.community_id, post.id, post.time_edited.timestamp())
+
+
+def on_posts_created(posts: List[PostDB]):
+    ranking_cache.add_posts([(p.community_id, p.id, p.time_edited.timestamp()) for p in posts])
+
+
+def on_post_edited(post: PostDB):
+    ranking_cache.edit_post(post.community_id, post.id, post.time_edited.timestamp())
+
+
+def on_post_deleted(post: PostDB):
+    ranking_cache.remove_post(post.community_id, post.id)
+
+
+def on_comment_created(post: PostDB, count: int = 1):
+    ranking_cache.add_comment(post.community_id, post.id, count)
+
+
+def on_comments_created(posts: List[PostDB], counts: Dict[int, int]):
+    """counts maps the id of each post in posts to its number of new comments."""
+    ranking_cache.add_comments({(p.community_id, p.id): counts[p.id] for p in posts})
+
+
+def on_comment_deleted(post: PostDB):
+    ranking_cache.add_comment(post.community_id, post.id, count=-1)
+
+
+def _build_ranking(
+    db: Session,
+    sort: ranking_cache.SortMode,
+    community_id: Optional[int]
+):
+    rows = post_crud.get_posts_comment_counts(
+        db,
+        community_id,
+        order_by_comments=sort != "new",
+        limit=ranking_cache.RANK_MAX_LEN
+    )
+
+    if sort == "new":
+        scores = {row.id: row.time_edited.timestamp() for row in rows}
+    elif sort == "top":
+        scores = {row.id: row.comments_count for row in rows}
+    else:
+        scores = {
+            row.id: ranking_cache.HOT_POST_WEIGHT + ranking_cache.HOT_COMMENT_WEIGHT * row.comments_count
+            for row in rows
+        }
+
+    ranking_cache.fill_ranking(sort, community_id, scores)
+    logger.info("ranking_built_from_db", sort=sort, community_id=community_id, total_count=len(rows))
+
+
+def _get_ranked_posts_json(
+    db: Session,
+    sort: ranking_cache.SortMode,
+    community_id: Optional[int],
+    limit: int,
+    offset: int
+) -> bytes:
+    try:
+        if not ranking_cache.is_ranking_exist(sort, community_id):
+            _build_ranking(db, sort, community_id)
+
+        post_ids = ranking_cache.get_ranked_ids(sort, community_id, limit, offset)
+    except RedisError:
+        # "hot" falls back to "top", decay only exists in the cache
+        logger.warning("ranked_posts_fetched_from_db", sort=sort, community_id=community_id, reason="cache_unavailable")
+        rows = post_crud.get_posts_comment_counts(db, community_id, order_by_comments=sort != "new", limit=offset + limit)
+        return json_list(post_service.get_posts_json_by_ids(db, [row.id for row in rows[offset:]]).values())
+
+    logger.info("ranked_posts_fetched_from_cache", sort=sort, community_id=community_id, total_count=len(post_ids))
+
+    posts = post_service.get_posts_json_by_ids(db, post_ids)
+    if len(posts) != len(post_ids):
+        ranking_cache.remove_ranked_ids(sort, community_id, [p_id for p_id in post_ids if p_id not in posts])
+
+    return json_list(posts.values())
+
+
+def get_ranked_posts(
+    db: Session,
+    sort: ranking_cache.SortMode,
+    community_id: Optional[int],
+    limit: int,
+    offset: int,
+    accept_encoding: Optional[str] = None
+) -> RawJSONResponse:
+    """Pages of hot listings are kept as promoted hot-key copies which
+    are already compressed with the negotiated encoding, so a page is
+    assembled and compressed once per copy instead of once per request.
+    Other pages are left to the compression middleware.
+    """
+    encoding = negotiate(accept_encoding)
+    response_key = ranked_response_cache_key(sort, community_id, limit, offset, encoding)
+
+    payload = hotkeys.get(response_key)
+    if payload is not None:
+        hotkeys.record(response_key)
+        logger.info("ranked_posts_fetched_from_hot_copy", sort=sort, community_id=community_id)
+        return encoded_json_response(payload, encoding)
+
+    body = _get_ranked_posts_json(db, sort, community_id, limit, offset)
+    if not hotkeys.is_hot(response_key):
+        hotkeys.record(response_key)
+        return RawJSONResponse(body)
+
+    payload = body if encoding is None else compress(body, encoding)
+    hotkeys.record(response_key, payload)
+    return encoded_json_response(payload, encoding)
+
+
+def decay_rankings():
+    total = ranking_cache.decay_rankings()
+    logger.info("rankings_decayed", total_count=total)
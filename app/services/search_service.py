@@ -0,0 +1,188 @@
+from sqlalchemy.orm import Session
+from typing import Dict, List
+from redis.exceptions import RedisError
+import os
+
+from dotenv import load_dotenv
+
+from app.crud import comment as comment_crud
+from app.crud import community as community_crud
+from app.crud import post as post_crud
+from app.db.database import Sessionmaker
+from app.db.models import (
+    Post as PostDB,
+    Comment as CommentDB,
+    Community as CommunityDB
+)
+from app.schemas.search import SearchResult
+from app.schemas.comment import Comment
+from app.schemas.community import Community
+from app.services import post_service
+from app.cache import search as search_cache
+from app.cache.utils import acquire_lock, delete_cache
+from app.cache.keys import job_lock_cache_key
+from app.core.logging_config import logger
+
+load_dotenv()
+
+TITLE_WEIGHT = 2.0
+TEXT_WEIGHT = 1.0
+
+SEARCH_REBUILD_BATCH_SIZE = int(os.getenv("SEARCH_REBUILD_BATCH_SIZE", 1000))
+SEARCH_REBUILD_LOCK_TTL = int(os.getenv("SEARCH_REBUILD_LOCK_TTL", 600))
+
+
+
+def _post_scores(post: PostDB) -> Dict[str, float]:
+    return search_cache.weigh_fields([(post.title, TITLE_WEIGHT), (post.text, TEXT_WEIGHT)])
+
+
+def _comment_scores(comment: CommentDB) -> Dict[str, float]:
+    return search_cache.weigh_fields([(comment.text, TEXT_WEIGHT)])
+
+
+def index_post(post: PostDB):
+    search_cache.index_document("post", post.id, _post_scores(post))
+
+
+def index_new_posts(posts: List[PostDB]):
+    search_cache.add_documents("post", {p.id: _post_scores(p) for p in posts})
+
+
+def index_comment(comment: CommentDB):
+    search_cache.index_document("comment", comment.id, _comment_scores(comment))
+
+
+def index_new_comments(comments: List[CommentDB]):
+    search_cache.add_documents("comment", {c.id: _comment_scores(c) for c in comments})
+
+
+def _community_scores(community: CommunityDB) -> Dict[str, float]:
+    return search_cache.weigh_fields(
+        [(community.community_name, TITLE_WEIGHT), (community.description, TEXT_WEIGHT)],
+        with_prefixes=True
+    )
+
+
+def index_community(community: CommunityDB):
+    search_cache.index_document("com", community.id, _community_scores(community))
+
+
+def remove_post(post_id: int):
+    search_cache.remove_document("post", post_id)
+
+
+def remove_comment(comment_id: int):
+    search_cache.remove_document("comment", comment_id)
+
+
+def remove_community(community_id: int):
+    search_cache.remove_document("com", community_id)
+
+
+# kind: (rows loader, scores of a row)
+REBUILDERS = {
+    "post": (post_crud.get_post_texts, _post_scores),
+    "comment": (comment_crud.get_comment_texts, _comment_scores),
+    "com": (community_crud.get_community_texts, _community_scores)
+}
+
+
+def _build_index(db: Session, kind: search_cache.DocumentKind, batch_size: int = SEARCH_REBUILD_BATCH_SIZE) -> bool:
+    # Several processes check for missing indexes, only one builds each
+    lock_key = job_lock_cache_key(f"search:{kind}")
+    if not acquire_lock(lock_key, SEARCH_REBUILD_LOCK_TTL):
+        return False
+
+    load, scores = REBUILDERS[kind]
+    # Searches use what is indexed so far while the rebuild runs
+    search_cache.start_index(kind)
+    batch = {}
+    total = 0
+    try:
+        for row in load(db, batch_size):
+            batch[row.id] = scores(row)
+            if len(batch) >= batch_size:
+                search_cache.add_documents(kind, batch)
+                total += len(batch)
+                batch = {}
+
+        if batch:
+            search_cache.add_documents(kind, batch)
+            total += len(batch)
+    except Exception:
+        search_cache.drop_index_count(kind)
+        raise
+    finally:
+        delete_cache(lock_key)
+
+    logger.info("search_index_built", kind=kind, total_count=total)
+    return True
+
+
+def build_missing_indexes() -> int:
+    """Builds the indexes which are not in Redis, e.g. on the first start
+    or after Redis lost them. Returns the number of indexes built.
+    """
+    missing = search_cache.get_missing_indexes(list(REBUILDERS))
+    if not missing:
+        return 0
+
+    db = Sessionmaker(info={"read_only": True})
+    try:
+        return sum(_build_index(db, kind) for kind in missing)
+    finally:
+        db.close()
+
+
+def _ordered(items: list, ids: list) -> list:
+    by_id = {item.id: item for item in items}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def _drop_missing(kind: search_cache.DocumentKind, ids: list, found: list):
+    # Documents deleted by a cascade are removed from the index lazily
+    found_ids = {item.id for item in found}
+    for missing_id in ids:
+        if missing_id not in found_ids:
+            search_cache.remove_document(kind, missing_id)
+
+
+def search(
+    db: Session,
+    query: str,
+    limit: int
+) -> SearchResult:
+    tokens = search_cache.tokenize(query)
+
+    # Indexes are built by the search worker, until then a kind has no results
+    try:
+        post_ids = search_cache.search("post", tokens, limit)
+        comment_ids = search_cache.search("comment", tokens, limit)
+        community_ids = search_cache.search("com", tokens, limit)
+    except RedisError:
+        # The index only lives in Redis, there is nothing to fall back to
+        logger.warning("search_failed", reason="cache_unavailable")
+        return SearchResult(posts=[], comments=[], communities=[])
+
+    posts = post_service.get_posts_by_ids(db, post_ids)
+    comments = _ordered(comment_crud.get_comments_by_ids(db, comment_ids), comment_ids)
+    communities = _ordered(community_crud.get_communities_by_ids(db, community_ids), community_ids)
+
+    _drop_missing("post", post_ids, posts)
+    _drop_missing("comment", comment_ids, comments)
+    _drop_missing("com", community_ids, communities)
+
+    logger.info(
+        "search_completed",
+        tokens_count=len(tokens),
+        posts_count=len(posts),
+        comments_count=len(comments),
+        communities_count=len(communities)
+    )
+
+    return SearchResult(
+        posts=posts,
+        comments=[Comment.from_orm(c) for c in comments],
+        communities=[Community.from_orm(c) for c in communities]
+    )
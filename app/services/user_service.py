@@ -1,12 +1,17 @@
 from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.crud import user as user_crud
+from app.crud import outbox as outbox_crud
 from app.schemas.user import *
 from app.schemas.community import Community
 from app.schemas.post import Post
-from app.core.security import hash_password
+from app.schemas.bulk import BulkError, USER_BULK_MAX_SIZE
+from app.cache import suggest as suggest_cache
+from app.core.security import hash_password, hash_passwords
 from app.core.logging_config import logger
 from app.core.log_context import set_user_context 
 
@@ -54,7 +59,8 @@ def get_user_subscribes(
     limit: int,
     offset: int
 ) -> List[Community]:
-    if not user_crud.get_user_by_id(db, user_id):
+    subscribes = user_crud.get_user_subsribes(db, limit, offset, user_id)
+    if subscribes is None:
         logger.warning(
             "user_subscribes_fetch_faild",
             target_user_id=user_id,
@@ -65,7 +71,6 @@ def get_user_subscribes(
             detail="User not found"
         )
 
-    subscribes = user_crud.get_user_subsribes(db, limit, offset, user_id)
     logger.info("user_subscribes_fetched_from_db", target_user_id=user_id, total_count=len(subscribes))
 
     return [Community.from_orm(c) for c in subscribes]
@@ -77,7 +82,8 @@ def get_user_communities(
     limit: int,
     offset: int
 ) -> List[Community]:
-    if not user_crud.get_user_by_id(db, user_id):
+    communites = user_crud.get_user_communities(db, user_id, limit, offset)
+    if communites is None:
         logger.warning(
             "user_communities_fetch_faild",
             target_user_id=user_id,
@@ -87,8 +93,7 @@ def get_user_communities(
             status_code=404,
             detail="User not found"
         )
-    
-    communites = user_crud.get_user_communities(db, user_id, limit, offset)
+
     logger.info("user_communities_fetched", target_user_id=user_id, total_count=len(communites))
 
     return [Community.from_orm(c) for c in communites]
@@ -101,7 +106,8 @@ def get_user_pots(
     limit: int,
     offset: int
 ) -> List[Post]:
-    if not user_crud.get_user_by_id(db, user_id):
+    posts = user_crud.get_user_posts(db, user_id, limit, offset)
+    if posts is None:
         logger.warning(
             "user_posts_fetch_faild",
             target_user_id=user_id,
@@ -112,7 +118,6 @@ def get_user_pots(
             detail="User not found"
         )
 
-    posts = user_crud.get_user_posts(db, user_id, limit, offset)
     logger.info("user_posts_fetched_from_db", target_user_id = user_id, total_count=len(posts))
 
     return [Post.from_orm(p) for p in posts]
@@ -131,17 +136,6 @@ def create_user(
 ) -> User:
     set_user_context(current_user)
 
-    if user_crud.is_user_exist(db, user.username):
-        logger.warning(
-            "user_create_failed",
-            target_user_username=user.username,
-            reason="already_exist"
-        )
-        raise HTTPException(
-            status_code=409,
-            detail=f"User {user.username} has already existed"
-        )
-    
     if user.role == "admin" and current_user.role != "admin":
         logger.warning(
             "user_create_failed",
@@ -153,9 +147,24 @@ def create_user(
             detail="You do not have permissions to create admin user"
         )
     
-    user_data = user.copy(update={"password": hash_password(user.password)})
+    # A taken name is found before the password is hashed, the unique
+    # constraint still decides between concurrent creates
+    new_user = None
+    if not user_crud.is_user_exist(db, user.username):
+        user_data = user.copy(update={"password": hash_password(user.password)})
+        new_user = user_crud.create_user(db, user_data)
+
+    if new_user is None:
+        logger.warning(
+            "user_create_failed",
+            target_user_username=user.username,
+            reason="already_exist"
+        )
+        raise HTTPException(
+            status_code=409,
+            detail=f"User {user.username} has already existed"
+        )
 
-    new_user = user_crud.create_user(db, user_data)
     logger.info(
         "user_created",
         target_user_id=new_user.id
@@ -164,12 +173,78 @@ def create_user(
     return User.from_orm(new_user)
 
 
+def create_users(
+        db: Session,
+        users: List[dict],
+        current_user: User
+) -> UserBulkResult:
+    set_user_context(current_user)
+
+    if current_user.role != "admin":
+        logger.warning(
+            "users_bulk_create_failed",
+            reason="permission_denied"
+        )
+        raise HTTPException(
+            status_code=403,
+            detail="Only admins can import users"
+        )
+
+    if len(users) > USER_BULK_MAX_SIZE:
+        logger.warning(
+            "users_bulk_create_failed",
+            total_count=len(users),
+            reason="too_large"
+        )
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch can contain at most {USER_BULK_MAX_SIZE} users"
+        )
+
+    errors = []
+    indexes = {}
+    new_users = []
+    for index, item in enumerate(users):
+        try:
+            user = UserCreate.model_validate(item)
+        except ValidationError as e:
+            errors.append(BulkError.from_validation_error(index, e))
+            continue
+
+        if user.username in indexes:
+            errors.append(BulkError(index=index, detail=f"User {user.username} is duplicated in the batch"))
+            continue
+
+        indexes[user.username] = index
+        new_users.append(user)
+
+    hashed = hash_passwords([u.password for u in new_users])
+    new_users = [u.copy(update={"password": h}) for u, h in zip(new_users, hashed)]
+
+    created = user_crud.create_users(db, new_users)
+
+    created_usernames = {u.username for u in created}
+    for username, index in indexes.items():
+        if username not in created_usernames:
+            errors.append(BulkError(index=index, detail=f"User {username} has already existed"))
+
+    logger.info("users_bulk_created", total_count=len(created), errors_count=len(errors))
+
+    created = sorted(created, key=lambda u: indexes[u.username])
+    return UserBulkResult(
+        created=[User.from_orm(u) for u in created],
+        errors=sorted(errors, key=lambda e: e.index)
+    )
+
+
 def update_user(
         db: Session,
         user_id: int,
         updates: UserUpdate,
-        current_user: User
+        current_user: User,
+        version: Optional[int] = None
 ) -> User:
+    """version is the version the edit is based on, None applies it to any version."""
     set_user_context(current_user)
 
     if user_id != current_user.id and current_user.role != "admin":
@@ -182,52 +257,58 @@ def update_user(
             status_code=403,
             detail="You do not have permissions to update other users"
         )
-    
-    user = user_crud.get_user_by_id(db, user_id)
-    if not user:
+
+    if updates.role == "admin" and current_user.role != "admin":
         logger.warning(
-            "user_update_failed",
+            "update_user_failed",
             target_user_id=user_id,
-            reason="not_found"
+            reason="permission_denied"
         )
         raise HTTPException(
-            status_code=404,
-            detail=f"User with id {user_id} not found"
+            status_code=403,
+            detail="You do not have permissions to set your user as admin"
         )
 
-    if updates.username is not None:
-        if user_crud.is_user_exist(db, updates.username):
-            logger.warning(
-                "user_update_failed",
-                target_user_name=updates.username,
-                reason="already_exist"
-            )
-            raise HTTPException(
-                status_code=403,
-                detail=f"User {updates.username} has already existed"
-            )
-        user.username = updates.username
-
+    values = updates.model_dump(exclude_none=True, exclude={"password"})
     if updates.password is not None:
-        user.hashed_password = hash_password(updates.password)
+        values["hashed_password"] = hash_password(updates.password)
 
-    if updates.avatar_url is not None:
-        user.avatar_url = updates.avatar_url
+    # Access was checked above, a missing row means 404 or 412
+    try:
+        user = user_crud.update_user(db, user_id, values, version)
+    except IntegrityError:
+        logger.warning(
+            "user_update_failed",
+            target_user_name=updates.username,
+            reason="already_exist"
+        )
+        raise HTTPException(
+            status_code=403,
+            detail=f"User {updates.username} has already existed"
+        )
 
-    if updates.role is not None:
-        if updates.role == "admin" and current_user.role != "admin":
+    if user is None:
+        if version is None or user_crud.get_user_edit_state(db, user_id) is None:
             logger.warning(
-                "update_user_failed",
+                "user_update_failed",
                 target_user_id=user_id,
-                reason="permission_denied"
+                reason="not_found"
             )
             raise HTTPException(
-                status_code=403,
-                detail="You do not have permissions to set your user as admin"
+                status_code=404,
+                detail=f"User with id {user_id} not found"
             )
-        user.role = updates.role
 
-    user_crud.update_user(db, user)
+        logger.warning(
+            "user_update_failed",
+            target_user_id=user_id,
+            reason="version_mismatch"
+        )
+        raise HTTPException(
+            status_code=412,
+            detail="User has been changed, reload it and try again"
+        )
+
     logger.info("user_updated", target_user_id=user_id)
     return User.from_orm(user)
 
@@ -238,7 +319,7 @@ def delete_user(
 ) -> dict:
     set_user_context(current_user)
 
-    user = user_crud.get_user_by_id(db, user_id)
+    user = user_crud.get_user_for_delete(db, user_id)
     if not user:
         logger.warning(
             "user_delete_failed",
@@ -262,9 +343,15 @@ def delete_user(
                 detail="You do not have permissions to delete other users"
             )
         
-    user_crud.delete_user(db, user)
+    community_ids = user_crud.get_created_community_ids(db, user_id)
+
+    outbox_crud.add_event(db, "user", user_id, cascade=True)
+    user_crud.delete_user(db, user_id)
     logger.info(
         "user_deleted",
         target_user_id=user_id
     )
+
+    # Names of the communities the delete cascaded to
+    suggest_cache.remove_names(community_ids)
     return {"message": f"User {user.username} has been deleted"}
\ No newline at end of file
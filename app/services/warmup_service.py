@@ -0,0 +1,68 @@
+from typing import List
+import os
+
+from dotenv import load_dotenv
+
+from app.db.database import Sessionmaker
+from app.crud import post as post_crud
+from app.crud import community as community_crud
+from app.schemas.post import Post
+from app.schemas.community import Community
+from app.cache import access as access_cache
+from app.cache import entity as entity_cache
+from app.cache import dependencies
+from app.cache.keys import post_cache_key, community_cache_key
+from app.core import metrics
+from app.core.logging_config import logger
+
+load_dotenv()
+
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", 5000))
+WARMUP_BATCH_SIZE = int(os.getenv("WARMUP_BATCH_SIZE", 200))
+
+# kind: (cache key, schema, bulk loader, parent keys)
+LOADERS = {
+    "com": (community_cache_key, Community, community_crud.get_communities_by_ids, dependencies.community_parents),
+    "post": (post_cache_key, Post, post_crud.get_posts_by_ids, dependencies.post_parents)
+}
+
+
+
+def get_warmup_ids(kind: access_cache.AccessKind) -> List[int]:
+    ids = access_cache.get_top(kind, WARMUP_TOP_N)
+    metrics.set_gauge(f"warmup_{kind}_total", len(ids))
+    return ids
+
+
+def warm_up_batch(kind: access_cache.AccessKind, ids: List[int]) -> int:
+    """Caches the entities of ids which are not cached yet. Returns the number loaded from the database."""
+    cache_key, schema, load, parents = LOADERS[kind]
+
+    # Only the id field is read, entries which are already cached are skipped
+    entries = entity_cache.read_many([cache_key(i) for i in ids], schema, fields=["id"])
+    missed = {i: generation for i, (cached, generation) in zip(ids, entries) if cached is None}
+
+    loaded = 0
+    if missed:
+        # From the primary, like every other cache fill
+        db = Sessionmaker()
+        try:
+            rows = load(db, list(missed))
+            models = {cache_key(row.id): schema.model_validate(row) for row in rows}
+        finally:
+            db.close()
+
+        entity_cache.set_many_entities(
+            models,
+            [missed[model.id] for model in models.values()],
+            {key: parents(model) for key, model in models.items()}
+        )
+        loaded = len(models)
+
+    metrics.incr("warmup_loaded_total", loaded)
+    return loaded
+
+
+def decay_access_counts():
+    access_cache.decay()
+    logger.info("access_counts_decayed")
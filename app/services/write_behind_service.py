@@ -0,0 +1,118 @@
+from collections import Counter
+from typing import Dict, Optional, Tuple
+from uuid import uuid4
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy.exc import IntegrityError
+
+from app.db.database import Sessionmaker
+from app.crud import community as community_crud
+from app.crud import post as post_crud
+from app.cache import write_behind as write_behind_cache
+from app.cache import entity as entity_cache
+from app.cache.keys import post_cache_key
+from app.cache.breaker import fail_open
+from app.core.logging_config import logger
+
+load_dotenv()
+
+# Post views always go through the stream, follower toggles only when enabled
+WRITE_BEHIND_FOLLOWERS = os.getenv("WRITE_BEHIND_FOLLOWERS", "false").lower() == "true"
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 500))
+WRITE_BEHIND_BLOCK_MS = int(os.getenv("WRITE_BEHIND_BLOCK_MS", 1000))
+
+
+
+@fail_open()
+def record_view(post_id: int):
+    # Views are best effort, they are dropped while Redis is unavailable
+    write_behind_cache.record_event({"type": "view", "post_id": post_id})
+    # Read-your-writes: the cached post shows the view before the flush
+    entity_cache.incr_counter(post_cache_key(post_id), "view_count")
+
+
+def record_follow(
+    community_id: int,
+    user_id: int,
+    follow: bool,
+    idempotency_key: Optional[str]
+) -> bool:
+    """Returns False if the toggle was already recorded under the same idempotency key."""
+    if not write_behind_cache.claim_idempotency_key(idempotency_key or str(uuid4())):
+        logger.info("follow_event_duplicated", community_id=community_id, idempotency_key=idempotency_key)
+        return False
+
+    write_behind_cache.set_pending_follow(community_id, user_id, follow)
+    write_behind_cache.record_event({
+        "type": "follow",
+        "community_id": community_id,
+        "user_id": user_id,
+        "follow": int(follow)
+    })
+    logger.info("follow_event_recorded", community_id=community_id, follow=follow)
+    return True
+
+
+def is_follow_recorded(idempotency_key: Optional[str]) -> bool:
+    """True if a toggle was already recorded under this idempotency key, i.e. the request is a retry."""
+    return idempotency_key is not None and write_behind_cache.is_idempotency_key_claimed(idempotency_key)
+
+
+def get_pending_follow(community_id: int, user_id: int) -> Optional[bool]:
+    """Follower state which is recorded but not flushed yet, None if there is none."""
+    return write_behind_cache.get_pending_follow(community_id, user_id)
+
+
+def _apply(follows: Dict[Tuple[int, int], bool], views: Dict[int, int]):
+    db = Sessionmaker()
+    try:
+        community_crud.follow_many(db, [pair for pair, follow in follows.items() if follow])
+        community_crud.unfollow_many(db, [pair for pair, follow in follows.items() if not follow])
+        post_crud.add_views(db, views)
+        db.commit()
+    except IntegrityError:
+        # A community or user was deleted meanwhile, apply the rest one by one
+        db.rollback()
+        for pair, follow in follows.items():
+            try:
+                if follow:
+                    community_crud.follow_many(db, [pair])
+                else:
+                    community_crud.unfollow_many(db, [pair])
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                logger.warning("follow_event_dropped", community_id=pair[0], reason="integrity_error")
+        post_crud.add_views(db, views)
+        db.commit()
+    finally:
+        db.close()
+
+
+def flush_batch() -> int:
+    """Applies one batch of recorded events to the database. Returns the number of events."""
+    events = write_behind_cache.read_events(WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_BLOCK_MS)
+    if not events:
+        return 0
+
+    # Events are read in stream order, so the last toggle of a pair wins
+    follows: Dict[Tuple[int, int], bool] = {}
+    views = Counter()
+    for _, event in events:
+        if event["type"] == "follow":
+            follows[(int(event["community_id"]), int(event["user_id"]))] = event["follow"] == "1"
+        elif event["type"] == "view":
+            views[int(event["post_id"])] += 1
+
+    _apply(follows, views)
+    write_behind_cache.clear_pending_follows(follows)
+    write_behind_cache.ack_events([event_id for event_id, _ in events])
+
+    logger.info(
+        "write_behind_flushed",
+        total_count=len(events),
+        follows_count=len(follows),
+        viewed_posts_count=len(views)
+    )
+    return len(events)
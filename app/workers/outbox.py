@@ -0,0 +1,24 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+
+from app.services import outbox_service
+from app.core.logging_config import logger
+
+load_dotenv()
+
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1))
+
+
+async def run_outbox_relay():
+    while True:
+        try:
+            relayed = await asyncio.to_thread(outbox_service.relay_batch)
+        except Exception:
+            logger.exception("outbox_relay_failed")
+            relayed = 0
+
+        # A full batch means there is a backlog, the next one is relayed right away
+        if relayed < outbox_service.OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(OUTBOX_POLL_INTERVAL)
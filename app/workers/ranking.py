@@ -0,0 +1,28 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+
+from app.services import ranking_service, warmup_service
+from app.cache.utils import acquire_lock
+from app.cache.keys import job_lock_cache_key
+from app.core.logging_config import logger
+
+load_dotenv()
+
+RANK_DECAY_INTERVAL = int(os.getenv("RANK_DECAY_INTERVAL", 3600))
+
+
+async def run_rank_decay():
+    while True:
+        await asyncio.sleep(RANK_DECAY_INTERVAL)
+
+        # Several app processes run this loop, only one of them decays per interval
+        if not acquire_lock(job_lock_cache_key("rank_decay"), RANK_DECAY_INTERVAL - 1):
+            continue
+
+        try:
+            await asyncio.to_thread(ranking_service.decay_rankings)
+            await asyncio.to_thread(warmup_service.decay_access_counts)
+        except Exception:
+            logger.exception("rankings_decay_failed")
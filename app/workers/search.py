@@ -0,0 +1,23 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+
+from app.services import search_service
+from app.core.logging_config import logger
+
+load_dotenv()
+
+SEARCH_INDEX_CHECK_INTERVAL = int(os.getenv("SEARCH_INDEX_CHECK_INTERVAL", 60))
+
+
+async def run_search_index_build():
+    # The index only lives in Redis: it is built on startup, and again
+    # whenever Redis lost it, instead of inside a search request
+    while True:
+        try:
+            await asyncio.to_thread(search_service.build_missing_indexes)
+        except Exception:
+            logger.exception("search_index_build_failed")
+
+        await asyncio.sleep(SEARCH_INDEX_CHECK_INTERVAL)
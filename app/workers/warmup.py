@@ -0,0 +1,46 @@
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+
+from app.services import warmup_service
+from app.cache.utils import acquire_lock
+from app.cache.keys import job_lock_cache_key
+from app.core import metrics
+from app.core.logging_config import logger
+
+load_dotenv()
+
+# Upper bound of entities loaded per second, so the warm-up leaves
+# most of the database to live traffic
+WARMUP_RATE = int(os.getenv("WARMUP_RATE", 1000))
+WARMUP_LOCK_TTL = int(os.getenv("WARMUP_LOCK_TTL", 600))
+
+
+async def run_cache_warmup():
+    started = time.monotonic()
+    loaded = 0
+    try:
+        # After a deploy every process starts at once, only one of them warms the cache
+        if not await asyncio.to_thread(acquire_lock, job_lock_cache_key("warmup"), WARMUP_LOCK_TTL):
+            return
+
+        # Communities first, they are fewer and every post page needs them
+        for kind in ("com", "post"):
+            ids = await asyncio.to_thread(warmup_service.get_warmup_ids, kind)
+            for start in range(0, len(ids), warmup_service.WARMUP_BATCH_SIZE):
+                batch = ids[start:start + warmup_service.WARMUP_BATCH_SIZE]
+                batch_started = time.monotonic()
+
+                loaded += await asyncio.to_thread(warmup_service.warm_up_batch, kind, batch)
+                metrics.set_gauge(f"warmup_{kind}_done", start + len(batch))
+
+                await asyncio.sleep(max(0, len(batch) / WARMUP_RATE - (time.monotonic() - batch_started)))
+    except Exception:
+        logger.exception("cache_warmup_failed")
+        return
+
+    elapsed = time.monotonic() - started
+    metrics.set_gauge("warmup_seconds", elapsed)
+    logger.info("cache_warmed_up", loaded_count=loaded, elapsed_seconds=round(elapsed, 2))
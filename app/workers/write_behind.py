@@ -0,0 +1,20 @@
+import asyncio
+
+from app.services import write_behind_service
+from app.cache import write_behind as write_behind_cache
+from app.core.logging_config import logger
+
+
+RETRY_DELAY = 5
+
+
+async def run_write_behind_flush():
+    await asyncio.to_thread(write_behind_cache.ensure_group)
+
+    while True:
+        try:
+            # Blocks on the stream for up to WRITE_BEHIND_BLOCK_MS when it is empty
+            await asyncio.to_thread(write_behind_service.flush_batch)
+        except Exception:
+            logger.exception("write_behind_flush_failed")
+            await asyncio.sleep(RETRY_DELAY)
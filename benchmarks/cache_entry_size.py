@@ -0,0 +1,71 @@
+"""Memory per cached post: the hash entry against a JSON and a msgpack string.
+
+    python -m benchmarks.cache_entry_size [--count 1000]
+
+msgpack is not a dependency of the app, its row is left out when it is
+not installed.
+"""
+import argparse
+from datetime import datetime
+
+from benchmarks import _setup  # noqa: F401
+
+import orjson
+
+from app.cache import entity as entity_cache
+from app.cache.redis_client import redis_binary_client
+from app.schemas.post import Post
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def _post(post_id: int) -> Post:
+    return Post(
+        id=post_id,
+        title=f"Post number {post_id}",
+        text="Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4,
+        community_id=post_id % 100 + 1,
+        owner_id=post_id % 1000 + 1,
+        time_edited=datetime(2024, 1, 1),
+        is_edited=False,
+        version=1
+    )
+
+
+def _memory(pattern: str) -> int:
+    return sum(redis_binary_client.memory_usage(key) or 0 for key in redis_binary_client.scan_iter(pattern))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=1000)
+    args = parser.parse_args()
+
+    posts = [_post(i) for i in range(1, args.count + 1)]
+    redis_binary_client.flushdb()
+
+    entity_cache.set_many_entities({f"bench:hash:{p.id}": p for p in posts}, [b""] * len(posts))
+    encodings = {"hash of JSON fragments": "bench:hash:*"}
+
+    pipe = redis_binary_client.pipeline(transaction=False)
+    for p in posts:
+        pipe.set(f"bench:json:{p.id}", orjson.dumps(p.model_dump(mode="json")))
+    encodings["JSON string"] = "bench:json:*"
+
+    if msgpack is not None:
+        for p in posts:
+            pipe.set(f"bench:msgpack:{p.id}", msgpack.packb(p.model_dump(mode="json")))
+        encodings["msgpack string"] = "bench:msgpack:*"
+    pipe.execute()
+
+    for name, pattern in encodings.items():
+        print(f"{name:<40} {_memory(pattern) / args.count:8.1f} bytes per entry")
+
+    redis_binary_client.flushdb()
+
+
+if __name__ == "__main__":
+    main()
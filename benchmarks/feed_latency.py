@@ -0,0 +1,88 @@
+"""Feed read and post write latency against the follower count of a community.
+
+    python -m benchmarks.feed_latency [--followers 100 1000 10000 20000] [--repeat 200]
+
+Communities above FEED_FANOUT_LIMIT followers are not fanned out on
+write, their posts are merged into the feed on read.
+"""
+import argparse
+
+from benchmarks._setup import timings, report
+
+from sqlalchemy import insert, text
+
+from app.cache import feed as feed_cache
+from app.cache.redis_client import redis_client
+from app.crud import community as community_crud
+from app.crud import post as post_crud
+from app.db import create_tables
+from app.db.database import Base, Sessionmaker, engine
+from app.db.models import User as UserDB
+from app.schemas.community import CommunityCreate
+from app.schemas.post import PostCreate
+from app.services import feed_service
+
+POSTS = 200
+
+
+def _reset():
+    tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    with engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+    redis_client.flushdb()
+
+
+def _community(db, followers: int) -> int:
+    user_ids = db.scalars(
+        insert(UserDB).returning(UserDB.id),
+        [{"username": f"user{i}", "hashed_password": "", "role": "user"} for i in range(followers)]
+    ).all()
+    community_id = community_crud.create_community(
+        db,
+        CommunityCreate(community_name="bench", description="", owner_id=user_ids[0])
+    ).id
+    community_crud.follow_many(db, [(community_id, u_id) for u_id in user_ids])
+    db.commit()
+    return community_id
+
+
+def _post(db, community_id: int, i: int):
+    return post_crud.create_posts(db, [PostCreate(title=f"post {i}", text="", community_id=community_id, owner_id=1)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--followers", type=int, nargs="+", default=[100, 1000, 10000, 20000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    create_tables()
+    print(f"FEED_FANOUT_LIMIT {feed_cache.FEED_FANOUT_LIMIT}")
+
+    for followers in args.followers:
+        _reset()
+        db = Sessionmaker()
+        try:
+            community_id = _community(db, followers)
+            # The reader's feed is built before the posts, so they are fanned out to it
+            feed_service.get_user_feed(db, 1, 20, 0)
+            for i in range(POSTS):
+                feed_service.fan_out_posts(db, _post(db, community_id, i))
+
+            posts = iter(range(POSTS, POSTS + args.repeat))
+            report(
+                f"{followers} followers: create post + fan-out",
+                timings(lambda: feed_service.fan_out_posts(db, _post(db, community_id, next(posts))), args.repeat)
+            )
+            report(
+                f"{followers} followers: read feed",
+                timings(lambda: feed_service.get_user_feed(db, 1, 20, 0), args.repeat)
+            )
+        finally:
+            db.close()
+
+    _reset()
+
+
+if __name__ == "__main__":
+    main()
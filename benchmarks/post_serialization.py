@@ -0,0 +1,102 @@
+"""CPU time per GET /posts/{id} on a cache hit and a cache miss.
+
+    python -m benchmarks.post_serialization [--repeat 2000]
+
+Each request is post_service.get_post_response, the handler of the
+route, so the CPU time covers the cache read, the database read on a
+miss and the rendering of the response. For comparison,
+"pydantic round trip" is the work the cache hit path did before cached
+JSON was returned as it is: parse the entry into the model, validate
+it against the response model and encode it again.
+"""
+import argparse
+import time
+
+from benchmarks._setup import report
+
+from sqlalchemy import text
+
+from app.cache import entity as entity_cache
+from app.cache import hotkeys
+from app.cache.keys import post_cache_key
+from app.cache.redis_client import redis_client
+from app.crud import community as community_crud
+from app.crud import post as post_crud
+from app.db import create_tables
+from app.db.database import Base, Sessionmaker, engine
+from app.db.models import User as UserDB
+from app.schemas.community import CommunityCreate
+from app.schemas.post import Post, PostCreate
+from app.services import post_service
+
+
+def cpu_timings(run, repeat: int, before=None) -> list:
+    """CPU milliseconds of repeat calls of run, before runs untimed ahead of each call."""
+    result = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.process_time()
+        run()
+        result.append((time.process_time() - start) * 1000)
+    return result
+
+
+def _reset():
+    tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    with engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+    redis_client.flushdb()
+
+
+def _create_post() -> int:
+    db = Sessionmaker()
+    try:
+        db.add(UserDB(username="bench", hashed_password="", role="user"))
+        db.commit()
+        community_id = community_crud.create_community(
+            db,
+            CommunityCreate(community_name="bench", description="", owner_id=1)
+        ).id
+        return post_crud.create_post(
+            db,
+            PostCreate(title="Benchmark post", text="Lorem ipsum " * 40, community_id=community_id, owner_id=1)
+        ).id
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    create_tables()
+    _reset()
+    post_id = _create_post()
+    key = post_cache_key(post_id)
+    db = Sessionmaker(info={"read_only": True})
+
+    def get():
+        assert post_service.get_post_response(db, post_id).status_code == 200
+
+    def evict():
+        hotkeys.invalidate(key)
+        entity_cache.delete_entity(key)
+
+    get()
+    report("GET /posts/{id} cache hit (CPU)", cpu_timings(get, args.repeat, lambda: hotkeys.invalidate(key)))
+    report("GET /posts/{id} cache miss (CPU)", cpu_timings(get, args.repeat // 10, evict))
+
+    cached = entity_cache.read(key, Post)[0]
+    report(
+        "pydantic round trip of the entry (CPU)",
+        cpu_timings(lambda: Post.model_validate(Post.model_validate_json(cached)).model_dump_json(), args.repeat)
+    )
+
+    db.close()
+    _reset()
+
+
+if __name__ == "__main__":
+    main()
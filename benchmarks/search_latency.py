@@ -0,0 +1,83 @@
+"""Search index build time and search latency against the number of posts.
+
+    python -m benchmarks.search_latency [--posts 1000 10000 100000] [--repeat 200]
+"""
+import argparse
+import random
+import time
+
+from benchmarks._setup import timings, report
+
+from sqlalchemy import insert, text
+
+from app.cache.redis_client import redis_client
+from app.crud import community as community_crud
+from app.db import create_tables
+from app.db.database import Base, Sessionmaker, engine
+from app.db.models import Post as PostDB, User as UserDB
+from app.schemas.community import CommunityCreate
+from app.services import search_service
+
+WORDS = [f"word{i}" for i in range(5000)]
+QUERIES = ["word1", "word42 word4242", "word7 word70 word700"]
+
+
+def _reset():
+    tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    with engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+    redis_client.flushdb()
+
+
+def _fill(db, posts: int):
+    db.execute(insert(UserDB), [{"username": "bench", "hashed_password": "", "role": "user"}])
+    community_id = community_crud.create_community(
+        db,
+        CommunityCreate(community_name="bench", description="", owner_id=1)
+    ).id
+    rows = [
+        {
+            "title": " ".join(random.choices(WORDS, k=4)),
+            "text": " ".join(random.choices(WORDS, k=40)),
+            "community_id": community_id,
+            "owner_id": 1
+        }
+        for _ in range(posts)
+    ]
+    for start in range(0, posts, 10000):
+        db.execute(insert(PostDB), rows[start:start + 10000])
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    create_tables()
+    random.seed(0)
+
+    for posts in args.posts:
+        _reset()
+        db = Sessionmaker()
+        try:
+            _fill(db, posts)
+
+            start = time.perf_counter()
+            search_service.build_missing_indexes()
+            print(f"{posts} posts: index build {time.perf_counter() - start:10.3f} s")
+
+            for query in QUERIES:
+                report(
+                    f"{posts} posts: search '{query}'",
+                    timings(lambda: search_service.search(db, query, 20), args.repeat)
+                )
+        finally:
+            db.close()
+
+    _reset()
+
+
+if __name__ == "__main__":
+    main()
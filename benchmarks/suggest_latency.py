@@ -0,0 +1,55 @@
+"""Community name suggestion latency against the size of the name index.
+
+    python -m benchmarks.suggest_latency [--names 1000000] [--repeat 1000]
+
+The names are written to the Redis index directly, the database is not
+used. The request is for p99 under a millisecond at 1M names.
+"""
+import argparse
+import random
+import string
+
+from benchmarks._setup import timings, report
+
+from app.cache import suggest as suggest_cache
+from app.cache.redis_client import redis_client
+from app.db.database import Sessionmaker
+from app.services import community_service
+
+PREFIXES = ["a", "ab", "abc", "abcd", "zzzz"]
+
+
+def _fill(names: int, batch_size: int = 10000):
+    random.seed(0)
+    for start in range(0, names, batch_size):
+        suggest_cache.add_names(
+            (community_id, "".join(random.choices(string.ascii_lowercase, k=random.randint(4, 20))))
+            for community_id in range(start + 1, min(start + batch_size, names) + 1)
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--names", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    redis_client.flushdb()
+    _fill(args.names)
+
+    db = Sessionmaker()
+    try:
+        for prefix in PREFIXES:
+            report(f"cache suggest '{prefix}'", timings(lambda: suggest_cache.suggest(prefix, 10), args.repeat))
+            report(
+                f"service suggest '{prefix}'",
+                timings(lambda: community_service.suggest_communities(db, prefix, 10), args.repeat)
+            )
+    finally:
+        db.close()
+
+    redis_client.flushdb()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Production server: a gunicorn master supervising WEB_CONCURRENCY
+# uvicorn worker processes. The endpoints are plain functions which a
+# worker runs in its threadpool (THREADPOOL_SIZE), so one worker serves
+# many requests while they wait on I/O; one worker per core keeps every
+# core busy.
+#
+# Workers import the app after the fork, so engines, Redis pools and
+# the log file are their own. With GUNICORN_PRELOAD the master imports
+# the app once before forking (less memory, faster restarts) and
+# post_fork replaces what the workers inherited.
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() == "true"
+
+# A worker which does not report within timeout is killed and replaced.
+# On SIGTERM workers stop accepting and get graceful_timeout to finish
+# the requests in flight, then the lifespan shutdown closes the pools.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+# Workers are recycled now and then, staggered by the jitter, so slow
+# leaks in a worker do not accumulate
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+
+    from app.db.database import dispose_engines
+    from app.cache.redis_client import reset_pools
+    from app.core.logging_config import reopen_log_file
+
+    dispose_engines(close=False)
+    reset_pools()
+    reopen_log_file()
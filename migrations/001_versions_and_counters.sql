@@ -0,0 +1,34 @@
+-- Columns added to the tables of databases created before row versions,
+-- post counters and the outbox. create_tables() only creates missing
+-- tables, it does not alter existing ones, so run this once before
+-- deploying:
+--
+--   psql "$DATABASE_URL" -f migrations/001_versions_and_counters.sql
+--
+-- outbox_events is a new table, create_tables() creates it on startup.
+-- Adding a column with a constant default does not rewrite the table
+-- (PostgreSQL 11+), only the comments_count backfill touches every post.
+
+BEGIN;
+
+-- Optimistic concurrency: every edit bumps version, If-Match compares it
+ALTER TABLE users ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE communities ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+-- Post counters, view_count is flushed by the write-behind worker
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS comments_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS view_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE posts
+SET comments_count = counts.total
+FROM (SELECT post_id, count(*) AS total FROM comments GROUP BY post_id) AS counts
+WHERE posts.id = counts.post_id;
+
+-- Only for databases where an earlier build created outbox_events without it
+ALTER TABLE IF EXISTS outbox_events ADD COLUMN IF NOT EXISTS "cascade" BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE IF EXISTS outbox_events ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP;
+ALTER TABLE IF EXISTS outbox_events ADD COLUMN IF NOT EXISTS version INTEGER;
+
+COMMIT;
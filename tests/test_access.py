@@ -0,0 +1,33 @@
+import pytest
+from fastapi import HTTPException
+
+from app.cache import access as access_cache
+from app.cache.keys import access_frequency_cache_key
+from app.crud import community as community_crud
+from app.schemas.community import CommunityCreate
+from app.services import community_service
+
+
+@pytest.fixture(autouse=True)
+def every_read_counts(monkeypatch):
+    monkeypatch.setattr(access_cache, "ACCESS_SAMPLE_RATE", 1)
+
+
+def test_reads_of_a_missing_community_are_not_counted(db, cache):
+    with pytest.raises(HTTPException):
+        community_service.get_community_json(db, 999)
+
+    assert access_cache.get_top("com", 10) == []
+
+
+def test_reads_of_a_community_are_counted_on_miss_and_hit(db, admin, cache):
+    community_id = community_crud.create_community(
+        db,
+        CommunityCreate(community_name="python", description="", owner_id=admin.id)
+    ).id
+
+    community_service.get_community_json(db, community_id)
+    community_service.get_community_json(db, community_id)
+
+    assert access_cache.get_top("com", 10) == [community_id]
+    assert cache.zscore(access_frequency_cache_key("com"), community_id) == 2
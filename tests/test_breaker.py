@@ -0,0 +1,110 @@
+import time
+
+import pytest
+import redis
+from redis.exceptions import ConnectionError, TimeoutError
+
+from app.cache import breaker
+from app.cache.redis_client import REDIS_SOCKET_TIMEOUT, _options
+from app.core import metrics
+
+FAILURES = 3
+RESET = 0.2
+
+
+@pytest.fixture
+def circuit(monkeypatch) -> breaker.CircuitBreaker:
+    circuit = breaker.CircuitBreaker(FAILURES, RESET)
+    monkeypatch.setattr(breaker, "breaker", circuit)
+    return circuit
+
+
+@pytest.fixture
+def client(faulty_redis, circuit) -> breaker.BreakerClient:
+    node = redis.Redis.from_url(faulty_redis.url, **_options(False, REDIS_SOCKET_TIMEOUT))
+    yield breaker.BreakerClient(node)
+    node.close()
+
+
+def _counter(name: str) -> float:
+    return metrics.snapshot()["counters"].get(name, 0)
+
+
+def _state() -> str:
+    return breaker.STATE_NAMES[metrics.snapshot()["gauges"]["cache_breaker_state"]]
+
+
+def _open(client, faulty_redis):
+    faulty_redis.set_mode("refuse")
+    for _ in range(FAILURES):
+        with pytest.raises(ConnectionError):
+            client.ping()
+
+
+def test_stalled_node_times_out(client, faulty_redis, circuit):
+    faulty_redis.set_mode("stall")
+    errors = _counter("cache_errors_total")
+
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        client.ping()
+
+    # The socket timeout ends the call, retries included, long before a request would
+    assert time.monotonic() - start < 10 * REDIS_SOCKET_TIMEOUT
+    assert _counter("cache_errors_total") == errors + 1
+    assert not circuit.is_open()
+
+
+def test_breaker_opens_after_consecutive_failures(client, faulty_redis, circuit):
+    opened = _counter("cache_breaker_opened_total")
+
+    _open(client, faulty_redis)
+
+    assert circuit.is_open()
+    assert _state() == "open"
+    assert _counter("cache_breaker_opened_total") == opened + 1
+
+    # Calls fail fast without touching the node
+    connections = faulty_redis.connections
+    short_circuited = _counter("cache_short_circuited_total")
+    with pytest.raises(breaker.CacheUnavailable):
+        client.ping()
+    assert faulty_redis.connections == connections
+    assert _counter("cache_short_circuited_total") == short_circuited + 1
+
+
+def test_failed_probe_opens_the_breaker_again(client, faulty_redis, circuit):
+    _open(client, faulty_redis)
+    opened = _counter("cache_breaker_opened_total")
+    time.sleep(RESET)
+
+    connections = faulty_redis.connections
+    with pytest.raises(ConnectionError):
+        client.ping()
+
+    assert faulty_redis.connections > connections
+    assert circuit.is_open()
+    assert _counter("cache_breaker_opened_total") == opened + 1
+
+
+def test_only_one_call_probes(circuit):
+    for _ in range(FAILURES):
+        circuit.record_failure()
+    time.sleep(RESET)
+
+    assert circuit.allow()
+    assert _state() == "half_open"
+    assert not circuit.allow()
+
+
+def test_probe_closes_the_breaker_when_redis_is_back(cache, client, faulty_redis, circuit):
+    _open(client, faulty_redis)
+    faulty_redis.set_mode("pass")
+
+    with pytest.raises(breaker.CacheUnavailable):
+        client.ping()
+
+    time.sleep(RESET)
+    assert client.ping()
+    assert _state() == "closed"
+    assert client.ping()
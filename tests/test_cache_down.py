@@ -0,0 +1,46 @@
+import orjson
+import pytest
+
+from app.cache import entity as entity_cache
+from app.cache.breaker import CacheUnavailable
+from app.cache.keys import post_cache_key
+from app.cache.redis_client import redis_client
+from app.crud import community as community_crud
+from app.crud import post as post_crud
+from app.schemas.community import CommunityCreate
+from app.schemas.post import Post, PostCreate
+from app.services import community_service, post_service
+
+
+@pytest.fixture
+def post(db, admin):
+    community = community_crud.create_community(
+        db,
+        CommunityCreate(community_name="python", description="", owner_id=admin.id)
+    )
+    return post_crud.create_post(
+        db,
+        PostCreate(title="hello", text="world", community_id=community.id, owner_id=admin.id)
+    )
+
+
+def test_open_breaker_fails_fast(cache_down):
+    with pytest.raises(CacheUnavailable):
+        redis_client.get("any")
+
+
+def test_cache_calls_fall_back(cache_down):
+    assert entity_cache.read(post_cache_key(1), Post) == (None, b"")
+    assert entity_cache.set_fields(post_cache_key(1), {"title": b'"t"'}, version=2) is False
+
+
+def test_post_is_served_from_the_database(db, post, cache_down):
+    body = orjson.loads(post_service.get_post_json(db, post.id))
+
+    assert (body["id"], body["title"]) == (post.id, "hello")
+
+
+def test_suggestions_are_served_from_the_database(db, post, cache_down):
+    suggestions = community_service.suggest_communities(db, "py", 5)
+
+    assert [s.community_name for s in suggestions] == ["python"]
@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from app.cache import entity as entity_cache
+from app.cache.keys import post_cache_key
+from app.core.etag import make_etag, parse_if_match
+from app.crud import community as community_crud
+from app.crud import post as post_crud
+from app.db.database import Sessionmaker
+from app.schemas.community import CommunityCreate
+from app.schemas.post import Post, PostCreate, PostUpdate
+from app.services import outbox_service, post_service
+
+WRITERS = 16
+
+
+@pytest.fixture
+def post(db, admin, cache):
+    community = community_crud.create_community(
+        db,
+        CommunityCreate(community_name="python", description="", owner_id=admin.id)
+    )
+    post = post_crud.create_post(
+        db,
+        PostCreate(title="hello", text="world", community_id=community.id, owner_id=admin.id)
+    )
+    # Cached, so every edit also goes through the write-through
+    post_service.get_post_json(db, post.id)
+    return Post.from_orm(post)
+
+
+def test_one_of_concurrent_edits_of_the_same_version_wins(db, admin, post):
+    if_match = make_etag(post.version, weak=False)
+    barrier = Barrier(WRITERS)
+
+    def put(i):
+        session = Sessionmaker()
+        try:
+            barrier.wait()
+            post_service.update_post(
+                session, post.id, PostUpdate(title=f"edit {i}"), admin, parse_if_match(if_match)
+            )
+            return 200
+        except HTTPException as e:
+            return e.status_code
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(WRITERS) as pool:
+        statuses = sorted(pool.map(put, range(WRITERS)))
+
+    assert statuses == [200] + [412] * (WRITERS - 1)
+
+    # The relay keeps the entry, the winner already wrote its version
+    assert outbox_service.relay_batch() == 1
+
+    stored = post_crud.get_post_by_id(db, post.id)
+    cached = orjson.loads(entity_cache.read(post_cache_key(post.id), Post)[0])
+    assert stored.version == post.version + 1
+    assert (cached["version"], cached["title"]) == (stored.version, stored.title)
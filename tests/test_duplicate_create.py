@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+import pytest
+from fastapi import HTTPException
+
+from app.db.database import Sessionmaker
+from app.schemas.user import UserCreate
+from app.schemas.community import CommunityCreateInput
+from app.services import auth_service, user_service, community_service
+
+CONCURRENCY = 8
+
+
+def _race(create):
+    """Runs create(db) in CONCURRENCY threads at once, each with its own
+    session. Returns the status of each: 200 or the HTTPException code.
+    """
+    barrier = Barrier(CONCURRENCY)
+
+    def attempt(_):
+        db = Sessionmaker()
+        try:
+            barrier.wait()
+            create(db)
+            return 200
+        except HTTPException as e:
+            return e.status_code
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        return sorted(pool.map(attempt, range(CONCURRENCY)))
+
+
+def test_concurrent_user_creates_make_one_user(admin):
+    user = UserCreate(username="alice", password="secret", role="user")
+
+    statuses = _race(lambda db: user_service.create_user(db, user, admin))
+
+    assert statuses == [200] + [409] * (CONCURRENCY - 1)
+
+
+def test_concurrent_community_creates_make_one_community(admin, cache):
+    community = CommunityCreateInput(community_name="python", description="", photo_url=None)
+
+    statuses = _race(lambda db: community_service.create_community(db, community, admin))
+
+    assert statuses == [200] + [409] * (CONCURRENCY - 1)
+
+
+def test_taken_username_is_rejected_before_hashing(db, admin, monkeypatch):
+    def hash_password(password):
+        raise AssertionError("the password of a taken username was hashed")
+
+    monkeypatch.setattr(auth_service, "hash_password", hash_password)
+
+    with pytest.raises(HTTPException) as error:
+        auth_service.register_user(UserCreate(username=admin.username, password="secret", role="user"), db)
+    assert error.value.status_code == 409
+
+
+def test_created_user_keeps_its_role(db, admin):
+    user = user_service.create_user(db, UserCreate(username="root", password="secret", role="admin"), admin)
+
+    assert user.role == "admin"
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import orjson
+
+from app.cache import entity as entity_cache
+from app.cache.keys import post_cache_key
+from app.schemas.post import Post
+
+KEY = post_cache_key(1)
+
+
+def _post(version: int, title: str = "title") -> Post:
+    return Post(
+        id=1,
+        title=title,
+        text="text",
+        community_id=1,
+        owner_id=1,
+        time_edited=datetime(2024, 1, 1),
+        is_edited=version > 1,
+        version=version
+    )
+
+
+def _cached_version() -> int:
+    return orjson.loads(entity_cache.read(KEY, Post)[0])["version"]
+
+
+def test_older_version_does_not_replace_newer_entry(cache):
+    assert entity_cache.set_entity(KEY, _post(version=2), b"")
+
+    assert not entity_cache.set_entity(KEY, _post(version=1), b"")
+    assert _cached_version() == 2
+
+
+def test_older_fields_are_not_written(cache):
+    entity_cache.set_entity(KEY, _post(version=2), b"")
+
+    assert not entity_cache.set_fields(KEY, {"title": orjson.dumps("old")}, version=1)
+    assert not entity_cache.set_fields(KEY, {"title": orjson.dumps("same")}, version=2)
+    assert entity_cache.set_fields(KEY, {"title": orjson.dumps("new")}, version=3)
+
+    cached = orjson.loads(entity_cache.read(KEY, Post)[0])
+    assert (cached["title"], cached["version"]) == ("new", 3)
+
+
+def test_fill_is_dropped_after_an_invalidation(cache):
+    cached, generation = entity_cache.read(KEY, Post)
+    assert cached is None
+
+    # An edit invalidates the entry while the reader loads the old row
+    entity_cache.delete_entity(KEY)
+
+    assert not entity_cache.set_entity(KEY, _post(version=1), generation)
+    assert entity_cache.read(KEY, Post)[0] is None
+
+
+def test_view_counter_leaves_the_generation_alone(cache):
+    assert entity_cache.incr_counter(KEY, "view_count") is None
+    assert not cache.exists(KEY)
+
+    _, generation = entity_cache.read(KEY, Post)
+    entity_cache.set_entity(KEY, _post(version=1), generation)
+    entity_cache.incr_counter(KEY, "view_count")
+
+    # A fill which read the generation before the view still succeeds
+    assert entity_cache.set_entity(KEY, _post(version=1), generation)
+
+
+def test_outbox_keeps_an_entry_already_at_the_edited_version(cache):
+    entity_cache.set_entity(KEY, _post(version=2), b"")
+
+    assert entity_cache.delete_older_entities({KEY: 2}) == 1
+    assert _cached_version() == 2
+
+    assert entity_cache.delete_older_entities({KEY: 3}) == 0
+    assert entity_cache.read(KEY, Post)[0] is None
@@ -0,0 +1,71 @@
+import orjson
+import pytest
+
+from app.cache import feed as feed_cache
+from app.crud import community as community_crud
+from app.crud import post as post_crud
+from app.db.models import User as UserDB
+from app.schemas.community import CommunityCreate
+from app.schemas.post import PostCreate
+from app.services import feed_service
+
+FOLLOWERS = 3
+
+
+@pytest.fixture
+def follower_ids(db) -> list:
+    users = [UserDB(username=f"user{i}", hashed_password="", role="user") for i in range(FOLLOWERS)]
+    db.add_all(users)
+    db.commit()
+    return [user.id for user in users]
+
+
+@pytest.fixture
+def community_id(db, admin, follower_ids) -> int:
+    community_id = community_crud.create_community(
+        db,
+        CommunityCreate(community_name="python", description="", owner_id=admin.id)
+    ).id
+    community_crud.follow_many(db, [(community_id, f_id) for f_id in follower_ids])
+    db.commit()
+    return community_id
+
+
+def _create_posts(db, admin, community_id: int, count: int) -> list:
+    return post_crud.create_posts(
+        db,
+        [PostCreate(title=f"post {i}", text="", community_id=community_id, owner_id=admin.id) for i in range(count)]
+    )
+
+
+def _feed(db, user_id: int) -> list:
+    return [post["id"] for post in orjson.loads(feed_service.get_user_feed(db, user_id, 10, 0).body)]
+
+
+def test_bulk_posts_are_fanned_out_to_built_feeds(db, admin, cache, community_id, follower_ids):
+    reader, *others = follower_ids
+    assert _feed(db, reader) == []
+
+    posts = _create_posts(db, admin, community_id, 5)
+    feed_service.fan_out_posts(db, posts)
+
+    assert sorted(_feed(db, reader)) == sorted(p.id for p in posts)
+    # Feeds which were never read are left to be built on read
+    assert not any(feed_cache.is_feed_exist(f_id) for f_id in others)
+
+
+def test_posts_of_a_huge_community_are_filled_on_read(db, admin, cache, community_id, follower_ids, monkeypatch):
+    monkeypatch.setattr(feed_cache, "FEED_FANOUT_LIMIT", FOLLOWERS - 1)
+    posts = _create_posts(db, admin, community_id, 5)
+    feed_service.fan_out_posts(db, posts)
+
+    assert feed_cache.is_huge_community(community_id)
+    assert feed_cache.get_missing_community_posts([community_id]) == [community_id]
+
+    assert sorted(_feed(db, follower_ids[0])) == sorted(p.id for p in posts)
+    assert feed_cache.get_missing_community_posts([community_id]) == []
+
+    # Once filled, new posts are added to the list
+    new_posts = _create_posts(db, admin, community_id, 1)
+    feed_service.fan_out_posts(db, new_posts)
+    assert _feed(db, follower_ids[1])[0] == new_posts[0].id
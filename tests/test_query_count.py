@@ -0,0 +1,110 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from app.crud import comment as comment_crud
+from app.crud import community as community_crud
+from app.crud import post as post_crud
+from app.db.database import engine
+from app.db.models import User as UserDB
+from app.schemas.comment import CommentCreate
+from app.schemas.community import CommunityCreate
+from app.schemas.post import PostCreate
+from app.services import comment_service, community_service
+
+PAGE = 10
+
+
+@pytest.fixture
+def queries():
+    """The SQL statements sent to the database while the test runs."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def community_id(db, admin) -> int:
+    community = community_crud.create_community(
+        db,
+        CommunityCreate(community_name="python", description="", owner_id=admin.id)
+    )
+    users = [UserDB(username=f"user{i}", hashed_password="", role="user") for i in range(PAGE)]
+    db.add_all(users)
+    db.commit()
+    community_crud.follow_many(db, [(community.id, user.id) for user in [admin, *users]])
+    db.commit()
+    return community.id
+
+
+@pytest.fixture
+def post(db, admin, community_id):
+    posts = post_crud.create_posts(
+        db,
+        [PostCreate(title=f"post {i}", text="", community_id=community_id, owner_id=admin.id) for i in range(PAGE)]
+    )
+    comment_crud.create_comments(
+        db,
+        [CommentCreate(text=f"comment {i}", post_id=posts[0].id, owner_id=admin.id) for i in range(PAGE)]
+    )
+    return posts[0]
+
+
+def test_comments_of_a_post_are_one_query(db, post, queries):
+    comments = comment_service.get_comments_by_post(db, post.id, PAGE, 0)
+
+    assert len(comments) == PAGE
+    assert len(queries) == 1
+
+
+def test_posts_of_a_community_are_one_query(db, community_id, post, queries):
+    posts = community_service.get_posts(db, community_id, PAGE, 0)
+
+    assert len(posts) == PAGE
+    assert len(queries) == 1
+
+
+def test_followers_of_a_community_are_one_query(db, community_id, queries):
+    followers = community_service.get_followers(db, PAGE, 0, community_id)
+
+    assert len(followers) == PAGE
+    assert len(queries) == 1
+
+
+def test_empty_page_of_an_existing_parent(db, community_id, queries):
+    assert community_service.get_posts(db, community_id, PAGE, 0) == []
+    assert len(queries) == 1
+
+
+@pytest.mark.parametrize("read", [
+    lambda db: comment_service.get_comments_by_post(db, 999, PAGE, 0),
+    lambda db: community_service.get_posts(db, 999, PAGE, 0),
+    lambda db: community_service.get_followers(db, PAGE, 0, 999),
+])
+def test_missing_parent_is_a_404_from_one_query(db, queries, read):
+    with pytest.raises(HTTPException) as error:
+        read(db)
+
+    assert error.value.status_code == 404
+    assert len(queries) == 1
+
+
+def test_bulk_comments_update_the_counters_in_one_statement(db, admin, community_id, queries):
+    posts = post_crud.create_posts(
+        db,
+        [PostCreate(title=f"post {i}", text="", community_id=community_id, owner_id=admin.id) for i in range(3)]
+    )
+    queries.clear()
+
+    comment_crud.create_comments(
+        db,
+        [CommentCreate(text="", post_id=p.id, owner_id=admin.id) for p in posts for _ in range(p.id)]
+    )
+
+    assert sum(statement.startswith("UPDATE posts") for statement in queries) == 1
+    assert [post_crud.get_post_by_id(db, p.id).comments_count for p in posts] == [p.id for p in posts]
@@ -0,0 +1,86 @@
+import pytest
+from sqlalchemy import create_engine, event, select, update
+
+from app.db import database as database_module
+from app.db.database import ReplicaPool, Sessionmaker, on_primary
+from app.db.models import User as UserDB
+
+
+@pytest.fixture
+def replica(database, monkeypatch):
+    """A second engine on the test database standing in for a replica."""
+    replica = create_engine(database_module.engine.url)
+    monkeypatch.setattr(database_module, "replicas", ReplicaPool([replica], 30))
+    yield replica
+    replica.dispose()
+
+
+@pytest.fixture
+def served_by(replica):
+    """Names the engine, primary or replica, of each statement sent."""
+    names = []
+    listeners = [
+        (database_module.engine, lambda *args: names.append("primary")),
+        (replica, lambda *args: names.append("replica")),
+    ]
+    for target, listener in listeners:
+        event.listen(target, "before_cursor_execute", listener)
+    yield names
+    for target, listener in listeners:
+        event.remove(target, "before_cursor_execute", listener)
+
+
+@pytest.fixture
+def session(db):
+    session = Sessionmaker(info={"read_only": True})
+    yield session
+    session.close()
+
+
+def _read(session):
+    session.execute(select(UserDB.id)).all()
+
+
+def test_reads_of_a_read_only_session_go_to_the_replica(session, served_by):
+    _read(session)
+    _read(session)
+
+    assert served_by == ["replica", "replica"]
+
+
+def test_writes_go_to_the_primary_and_keep_the_session_there(session, served_by):
+    session.add(UserDB(username="alice", hashed_password="", role="user"))
+    session.commit()
+    _read(session)
+
+    assert set(served_by) == {"primary"}
+
+
+def test_dml_statement_goes_to_the_primary(session, served_by):
+    session.execute(update(UserDB).where(UserDB.id == 0).values(role="admin"))
+    _read(session)
+
+    assert served_by == ["primary", "primary"]
+
+
+def test_reads_inside_on_primary_go_to_the_primary(session, served_by):
+    with on_primary(session):
+        _read(session)
+    _read(session)
+
+    assert served_by == ["primary", "replica"]
+
+
+def test_write_inside_on_primary_keeps_the_session_there(session, served_by):
+    with on_primary(session):
+        session.add(UserDB(username="alice", hashed_password="", role="user"))
+        session.commit()
+    _read(session)
+
+    assert set(served_by) == {"primary"}
+
+
+def test_other_sessions_only_use_the_primary(db, served_by):
+    _read(db)
+
+    assert served_by == ["primary"]
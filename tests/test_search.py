@@ -0,0 +1,40 @@
+from app.cache import search as search_cache
+from app.cache.keys import job_lock_cache_key
+from app.crud import community as community_crud
+from app.crud import post as post_crud
+from app.schemas.community import CommunityCreate
+from app.schemas.post import PostCreate
+from app.services import search_service
+
+
+def _create_post(db, admin):
+    community_id = community_crud.create_community(
+        db,
+        CommunityCreate(community_name="python", description="snakes", owner_id=admin.id)
+    ).id
+    return post_crud.create_post(
+        db,
+        PostCreate(title="Asyncio tips", text="gather and wait", community_id=community_id, owner_id=admin.id)
+    )
+
+
+def test_search_does_not_build_the_index(db, admin, cache):
+    _create_post(db, admin)
+
+    result = search_service.search(db, "asyncio", 10)
+
+    assert result.posts == []
+    assert search_cache.get_missing_indexes(["post"]) == ["post"]
+
+
+def test_missing_indexes_are_built_in_the_background(db, admin, cache):
+    post = _create_post(db, admin)
+
+    assert search_service.build_missing_indexes() == 3
+    assert search_service.build_missing_indexes() == 0
+
+    result = search_service.search(db, "asyncio", 10)
+    assert [p.id for p in result.posts] == [post.id]
+    assert [c.community_name for c in search_service.search(db, "snakes", 10).communities] == ["python"]
+    # The locks are released once the indexes are built
+    assert not cache.exists(*(job_lock_cache_key(f"search:{kind}") for kind in search_service.REBUILDERS))
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+from redis.exceptions import RedisError
+
+from app.cache import redis_client as redis_module
+from app.cache.redis_client import HashRing, REDIS_SOCKET_TIMEOUT
+
+# Two Redis dbs stand in for two shards unless real nodes are given
+SHARD_URLS = os.getenv("TEST_REDIS_SHARD_URLS", "redis://localhost:6379/13,redis://localhost:6379/14").split(",")
+
+KEYS = [f"post:{i}" for i in range(200)]
+
+
+@pytest.fixture
+def sharded(monkeypatch):
+    monkeypatch.setattr(redis_module, "REDIS_SHARD_URLS", SHARD_URLS)
+    client = redis_module._sharded_client(decode_responses=True, socket_timeout=REDIS_SOCKET_TIMEOUT)
+    try:
+        client.flushdb()
+    except RedisError as e:
+        pytest.skip(f"Redis shards are not reachable: {e}")
+    yield client
+    client.flushdb()
+
+
+def _stored_on(client):
+    return [set(node.keys()) for node in client.nodes()]
+
+
+def test_keys_are_spread_over_the_nodes(sharded):
+    for key in KEYS:
+        sharded.set(key, key)
+
+    stored = _stored_on(sharded)
+    assert all(stored)
+    assert set.union(*stored) == set(KEYS)
+    assert not set.intersection(*stored)
+    assert [sharded.get(key) for key in KEYS] == KEYS
+
+
+def test_keys_with_the_same_hash_tag_share_a_node(sharded):
+    sharded.set("{post:1}:a", 1)
+    sharded.set("{post:1}:b", 1)
+
+    assert {"{post:1}:a", "{post:1}:b"} in _stored_on(sharded)
+
+
+def test_pipeline_results_keep_the_queue_order(sharded):
+    pipe = sharded.pipeline()
+    for key in KEYS:
+        pipe.set(key, key)
+        pipe.get(key)
+
+    assert pipe.execute() == [value for key in KEYS for value in (True, key)]
+
+
+def test_multi_key_commands_are_grouped_by_node(sharded):
+    for key in KEYS:
+        sharded.set(key, 1)
+
+    assert sharded.exists(*KEYS) == len(KEYS)
+    assert sharded.delete(*KEYS) == len(KEYS)
+    assert not any(_stored_on(sharded))
+
+
+def test_scripts_run_on_the_node_of_their_key(sharded):
+    incr = sharded.register_script("return redis.call('INCR', KEYS[1])")
+
+    assert [incr(keys=[key]) for key in KEYS] == [1] * len(KEYS)
+    assert set.union(*_stored_on(sharded)) == set(KEYS)
+
+
+def test_keyless_commands_run_on_every_node(sharded):
+    for key in KEYS:
+        sharded.set(key, 1)
+
+    assert sharded.ping()
+    assert sharded.dbsize() == len(KEYS)
+    assert sharded.flushdb()
+    assert sharded.dbsize() == 0
+
+
+def test_other_keyless_commands_fail_clearly(sharded):
+    with pytest.raises(ValueError, match="randomkey has no key"):
+        sharded.randomkey()
+
+
+def test_adding_a_node_moves_about_its_share_of_the_keys():
+    keys = [f"post:{i}" for i in range(10000)]
+    before = HashRing({"a": "a", "b": "b"}, 160)
+    after = HashRing({"a": "a", "b": "b", "c": "c"}, 160)
+
+    moved = sum(before.get_node(key) != after.get_node(key) for key in keys)
+
+    assert 0.25 < moved / len(keys) < 0.42
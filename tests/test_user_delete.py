@@ -0,0 +1,59 @@
+from sqlalchemy import func, select
+
+from app.crud import comment as comment_crud
+from app.crud import community as community_crud
+from app.crud import post as post_crud
+from app.db.models import Comment as CommentDB, Post as PostDB, User as UserDB, community_followers
+from app.schemas.comment import CommentCreate
+from app.schemas.community import CommunityCreate
+from app.schemas.post import PostCreate
+from app.services import user_service
+
+
+def _user(db, username: str) -> UserDB:
+    user = UserDB(username=username, hashed_password="", role="user")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def _community(db, name: str, owner_id: int) -> int:
+    return community_crud.create_community(
+        db, CommunityCreate(community_name=name, description="", owner_id=owner_id)
+    ).id
+
+
+def _posts(db, community_id: int, owner_id: int, count: int) -> list:
+    return post_crud.create_posts(
+        db, [PostCreate(title="t", text="", community_id=community_id, owner_id=owner_id) for _ in range(count)]
+    )
+
+
+def _comments(db, posts: list, owner_id: int):
+    comment_crud.create_comments(db, [CommentCreate(text="c", post_id=p.id, owner_id=owner_id) for p in posts])
+
+
+def test_delete_removes_what_the_user_created(db, admin, cache):
+    alice, bob = _user(db, "alice"), _user(db, "bob")
+    alice_id, bob_id = alice.id, bob.id
+
+    alices_community = _community(db, "alices", alice_id)
+    bobs_community = _community(db, "bobs", bob_id)
+
+    # Bob's posts in Alice's community go with it, Bob's own community stays
+    in_alices = _posts(db, alices_community, bob_id, 50)
+    in_bobs = _posts(db, bobs_community, bob_id, 5)
+    _comments(db, in_alices + in_bobs, alice_id)
+    _comments(db, in_bobs, bob_id)
+    community_crud.follow_many(db, [(alices_community, bob_id), (bobs_community, alice_id)])
+    db.commit()
+
+    user_service.delete_user(db, alice_id, admin)
+
+    assert db.get(UserDB, alice_id) is None
+    assert community_crud.get_community_by_id(db, alices_community) is None
+    assert db.scalar(select(func.count()).select_from(PostDB)) == len(in_bobs)
+    assert db.scalar(select(func.count()).where(CommentDB.owner_id == alice_id)) == 0
+    assert db.scalar(select(func.count()).select_from(community_followers)) == 0
+    # Alice's comments are gone from the counters of the posts which stay
+    assert {post_crud.get_post_by_id(db, p.id).comments_count for p in in_bobs} == {1}